@@ -0,0 +1,42 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+
+from bmcmanager import context
+
+
+def cache_dir(*parts):
+    """
+    Return path of a bmcmanager cache directory, creating it if needed.
+    Uses $XDG_CACHE_HOME/bmcmanager, or ~/.cache/bmcmanager by default.
+    """
+    root = context.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    path = os.path.join(root, "bmcmanager", *parts)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+    return path
+
+
+def write_json(path, data):
+    """
+    Atomically replace path with data as JSON, readable only by the user
+    """
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as fout:
+        json.dump(data, fout)
+    os.replace(tmp, path)
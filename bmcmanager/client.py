@@ -0,0 +1,184 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Entry point of the bmcmanager command. If `bmcmanager serve` is running,
+# commands are forwarded to it. Otherwise, they are executed locally. Only
+# standard library modules are imported before that decision is made, so
+# that forwarded commands start fast.
+
+import json
+import os
+import socket
+import stat
+import sys
+
+# environment variables that are forwarded to `bmcmanager serve`. Commands
+# that have credentials in their environment are executed locally.
+FORWARD_ENV = [
+    "BMCMANAGER_CONFIG",
+    "BMCMANAGER_NFS_SHARE",
+    "BMCMANAGER_HTTP_SHARE",
+    "XDG_CACHE_HOME",
+]
+SECRET_ENV = ["BMCMANAGER_USERNAME", "BMCMANAGER_PASSWORD"]
+
+# commands that need a terminal, a browser or local files
+LOCAL_COMMANDS = [
+    ["serve"],
+    ["complete"],
+    ["help"],
+    ["open"],
+    ["ipmi", "ssh"],
+    ["ipmi", "tool"],
+    ["server", "ssh"],
+    ["server", "factory", "reset"],
+    ["firmware", "upgrade"],
+]
+
+# global options that are handled locally
+LOCAL_OPTIONS = ["-h", "--help", "--version", "--log-file"]
+
+# options with file paths, which are made absolute before forwarding
+PATH_OPTIONS = ["--config-file", "--download-to"]
+
+# seconds to wait for `bmcmanager serve` to accept a command, before
+# executing it locally
+TIMEOUT = 5
+
+
+def socket_path():
+    """
+    Path of the `bmcmanager serve` socket, or an empty string. An empty
+    BMCMANAGER_SOCKET disables forwarding commands.
+    """
+    path = os.getenv("BMCMANAGER_SOCKET")
+    if path is not None:
+        return path
+
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "bmcmanager.sock")
+
+    return ""
+
+
+def is_trusted(path):
+    """
+    Whether path is a socket owned by the current user, and not accessible by
+    other users. Otherwise, another user could be listening on it.
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+
+    return (
+        stat.S_ISSOCK(st.st_mode)
+        and st.st_uid == os.getuid()
+        and not st.st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+    )
+
+
+def is_local(argv):
+    if any(arg in LOCAL_OPTIONS for arg in argv):
+        return True
+    if any(os.getenv(name) is not None for name in SECRET_ENV):
+        return True
+
+    words = [arg for arg in argv if not arg.startswith("-")]
+    if not words:
+        return True
+
+    return any(words[: len(cmd)] == cmd for cmd in LOCAL_COMMANDS)
+
+
+def absolute_paths(argv):
+    """
+    Return argv with the values of PATH_OPTIONS made absolute, since the
+    daemon runs in a different working directory
+    """
+    result, is_path = [], False
+    for arg in argv:
+        name, sep, value = arg.partition("=")
+        option = name.startswith("--") and any(o.startswith(name) for o in PATH_OPTIONS)
+        if is_path:
+            arg, is_path = os.path.abspath(arg), False
+        elif option and sep:
+            arg = "{}={}".format(name, os.path.abspath(value))
+        elif option:
+            is_path = True
+
+        result.append(arg)
+
+    return result
+
+
+def forward(path, argv):
+    """
+    Execute a command through `bmcmanager serve`. Returns the exit code, or
+    None if the daemon is not running or does not accept the command within
+    TIMEOUT seconds.
+    """
+    conn = socket.socket(socket.AF_UNIX)
+    conn.settimeout(TIMEOUT)
+    try:
+        conn.connect(path)
+        responses = conn.makefile("rb")
+        ready = json.loads(responses.readline().decode("utf-8"))
+    except (OSError, ValueError):
+        conn.close()
+        return None
+
+    if not isinstance(ready, dict) or not ready.get("ready"):
+        conn.close()
+        return None
+
+    # the daemon has accepted the command, wait for it as long as it takes
+    conn.settimeout(None)
+    request = {
+        "argv": absolute_paths(argv),
+        "env": {k: os.environ[k] for k in FORWARD_ENV if k in os.environ},
+    }
+    with conn, responses:
+        conn.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        for line in responses:
+            msg = json.loads(line.decode("utf-8"))
+            if "stdout" in msg:
+                sys.stdout.write(msg["stdout"])
+                sys.stdout.flush()
+            elif "stderr" in msg:
+                sys.stderr.write(msg["stderr"])
+                sys.stderr.flush()
+            elif "exit" in msg:
+                return msg["exit"]
+
+    sys.stderr.write("Lost connection to bmcmanager serve\n")
+    return 1
+
+
+def main(argv=sys.argv[1:]):
+    path = socket_path()
+    if path and not is_local(argv) and is_trusted(path):
+        code = forward(path, argv)
+        if code is not None:
+            return code
+
+    from bmcmanager.cliff import main as local_main
+
+    return local_main(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import logging
 import sys
 
 from cliff.app import App
@@ -22,13 +23,33 @@ from bmcmanager.version import version_string
 
 
 class BMCManagerApp(App):
-    def __init__(self):
+    def __init__(self, stdout=None, stderr=None, log_filter=None):
         super(BMCManagerApp, self).__init__(
             description="BMCManager",
             version=version_string,
             command_manager=CommandManager("bmcmanager.entrypoints"),
+            stdout=stdout,
+            stderr=stderr,
             deferred_help=True,
         )
+        self.log_filter = log_filter
+        self.log_handler = None
+
+    def configure_logging(self):
+        if self.log_filter is None:
+            return super(BMCManagerApp, self).configure_logging()
+
+        # commands of `bmcmanager serve` only log their own records to stderr
+        console = logging.StreamHandler(self.stderr)
+        console.setLevel(
+            {0: logging.WARNING, 1: logging.INFO}.get(
+                self.options.verbose_level, logging.DEBUG
+            )
+        )
+        console.setFormatter(logging.Formatter(self.CONSOLE_MESSAGE_FORMAT))
+        console.addFilter(self.log_filter)
+        logging.getLogger("").addHandler(console)
+        self.log_handler = console
 
 
 def main(argv=sys.argv[1:]):
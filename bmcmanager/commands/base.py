@@ -14,8 +14,8 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import argparse
+import functools
 import json
-import os
 import sys
 
 from cliff.command import Command
@@ -26,8 +26,9 @@ from bmcmanager.config import get_config
 from bmcmanager.dcim import DCIMS
 from bmcmanager.oob import OOBS
 from bmcmanager.errors import BMCManagerError
+from bmcmanager.executor import run_tasks
 from bmcmanager.logs import log
-from bmcmanager import exitcode
+from bmcmanager import context, exitcode, nagios
 
 README = "https://github.com/grnet/BMCManager/blob/master/README.md"
 
@@ -83,6 +84,13 @@ def server_arguments(parser):
         choices=["name", "rack", "rack-unit", "serial"],
         default="search",
     )
+    parser.add_argument(
+        "-p",
+        "--parallel",
+        help="number of servers to work on concurrently",
+        type=int_in_range_argument(range(1, 257)),
+        default=1,
+    )
 
 
 def get_dcim(args, config):
@@ -111,50 +119,208 @@ def get_oob_config(config, dcim, oob_info, get_secret=True):
     cfg = {
         "username": oob_params.get("username"),
         "password": oob_params.get("password"),
+        "get_secret": None,
     }
+    # credentials are retrieved from the DCIM only when first needed
     if get_secret and dcim.supports_secrets() and "credentials" in oob_params:
-        secret = dcim.get_secret(oob_params["credentials"], oob_info)
-        if secret["name"]:
-            cfg["username"] = secret["name"]
-        if secret["plaintext"]:
-            cfg["password"] = secret["plaintext"]
-
-    cfg["username"] = os.getenv("BMCMANAGER_USERNAME", cfg["username"])
-    cfg["password"] = os.getenv("BMCMANAGER_PASSWORD", cfg["password"])
+        cfg["get_secret"] = functools.partial(
+            dcim.get_secret, oob_params["credentials"], oob_info
+        )
 
-    cfg["nfs_share"] = os.getenv("BMCMANAGER_NFS_SHARE", oob_params.get("nfs_share"))
-    cfg["http_share"] = os.getenv("BMCMANAGER_HTTP_SHARE", oob_params.get("http_share"))
+    cfg["nfs_share"] = context.getenv(
+        "BMCMANAGER_NFS_SHARE", oob_params.get("nfs_share")
+    )
+    cfg["http_share"] = context.getenv(
+        "BMCMANAGER_HTTP_SHARE", oob_params.get("http_share")
+    )
 
     cfg["oob_params"] = oob_params
     return cfg
 
 
-def bmcmanager_take_action(cmd, parsed_args):
+def prefetch_secrets(config, dcim, oob_infos):
+    """
+    Retrieve credentials for multiple servers at once, grouped by secret role
+    """
+    if len(oob_infos) < 2 or not dcim.supports_secrets():
+        return
+    credentials = ("BMCMANAGER_USERNAME", "BMCMANAGER_PASSWORD")
+    if None not in map(context.getenv, credentials):
+        return
+
+    roles = {}
+    for oob_info in oob_infos:
+        role = config.get(oob_info["oob"].lower(), {}).get("credentials")
+        if role is not None:
+            roles.setdefault(role, []).append(oob_info)
+
+    for role, role_oob_infos in roles.items():
+        dcim.prefetch_secrets(role, role_oob_infos)
+
+
+def get_oob(cmd, dcim, oob_info):
+    """
+    Create the OOB object for a server
+    """
+    oob_config = get_oob_config(
+        cmd.config, dcim, oob_info, get_secret=cmd.dcim_fetch_secrets
+    )
+    # e.g. `driver = redfish`, to manage servers of a manufacturer over Redfish
+    oob_name = oob_config["oob_params"].get("driver", oob_info["oob"])
+    log.debug("Creating OOB object for {}".format(oob_name))
+    try:
+        oob_class = OOBS[oob_name]
+    except KeyError:
+        raise BMCManagerError("Invalid OOB {}".format(oob_name))
+
+    return oob_class(cmd.parsed_args, dcim, oob_config, oob_info)
+
+
+def run_oob_action(cmd, oob):
+    """
+    Run the command action for a single OOB
+    """
+    if hasattr(cmd, "oob_method"):
+        return getattr(oob, cmd.oob_method)()
+
+    return cmd.action(oob)
+
+
+def get_oobs(cmd, parsed_args):
+    """
+    Create the OOB objects of all matching servers
+    """
     cmd.parsed_args = parsed_args
     cmd.config = get_config(parsed_args.config_file)
     dcim = get_dcim(parsed_args, cmd.config)
 
-    idx = None
-    for idx, oob_info in enumerate(dcim.get_oobs()):
-        oob_config = get_oob_config(cmd.config, dcim, oob_info)
-        log.debug("Creating OOB object for {}".format(oob_info["oob"]))
-        try:
-            oob = OOBS.get(oob_info["oob"])(parsed_args, dcim, oob_config, oob_info)
-        except KeyError:
-            raise BMCManagerError("Invalid OOB {}".format(oob_info["oob"]))
-
-        try:
-            if hasattr(cmd, "oob_method"):
-                return getattr(oob, cmd.oob_method)()
-            else:
-                return cmd.action(oob)
-        except Exception as e:
-            log.exception("Unhandled exception: {}".format(e))
-
-    if idx is None:
+    oob_infos = list(dcim.get_oobs())
+    if not oob_infos:
         log.fatal('No servers found for "{}"'.format(parsed_args.server))
+        return []
+
+    check_targets(cmd, parsed_args, oob_infos)
+
+    if cmd.dcim_fetch_secrets:
+        prefetch_secrets(cmd.config, dcim, oob_infos)
+    return [get_oob(cmd, dcim, oob_info) for oob_info in oob_infos]
+
+
+def check_targets(cmd, parsed_args, oob_infos):
+    """
+    Refuse to run interactive commands on multiple servers, or destructive
+    commands without `--all`
+    """
+    if len(oob_infos) < 2:
+        return
+
+    matches = '"{}" matches {} servers: {}'.format(
+        parsed_args.server,
+        len(oob_infos),
+        ", ".join(oob_info["identifier"] for oob_info in oob_infos),
+    )
+    if getattr(cmd, "interactive", False):
+        raise BMCManagerError("{}. Select a single server".format(matches))
+    if getattr(cmd, "destructive", False) and not parsed_args.all:
+        raise BMCManagerError(
+            "{}. Select a single server, or use --all".format(matches)
+        )
+
+
+def bmcmanager_take_action(cmd, parsed_args):
+    """
+    Run the command action for all matching servers
+    """
+    return run_oob_actions(cmd, get_oobs(cmd, parsed_args))
+
+
+def run_oob_actions(cmd, oobs, close=True):
+    """
+    Run the command action for the OOBs, using `--parallel` worker threads.
+    Returns a list of TaskResult objects, one for each OOB.
+
+    With close=False, the OOBs are not closed afterwards, so that repeated
+    actions reuse their sessions. The caller must close them.
+    """
+    # nagios check results are collected and reported after all tasks are done
+    checks = nagios.Collector()
+
+    nagios_check = getattr(cmd, "nagios_check", False)
+
+    def task(oob):
+        identifier = oob.oob_info["identifier"]
+        with checks.collect(identifier):
+            try:
+                return run_oob_action(cmd, oob)
+            except SystemExit as e:
+                if nagios_check:
+                    msg = "exited with code {}".format(e.code)
+                    nagios.result(nagios.UNKNOWN, msg, pre=identifier)
+                raise
+            except Exception as e:
+                msg = str(e) or type(e).__name__
+                if nagios_check:
+                    nagios.result(nagios.UNKNOWN, msg, pre=identifier)
+                    raise
+
+                # keep the output of the other servers intact
+                log.error("{}: {}".format(identifier, msg))
+                log.debug("Traceback", exc_info=True)
+                exitcode.update(1)
+                return None
+            finally:
+                if close:
+                    oob.close()
+
+    try:
+        return run_tasks(task, oobs, cmd.parsed_args.parallel)
+    finally:
+        checks.report()
+
+
+def merge_get_results(results):
+    """
+    Merge (columns, values) results of a ShowOne command. When multiple
+    servers are involved, columns are prefixed with the server name.
+    """
+    results = [r for r in results if r.value and r.value[0] is not None]
+    if len(results) == 1:
+        return results[0].value
+    if not results:
+        return [], []
+
+    columns, values = [], []
+    for result in results:
+        identifier = result.item.oob_info["identifier"]
+        result_columns, result_values = result.value
+        columns.extend("{} {}".format(identifier, c) for c in result_columns)
+        values.extend(result_values)
+
+    return columns, values
+
+
+def merge_list_results(results):
+    """
+    Merge (columns, values) results of a Lister command. When multiple
+    servers are involved, a "server" column is prepended to all rows.
+    """
+    results = [r for r in results if r.value and r.value[0] is not None]
+    if len(results) == 1:
+        return results[0].value
+    if not results:
         return [], []
 
+    columns = list(results[0].value[0])
+    values = []
+    for result in results:
+        identifier = result.item.oob_info["identifier"]
+        result_columns, result_values = result.value
+        for row in result_values:
+            row = dict(zip(result_columns, row))
+            values.append([identifier, *(row.get(col, "") for col in columns)])
+
+    return ["server", *columns], values
+
 
 class BMCManagerServerCommand(Command):
     """
@@ -163,10 +329,25 @@ class BMCManagerServerCommand(Command):
 
     dcim_fetch_secrets = True
 
+    # failures of nagios checks are reported as UNKNOWN results
+    nagios_check = False
+
+    # interactive commands only work on a single server, destructive
+    # commands need `--all` to work on multiple matching servers
+    interactive = False
+    destructive = False
+
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
         base_arguments(parser)
         server_arguments(parser)
+        if self.destructive:
+            parser.add_argument(
+                "--all",
+                action="store_true",
+                default=False,
+                help="execute the command on all matching servers",
+            )
         return parser
 
     def take_action(self, parsed_args):
@@ -191,7 +372,7 @@ class BMCManagerServerGetCommand(ShowOne):
         return parser
 
     def take_action(self, parsed_args):
-        return bmcmanager_take_action(self, parsed_args)
+        return merge_get_results(bmcmanager_take_action(self, parsed_args))
 
     def action(self, oob):
         raise NotImplementedError
@@ -211,7 +392,7 @@ class BMCManagerServerListCommand(Lister):
         return parser
 
     def take_action(self, parsed_args):
-        return bmcmanager_take_action(self, parsed_args)
+        return merge_list_results(bmcmanager_take_action(self, parsed_args))
 
     def action(self, oob):
         raise NotImplementedError
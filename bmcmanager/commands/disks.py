@@ -33,6 +33,7 @@ class Check(BMCManagerServerCommand):
     """
 
     oob_method = "check_disks"
+    nagios_check = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
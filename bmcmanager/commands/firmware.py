@@ -54,6 +54,7 @@ class Check(BMCManagerServerCommand):
     """
 
     oob_method = "check_firmware"
+    nagios_check = True
     dcim_fetch_secrets = False
 
 
@@ -63,6 +64,7 @@ class UpgradeRPC(BMCManagerServerCommand):
     """
 
     oob_method = "firmware_upgrade_rpc"
+    destructive = True
     all_stages = range(1, 11)
 
     def get_parser(self, prog_name):
@@ -102,6 +104,7 @@ class UpgradeOsput(BMCManagerServerCommand):
     """
 
     oob_method = "firmware_upgrade_osput"
+    destructive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
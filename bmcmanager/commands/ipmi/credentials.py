@@ -30,6 +30,7 @@ class Set(BMCManagerServerCommand):
     """
 
     oob_method = "set_ipmi_password"
+    destructive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
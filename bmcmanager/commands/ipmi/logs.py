@@ -46,6 +46,8 @@ class Clear(BMCManagerServerCommand):
     clear system event logs
     """
 
+    destructive = True
+
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
         parser.add_argument(
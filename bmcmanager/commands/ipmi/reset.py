@@ -22,6 +22,7 @@ class Reset(BMCManagerServerCommand):
     """
 
     oob_method = "ipmi_reset"
+    destructive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
@@ -33,3 +33,14 @@ class Check(BMCManagerServerCommand):
     """
 
     oob_method = "check_ipmi"
+    nagios_check = True
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=30,
+            help="timeout in seconds for each of ipmi-dcmi, ipmi-sel and ipmi-sensors",
+        )
+        return parser
@@ -22,6 +22,7 @@ class SSH(BMCManagerServerCommand):
     """
 
     oob_method = "ipmi_ssh"
+    interactive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
@@ -22,6 +22,7 @@ class Run(BMCManagerServerCommand):
     """
 
     oob_method = "ipmitool"
+    destructive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
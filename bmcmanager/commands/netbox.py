@@ -35,6 +35,7 @@ class SetSecret(BMCManagerServerCommand):
 
     dcim_fetch_secrets = False
     oob_method = "set_secret"
+    destructive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
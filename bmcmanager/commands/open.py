@@ -23,6 +23,7 @@ class DCIM(BMCManagerServerCommand):
 
     dcim_fetch_secrets = False
     oob_method = "open_dcim"
+    interactive = True
 
 
 class Web(BMCManagerServerCommand):
@@ -31,6 +32,7 @@ class Web(BMCManagerServerCommand):
     """
 
     oob_method = "open"
+    interactive = True
     dcim_fetch_secrets = False
 
 
@@ -40,6 +42,7 @@ class Console(BMCManagerServerCommand):
     """
 
     oob_method = "console"
+    interactive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
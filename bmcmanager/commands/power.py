@@ -30,6 +30,7 @@ class PowerOff(BMCManagerServerCommand):
     """
 
     oob_method = "power_off"
+    destructive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
@@ -45,6 +46,12 @@ class PowerOff(BMCManagerServerCommand):
             default=False,
             help="wait for server to power off",
         )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=600,
+            help="seconds to wait for server to power off",
+        )
         return parser
 
 
@@ -54,6 +61,7 @@ class PowerCycle(BMCManagerServerCommand):
     """
 
     oob_method = "power_cycle"
+    destructive = True
 
 
 class PowerReset(BMCManagerServerCommand):
@@ -62,6 +70,7 @@ class PowerReset(BMCManagerServerCommand):
     """
 
     oob_method = "power_reset"
+    destructive = True
 
 
 class PowerStatus(BMCManagerServerCommand):
@@ -0,0 +1,67 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import signal
+import sys
+
+from cliff.command import Command
+
+from bmcmanager import client, sessions
+from bmcmanager.daemon import Server
+from bmcmanager.logs import log
+from bmcmanager.utils import wait
+
+
+class Serve(Command):
+    """
+    execute commands in a long-running process, reusing DCIM and BMC sessions
+    """
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.add_argument(
+            "--socket",
+            default=client.socket_path(),
+            help="path of the unix socket to listen on",
+        )
+        parser.add_argument(
+            "--idle-timeout",
+            type=int,
+            default=300,
+            help="close sessions that have not been used for this many seconds",
+        )
+        return parser
+
+    def take_action(self, parsed_args):
+        if not parsed_args.socket:
+            log.fatal("XDG_RUNTIME_DIR is not set, use --socket to choose a path")
+            sys.exit(1)
+
+        sessions.pool.idle_timeout = parsed_args.idle_timeout
+
+        def terminate(*args):
+            # stop commands that are waiting for a server state
+            wait.cancel_all()
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, terminate)
+
+        try:
+            Server(parsed_args.socket).serve_forever()
+        except OSError as e:
+            log.fatal("Cannot listen on {}: {}".format(parsed_args.socket, e))
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
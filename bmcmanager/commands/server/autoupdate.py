@@ -22,6 +22,7 @@ class Enable(BMCManagerServerCommand):
     """
 
     oob_method = "autoupdate"
+    destructive = True
 
 
 class Disable(BMCManagerServerCommand):
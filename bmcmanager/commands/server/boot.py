@@ -16,7 +16,22 @@
 from bmcmanager.commands.base import BMCManagerServerCommand
 
 
-class Local(BMCManagerServerCommand):
+class Boot(BMCManagerServerCommand):
+    # with --reboot, servers are powered off
+    destructive = True
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.add_argument(
+            "--reboot",
+            action="store_true",
+            default=False,
+            help="power off the server, set the boot device and power it on",
+        )
+        return parser
+
+
+class Local(Boot):
     """
     boot server from local disk
     """
@@ -24,7 +39,7 @@ class Local(BMCManagerServerCommand):
     oob_method = "boot_local"
 
 
-class PXE(BMCManagerServerCommand):
+class PXE(Boot):
     """
     boot server with PXE
     """
@@ -34,6 +34,7 @@ class List(BMCManagerServerListCommand):
 
     def take_action(self, parsed_args):
         dcim = get_dcim(parsed_args, get_config(parsed_args.config_file))
-        values = [[o["info"][col] for col in self.columns] for o in dcim.get_oobs()]
+        # rows are generated while devices are retrieved from the DCIM
+        values = ([o["info"][col] for col in self.columns] for o in dcim.get_oobs())
 
         return self.columns, values
@@ -13,7 +13,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from bmcmanager.commands.base import BMCManagerServerCommand, BMCManagerServerGetCommand
+from bmcmanager.commands.base import (
+    BMCManagerServerCommand,
+    BMCManagerServerGetCommand,
+    BMCManagerServerListCommand,
+    get_oobs,
+    merge_list_results,
+    run_oob_actions,
+)
+from bmcmanager.utils import wait
 
 
 class SSH(BMCManagerServerCommand):
@@ -22,6 +30,7 @@ class SSH(BMCManagerServerCommand):
     """
 
     oob_method = "ssh"
+    interactive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
@@ -31,6 +40,12 @@ class SSH(BMCManagerServerCommand):
             default=False,
             help="wait for server to turn on before starting SSH shell",
         )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=600,
+            help="seconds to wait for server to turn on",
+        )
         return parser
 
 
@@ -40,6 +55,78 @@ class FlushJobs(BMCManagerServerCommand):
     """
 
     oob_method = "flush_jobs"
+    destructive = True
+
+
+class Jobs(BMCManagerServerListCommand):
+    """
+    print server jobs
+    """
+
+    oob_method = "jobs"
+
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.add_argument(
+            "--details",
+            action="store_true",
+            default=False,
+            help="print each job, instead of job counts",
+        )
+        parser.add_argument(
+            "--watch",
+            type=int,
+            metavar="SECONDS",
+            help="refresh every SECONDS, until no jobs are pending",
+        )
+        parser.add_argument(
+            "--full-refresh",
+            type=int,
+            default=300,
+            metavar="SECONDS",
+            help="with --watch, read the whole job queue every SECONDS",
+        )
+        return parser
+
+    def take_action(self, parsed_args):
+        if parsed_args.watch is None:
+            parsed_args.full_refresh = None
+            return super().take_action(parsed_args)
+
+        oobs = get_oobs(self, parsed_args)
+        try:
+            result = {}
+
+            def refresh():
+                if result:
+                    self.produce_output(parsed_args, *result["last"])
+
+                # keep the SSH connections and job queues between refreshes
+                results = run_oob_actions(self, oobs, close=False)
+                result["last"] = merge_list_results(results)
+                return not self._pending(*result["last"])
+
+            wait.wait_for(
+                refresh,
+                "no jobs are pending",
+                initial=parsed_args.watch,
+                maximum=parsed_args.watch,
+                factor=1,
+                jitter=0,
+            )
+            return result["last"]
+        finally:
+            for oob in oobs:
+                oob.close()
+
+    def _pending(self, columns, values):
+        if "state" in columns:
+            index = columns.index("state")
+            return sum(row[index] == "pending" for row in values)
+        if "pending" in columns:
+            index = columns.index("pending")
+            return sum(row[index] or 0 for row in values)
+        return 0
 
 
 class Identify(BMCManagerServerCommand):
@@ -68,6 +155,16 @@ class Diagnostics(BMCManagerServerCommand):
 
     oob_method = "diagnostics"
 
+    def get_parser(self, prog_name):
+        parser = super().get_parser(prog_name)
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=3600,
+            help="seconds to wait for each diagnostics job",
+        )
+        return parser
+
 
 class Info(BMCManagerServerGetCommand):
     """
@@ -77,12 +174,21 @@ class Info(BMCManagerServerGetCommand):
     oob_method = "info"
 
 
+class Inventory(BMCManagerServerListCommand):
+    """
+    print server hardware inventory
+    """
+
+    oob_method = "inventory"
+
+
 class Upgrade(BMCManagerServerCommand):
     """
     upgrade server
     """
 
     oob_method = "upgrade"
+    destructive = True
 
 
 class IdracInfo(BMCManagerServerCommand):
@@ -99,6 +205,7 @@ class FactoryReset(BMCManagerServerCommand):
     """
 
     oob_method = "factory_reset"
+    destructive = True
 
     def get_parser(self, prog_name):
         parser = super().get_parser(prog_name)
@@ -13,7 +13,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from bmcmanager.commands.base import BMCManagerServerCommand, BMCManagerServerGetCommand
+from bmcmanager.commands.base import (
+    BMCManagerServerGetCommand,
+    BMCManagerServerListCommand,
+)
 
 
 class Get(BMCManagerServerGetCommand):
@@ -24,7 +27,7 @@ class Get(BMCManagerServerGetCommand):
     oob_method = "status"
 
 
-class Storage(BMCManagerServerCommand):
+class Storage(BMCManagerServerListCommand):
     """
     print server storage status
     """
@@ -32,7 +35,7 @@ class Storage(BMCManagerServerCommand):
     oob_method = "storage_status"
 
 
-class Controllers(BMCManagerServerCommand):
+class Controllers(BMCManagerServerListCommand):
     """
     print server controllers status
     """
@@ -40,9 +43,17 @@ class Controllers(BMCManagerServerCommand):
     oob_method = "controllers_status"
 
 
-class PDisks(BMCManagerServerCommand):
+class PDisks(BMCManagerServerListCommand):
     """
     print server pdisks status
     """
 
-    oob_method = "controllers_status"
+    oob_method = "pdisks_status"
+
+
+class VDisks(BMCManagerServerListCommand):
+    """
+    print server vdisks status
+    """
+
+    oob_method = "vdisks_status"
@@ -17,6 +17,7 @@ import configparser
 import os
 import sys
 
+from bmcmanager import context
 from bmcmanager.logs import log
 
 
@@ -52,7 +53,7 @@ def get_config(config_path):
         which = config.read(
             [
                 config_path,
-                os.getenv("BMCMANAGER_CONFIG", ""),
+                context.getenv("BMCMANAGER_CONFIG", ""),
                 os.path.expanduser("~/.config/bmcmanager"),
                 "/etc/bmcmanager",
                 *extra_paths,
@@ -0,0 +1,115 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# State of the command that is being executed by the current thread.
+# `bmcmanager serve` executes the commands of multiple clients concurrently,
+# each with its own environment, output streams and exit code. Threads of
+# run_tasks() inherit the context of the thread that starts them.
+
+from contextlib import contextmanager
+import functools
+import os
+import threading
+
+_local = threading.local()
+
+
+class Context(object):
+    """
+    Environment, output streams and exit code of a command
+    """
+
+    def __init__(self, env, stdout, stderr):
+        self.env = env
+        self.stdout = stdout
+        self.stderr = stderr
+        self.exitcode = 0
+
+
+def current():
+    """
+    Return the context of the current thread, or None
+    """
+    return getattr(_local, "context", None)
+
+
+@contextmanager
+def activate(context):
+    """
+    Use context in the current thread
+    """
+    previous = current()
+    _local.context = context
+    try:
+        yield context
+    finally:
+        _local.context = previous
+
+
+def inherit(func):
+    """
+    Wrap func, so that it runs in the context of the calling thread
+    """
+    context = current()
+    if context is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with activate(context):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def getenv(name, default=None):
+    """
+    Like os.getenv(), using the environment of the command
+    """
+    context = current()
+    if context is None:
+        return os.getenv(name, default)
+
+    return context.env.get(name, default)
+
+
+class Stream(object):
+    """
+    Replaces sys.stdout or sys.stderr, writing to the stream of the context
+    of the current thread, or to the original stream
+    """
+
+    def __init__(self, name, stream):
+        self.name = name
+        self.stream = stream
+
+    def _target(self):
+        context = current()
+        if context is None:
+            return self.stream
+
+        return getattr(context, self.name)
+
+    def write(self, data):
+        return self._target().write(data)
+
+    def flush(self):
+        return self._target().flush()
+
+    def isatty(self):
+        return self._target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
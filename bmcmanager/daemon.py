@@ -0,0 +1,220 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+
+from bmcmanager import context, sessions
+from bmcmanager.client import FORWARD_ENV
+from bmcmanager.logs import log
+
+# options whose values are not logged
+SECRET_OPTIONS = ["--new-password", "--secret-plaintext"]
+
+
+class _Writer(object):
+    """
+    File-like object that forwards output to a client, as {name: data}
+    messages
+    """
+
+    encoding = "utf-8"
+
+    def __init__(self, conn, name, lock):
+        self.conn = conn
+        self.name = name
+        self.lock = lock
+
+    def write(self, data):
+        if data:
+            send_message(self.conn, {self.name: data}, self.lock)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def send_message(conn, msg, lock):
+    """
+    Send a JSON line to a client. Errors are ignored, the client may have
+    gone away (e.g. after Ctrl-C).
+    """
+    data = (json.dumps(msg) + "\n").encode("utf-8")
+    with lock:
+        try:
+            conn.sendall(data)
+        except OSError:
+            pass
+
+
+def _read_request(conn):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+
+    return json.loads(data.decode("utf-8"))
+
+
+def _redact(argv):
+    """
+    Return argv with the values of SECRET_OPTIONS (or their abbreviations,
+    as accepted by argparse) replaced
+    """
+    redacted, hide = [], False
+    for arg in argv:
+        name, sep, _ = arg.partition("=")
+        secret = name.startswith("--") and any(
+            option.startswith(name) for option in SECRET_OPTIONS
+        )
+        if hide:
+            arg, hide = "***", False
+        elif secret and sep:
+            arg = name + "=***"
+        elif secret:
+            hide = True
+
+        redacted.append(arg)
+
+    return redacted
+
+
+def _exit_status(code):
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    return 1
+
+
+class Server(object):
+    """
+    Execute bmcmanager commands for clients connecting to a Unix socket.
+    DCIM, credential and BMC sessions are kept open between commands.
+
+    Each connection is handled in its own thread. Commands do not change the
+    process environment or standard streams, they have their own context
+    instead (see bmcmanager.context).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sock = None
+
+    def _bind(self):
+        if os.path.exists(self.path):
+            try:
+                with socket.socket(socket.AF_UNIX) as probe:
+                    probe.connect(self.path)
+                raise OSError("{} is already serving".format(self.path))
+            except ConnectionRefusedError:
+                os.unlink(self.path)
+
+        self.sock = socket.socket(socket.AF_UNIX)
+        umask = os.umask(0o177)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(umask)
+
+        self.sock.listen(16)
+
+    def serve_forever(self):
+        self._bind()
+        log.info("Listening on {}".format(self.path))
+        sessions.pool.keep_alive = True
+        streams = sys.stdout, sys.stderr
+        sys.stdout = context.Stream("stdout", sys.stdout)
+        sys.stderr = context.Stream("stderr", sys.stderr)
+        # wake up regularly to close idle sessions, even without requests
+        self.sock.settimeout(min(60, max(1, sessions.pool.idle_timeout / 4)))
+        try:
+            while True:
+                sessions.pool.close_idle()
+                try:
+                    conn, _ = self.sock.accept()
+                except socket.timeout:
+                    continue
+
+                conn.settimeout(None)
+                thread = threading.Thread(target=self._serve, args=(conn,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            sys.stdout, sys.stderr = streams
+            self.sock.close()
+            os.unlink(self.path)
+            sessions.pool.close_all()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                self.handle(conn)
+            except Exception as e:
+                log.exception("Unhandled exception: {}".format(e))
+
+    def handle(self, conn):
+        lock = threading.Lock()
+        # the client only sends its request after this, see client.forward()
+        send_message(conn, {"ready": True}, lock)
+        try:
+            request = _read_request(conn)
+            argv = request["argv"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("Invalid request: {}".format(e))
+            return
+
+        log.info("Executing {}".format(" ".join(_redact(argv))))
+        code = self.execute(
+            argv,
+            request.get("env", {}),
+            _Writer(conn, "stdout", lock),
+            _Writer(conn, "stderr", lock),
+        )
+        send_message(conn, {"exit": code}, lock)
+
+    def execute(self, argv, env, stdout, stderr):
+        # imported here, so that the client module stays lightweight
+        from bmcmanager.cliff import BMCManagerApp
+
+        env = {k: v for k, v in env.items() if k in FORWARD_ENV}
+        ctx = context.Context(env, stdout, stderr)
+
+        def log_filter(record):
+            return context.current() is ctx
+
+        app = BMCManagerApp(stdout=stdout, stderr=stderr, log_filter=log_filter)
+        with context.activate(ctx):
+            try:
+                code = app.run(argv)
+            except SystemExit as e:
+                code = _exit_status(e.code)
+            except Exception as e:
+                log.exception("Unhandled exception: {}".format(e))
+                code = 1
+            finally:
+                if app.log_handler is not None:
+                    logging.getLogger("").removeHandler(app.log_handler)
+
+        return code
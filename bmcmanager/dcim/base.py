@@ -41,6 +41,13 @@ class DcimBase(object):
     def supports_secrets(self):
         return getattr(self, "get_secret") is not None
 
+    def prefetch_secrets(self, role, oob_infos):
+        """
+        Retrieve secrets for multiple servers at once, to speed up subsequent
+        get_secret() calls. Optional.
+        """
+        pass
+
     def set_custom_fields(self, oob_info, custom_fields):
         return False
 
@@ -0,0 +1,147 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from contextlib import closing
+import json
+import os
+import sqlite3
+import time
+
+from bmcmanager.cache import cache_dir
+from bmcmanager.logs import log
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS queries (
+        key TEXT PRIMARY KEY,
+        params TEXT NOT NULL,
+        watermark TEXT,
+        synced REAL NOT NULL,
+        full_synced REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS devices (
+        key TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (key, id)
+    )
+    """,
+]
+
+
+class CachedQuery(object):
+    """
+    Devices matching a DCIM query, as stored in the inventory cache
+    """
+
+    def __init__(self, params, watermark, synced, full_synced, devices):
+        self.params = params
+        self.watermark = watermark
+        self.synced = synced
+        self.full_synced = full_synced
+        self.devices = devices
+
+    def age(self):
+        return time.time() - self.synced
+
+    def full_age(self):
+        return time.time() - self.full_synced
+
+
+class InventoryCache(object):
+    """
+    Local SQLite cache of DCIM device queries. For each query, it keeps the
+    query parameters, the information of the matching devices (as returned by
+    the DCIM get_oobs()), and a watermark for incremental refreshes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "inventory.sqlite")
+        with self._connect() as db, db:
+            for statement in SCHEMA:
+                db.execute(statement)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=10))
+
+    def get(self, key):
+        try:
+            with self._connect() as db:
+                row = db.execute(
+                    "SELECT params, watermark, synced, full_synced FROM queries "
+                    "WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is None:
+                    return None
+
+                devices = db.execute(
+                    "SELECT data FROM devices WHERE key = ? ORDER BY rowid", (key,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            log.warning("Could not read inventory cache: {}".format(e))
+            return None
+
+        params, watermark, synced, full_synced = row
+        return CachedQuery(
+            json.loads(params),
+            watermark,
+            synced,
+            full_synced,
+            [json.loads(data) for (data,) in devices],
+        )
+
+    def store(self, key, params, watermark, devices, full=True, ids=None):
+        """
+        Store devices for a query. With full=False, the devices are merged
+        with the ones already in the cache, and cached devices whose id is not
+        in `ids` (if given) are removed.
+        """
+        now = time.time()
+        try:
+            with self._connect() as db, db:
+                if full:
+                    db.execute("DELETE FROM devices WHERE key = ?", (key,))
+                    db.execute(
+                        "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?)",
+                        (key, json.dumps(params), watermark, now, now),
+                    )
+                else:
+                    db.execute(
+                        "UPDATE queries SET watermark = ?, synced = ? WHERE key = ?",
+                        (watermark, now, key),
+                    )
+                    if ids is not None:
+                        cached = db.execute(
+                            "SELECT id FROM devices WHERE key = ?", (key,)
+                        ).fetchall()
+                        db.executemany(
+                            "DELETE FROM devices WHERE key = ? AND id = ?",
+                            [(key, i) for (i,) in cached if i not in ids],
+                        )
+
+                # update existing rows in place, so that devices keep their order
+                rows = [(json.dumps(d), key, d["info"]["id"]) for d in devices]
+                db.executemany(
+                    "UPDATE devices SET data = ? WHERE key = ? AND id = ?", rows
+                )
+                db.executemany(
+                    "INSERT OR IGNORE INTO devices (data, key, id) VALUES (?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            log.warning("Could not update inventory cache: {}".format(e))
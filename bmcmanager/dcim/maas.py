@@ -23,6 +23,7 @@ class MaaS(DcimBase):
     def __init__(self, args, config):
         super(MaaS, self).__init__(args, config)
         self._session = None
+        self._power_parameters = {}
 
         if not self.dcim_params["api_url"]:
             raise DcimError("MaaS API URL is not set, see README.md")
@@ -50,6 +51,7 @@ class MaaS(DcimBase):
             power = self.session().Machine.power_parameters(
                 system_id=machine["system_id"]
             )
+            self._power_parameters[machine["system_id"]] = power
             yield {
                 "asset_tag": "",
                 "ipmi": power["power_address"],
@@ -73,9 +75,12 @@ class MaaS(DcimBase):
             }
 
     def get_secret(self, role, oob_info):
-        power = self.session().Machine.power_parameters(
-            system_id=oob_info["info"]["id"]
-        )
+        # power parameters have already been retrieved by get_oobs()
+        power = self._power_parameters.get(oob_info["info"]["id"])
+        if power is None:
+            power = self.session().Machine.power_parameters(
+                system_id=oob_info["info"]["id"]
+            )
         return {
             "name": power["power_user"],
             "plaintext": power["power_pass"],
@@ -14,25 +14,61 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
 import os
+import sqlite3
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from bmcmanager import context, sessions
 from bmcmanager.logs import log
 from bmcmanager.dcim.base import DcimBase, DcimError
+from bmcmanager.dcim.cache import InventoryCache
+
+# maximum number of devices to request secrets for in a single query
+SECRETS_BATCH_SIZE = 50
+
+# device fields used by bmcmanager
+DEVICE_FIELDS = [
+    "id",
+    "name",
+    "display",
+    "serial",
+    "asset_tag",
+    "custom_fields",
+    "device_type",
+    "site",
+    "status",
+    "last_updated",
+]
+
+# only request the device fields used by bmcmanager. "fields" is supported by
+# NetBox 4.0 onwards, "exclude=config_context" by older versions as well.
+PROJECTION_PARAMS = {
+    "fields": ",".join(DEVICE_FIELDS),
+    "exclude": "config_context",
+}
+
+# secrets retrieved by this process, per NetBox url and secret role
+_secrets_cache = {}
 
 
 class Netbox(DcimBase):
     def __init__(self, args, config):
         super(Netbox, self).__init__(args, config)
 
-        self.timeout = 10
-        try:
-            timeout = self.dcim_params.get("timeout", self.timeout)
-            self.timeout = int(timeout)
-        except (TypeError, ValueError):
-            log.warning("Ignoring invalid timeout: {}".format(timeout))
+        self.timeout = self._get_int_param("timeout", 10)
+        self.pool_size = self._get_int_param("pool_size", 10)
+        self.retries = self._get_int_param("retries", 3)
+        self.page_size = self._get_int_param("page_size", 100)
+        self.page_workers = self._get_int_param("page_workers", 4)
+        self.projection = self.dcim_params.get("projection", "true") != "false"
 
         self.device_type_ids = None
         raw_ids = self.dcim_params.get("device_type_id")
@@ -45,7 +81,56 @@ class Netbox(DcimBase):
             except (TypeError, ValueError):
                 log.warning("Ignoring invalid device type ids: {}".format(raw_ids))
 
-        self.info = self._retrieve_info()
+        self.cache = None
+        self.cache_ttl = self._get_int_param("cache_ttl", 0)
+        self.cache_full_refresh = self._get_int_param("cache_full_refresh", 86400)
+        if self.cache_ttl > 0:
+            try:
+                self.cache = InventoryCache()
+            except (OSError, sqlite3.Error) as e:
+                log.warning("Inventory cache is not available: {}".format(e))
+
+        self.secrets_ttl = self._get_int_param("secrets_ttl", 300)
+        self._secrets = _secrets_cache.setdefault(self.api_url, {})
+        self.session = self._get_session()
+
+    def _get_int_param(self, name, default):
+        value = self.dcim_params.get(name, default)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            log.warning("Ignoring invalid {}: {}".format(name, value))
+            return default
+
+    def _get_session(self):
+        """
+        Return the HTTP session for all NetBox requests. Connections are kept
+        alive and reused, and failed idempotent requests are retried.
+        """
+        pool_size = max(self.pool_size, getattr(self.args, "parallel", 1))
+        key = ("netbox", self.api_url, pool_size, self.retries)
+        session = sessions.pool.get(key)
+        if session is None:
+            session = self._create_session(pool_size)
+            sessions.pool.put(key, session, requests.Session.close)
+
+        return session
+
+    def _create_session(self, pool_size):
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
 
     def _get_params(self):
         if self.is_serial:
@@ -96,22 +181,153 @@ class Netbox(DcimBase):
             "HTTP {} {}, {}, {}".format(method.upper(), url, str(params), str(headers))
         )
         try:
-            f = getattr(requests, method)
+            f = getattr(self.session, method)
             return f(url, params=params, headers=headers, timeout=self.timeout)
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
-            # useful instead of a long exception dump
-            sys.stderr.write("Request timed out {}".format(url))
-            exit(1)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            raise DcimError("Request to {} failed: {}".format(url, e))
+
+    def _get_page(self, url, params, offset):
+        response = self._do_request(url, dict(params, offset=offset))
+        if response.status_code >= 400:
+            raise DcimError(
+                "Request failed with {}: {}".format(response.status_code, response.text)
+            )
+
+        return response.json()
+
+    def _iter_results(self, url, params):
+        """
+        Iterate over the results of a paginated NetBox API endpoint. After
+        the first page, up to `page_workers` pages are requested concurrently,
+        ahead of consumption.
+        """
+        params = dict(params, limit=self.page_size)
+        page = self._get_page(url, params, 0)
+        yield from page["results"]
+
+        step = len(page["results"])
+        if not page.get("next") or not step:
+            return
+
+        offsets = iter(range(step, page["count"], step))
+        get_page = context.inherit(self._get_page)
+        with ThreadPoolExecutor(max_workers=self.page_workers) as pool:
+            pending = deque(
+                pool.submit(get_page, url, params, offset)
+                for offset in itertools.islice(offsets, self.page_workers)
+            )
+            while pending:
+                page = pending.popleft().result()
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(pool.submit(get_page, url, params, offset))
+
+                yield from page["results"]
+
+    def _has_device_fields(self, result):
+        try:
+            self._get_oob(result)
+            return "last_updated" in result
+        except (KeyError, TypeError):
+            return False
 
-    def _retrieve_info(self):
+    def _retrieve_info(self, params=None):
         log.debug("Querying the Netbox API for {}".format(self.identifier))
         url = os.path.join(self.api_url, "api/dcim/devices/")
+        params = params or self._get_params()
+
+        if self.projection:
+            results = self._iter_results(url, dict(params, **PROJECTION_PARAMS))
+            try:
+                first = next(results, None)
+                supported = first is None or self._has_device_fields(first)
+            except DcimError as e:
+                log.debug("Field projection failed: {}".format(e))
+                supported = False
+
+            if supported:
+                if first is not None:
+                    yield first
+                yield from results
+                return
+
+            results.close()
+            log.info("Field projection not supported, retrieving full device info")
+
+        yield from self._iter_results(url, params)
+
+    def _retrieve_ids(self, params):
+        url = os.path.join(self.api_url, "api/dcim/devices/")
+        if self.projection:
+            params = dict(params, fields="id", exclude="config_context")
+        return {result["id"] for result in self._iter_results(url, params)}
+
+    def _get_cache_key(self):
+        return json.dumps(
+            [self.api_url, self.args.type, self.identifier, self.device_type_ids]
+        )
+
+    def _retrieve_devices(self):
+        """
+        Retrieve devices matching the query. When the inventory cache is
+        enabled, recently cached devices are used as they are, and older ones
+        are refreshed incrementally, asking NetBox only for devices that have
+        been updated since the last refresh, and for the ids of all matching
+        devices, to drop the ones that have been deleted or no longer match.
+        """
+        if self.cache is None:
+            for result in self._retrieve_info():
+                yield self._get_oob(result)
+            return
+
+        key = self._get_cache_key()
+        cached = self.cache.get(key)
+        if cached is not None and cached.age() < self.cache_ttl:
+            log.debug("Using cached devices for {}".format(self.identifier))
+            yield from cached.devices
+            return
+
+        if (
+            cached is not None
+            and cached.watermark is not None
+            and cached.full_age() < self.cache_full_refresh
+        ):
+            log.debug("Refreshing devices updated since {}".format(cached.watermark))
+            params = dict(cached.params, last_updated__gte=cached.watermark)
+            watermark, updated = cached.watermark, []
+            for result in self._retrieve_info(params):
+                watermark = max(watermark, result.get("last_updated") or "")
+                updated.append(self._get_oob(result))
+
+            ids = self._retrieve_ids(cached.params)
+            devices = {d["info"]["id"]: d for d in cached.devices}
+            devices.update((d["info"]["id"], d) for d in updated)
+
+            # e.g. devices moved into a rack, without being updated themselves
+            missing = sorted(ids.difference(devices))
+            if missing:
+                log.debug("Retrieving {} new matching devices".format(len(missing)))
+            for start in range(0, len(missing), self.page_size):
+                chunk = missing[start : start + self.page_size]
+                for result in self._retrieve_info(dict(cached.params, id=chunk)):
+                    updated.append(self._get_oob(result))
+                    devices[result["id"]] = updated[-1]
+
+            updated = [d for d in updated if d["info"]["id"] in ids]
+            self.cache.store(
+                key, cached.params, watermark, updated, full=False, ids=ids
+            )
+            yield from (d for i, d in devices.items() if i in ids)
+            return
+
         params = self._get_params()
-        params["limit"] = 0
-        json_response = self._do_request(url, params)
-        log.debug("Decoding the response")
-        # we expect the response to be a json object
-        return json_response.json()
+        watermark, devices = "", []
+        for result in self._retrieve_info(params):
+            watermark = max(watermark, result.get("last_updated") or "")
+            devices.append(self._get_oob(result))
+            yield devices[-1]
+
+        self.cache.store(key, params, watermark or None, devices)
 
     def get_short_info(self, result):
         return {
@@ -130,21 +346,76 @@ class Netbox(DcimBase):
         }
 
     def get_info(self):
-        return self.info
+        return list(self.get_oobs())
+
+    def _get_oob(self, result):
+        return {
+            "asset_tag": result["asset_tag"],
+            "ipmi": result["custom_fields"]["IPMI"],
+            "oob": result["device_type"]["manufacturer"]["slug"],
+            "info": self.get_short_info(result),
+            "identifier": result["name"],
+            "custom_fields": result["custom_fields"],
+        }
 
     def get_oobs(self):
-        for result in self.info["results"]:
-            yield {
-                "asset_tag": result["asset_tag"],
-                "ipmi": result["custom_fields"]["IPMI"],
-                "oob": result["device_type"]["manufacturer"]["slug"],
-                "info": self.get_short_info(result),
-                "identifier": result["name"],
-                "custom_fields": result["custom_fields"],
-            }
+        yield from self._retrieve_devices()
+
+    def prefetch_secrets(self, role, oob_infos):
+        """
+        Retrieve secrets with a role for many devices using a few paginated
+        requests. Later get_secret() calls for these devices do not need to
+        query NetBox.
+        """
+        ids = [oob_info["info"]["id"] for oob_info in oob_infos]
+        log.debug("Querying secret {} of {} devices".format(role, len(ids)))
+
+        secrets = {}
+        for idx in range(0, len(ids), SECRETS_BATCH_SIZE):
+            batch = ids[idx : idx + SECRETS_BATCH_SIZE]
+            url = os.path.join(self.api_url, "api/secrets/secrets/")
+            params = {"role": role, "device_id": batch, "limit": 0}
+            try:
+                while url:
+                    response = self._do_request(url, params, with_session_key=True)
+                    data = response.json()
+                    for secret in data["results"]:
+                        secrets.setdefault(secret["device"]["id"], secret)
+
+                    # "next" already contains the query parameters
+                    url, params = data.get("next"), None
+            except (TypeError, KeyError, ValueError) as e:
+                log.warning("Could not prefetch secrets {}: {}".format(role, e))
+                return
+
+        now = time.monotonic()
+        self._secrets.setdefault(role, {}).update(
+            (device_id, (now, secrets.get(device_id))) for device_id in ids
+        )
+
+    def _get_cached_secret(self, role, device_id):
+        fetched, secret = self._secrets.get(role, {}).get(device_id, (None, None))
+        if fetched is None or time.monotonic() - fetched > self.secrets_ttl:
+            raise KeyError(device_id)
+
+        return secret
 
     def get_secret(self, role, oob_info):
         device = oob_info["info"]["name"]
+        try:
+            secret = self._get_cached_secret(role, oob_info["info"]["id"])
+        except KeyError:
+            pass
+        else:
+            if secret is None:
+                log.warning("Did not find secret {} for device {}".format(role, device))
+                return {
+                    "name": None,
+                    "plaintext": None,
+                }
+
+            return secret
+
         log.debug("Querying secret {} of device {}".format(role, device))
         response = self._do_request(
             url=os.path.join(self.api_url, "api/secrets/secrets/"),
@@ -153,7 +424,12 @@ class Netbox(DcimBase):
         )
 
         try:
-            return response.json()["results"][0]
+            secret = response.json()["results"][0]
+            self._secrets.setdefault(role, {})[oob_info["info"]["id"]] = (
+                time.monotonic(),
+                secret,
+            )
+            return secret
 
         except (TypeError, KeyError, IndexError):
             log.warning("Did not find secret {} for device {}".format(role, device))
@@ -183,8 +459,10 @@ class Netbox(DcimBase):
         if role_id is None:
             log.critical("unknown role slug {}".format(role_name))
 
+        self._secrets.get(role_name, {}).pop(oob_info["id"], None)
+
         url = os.path.join(self.api_url, "api/secrets/secrets/")
-        f = requests.post
+        f = self.session.post
 
         existing_secrets = self.get_secrets(oob_info)
         for s in existing_secrets:
@@ -195,7 +473,7 @@ class Netbox(DcimBase):
                     )
                 )
                 url = os.path.join(url, "{}/".format(s["id"]))
-                f = requests.patch
+                f = self.session.patch
                 break
 
         return f(
@@ -207,6 +485,7 @@ class Netbox(DcimBase):
                 "name": secret_name,
                 "plaintext": secret_text,
             },
+            timeout=self.timeout,
         )
 
     def _get_secrets(self, oob_info):
@@ -239,7 +518,7 @@ class Netbox(DcimBase):
 
     def set_custom_fields(self, oob_info, custom_fields):
         return (
-            requests.patch(
+            self.session.patch(
                 url=os.path.join(
                     self.api_url, "api/dcim/devices/{}/".format(oob_info["info"]["id"])
                 ),
@@ -247,6 +526,7 @@ class Netbox(DcimBase):
                 json={
                     "custom_fields": custom_fields,
                 },
+                timeout=self.timeout,
             ).status_code
             == 200
         )
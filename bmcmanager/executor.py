@@ -0,0 +1,79 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from bmcmanager import context
+from bmcmanager.logs import log
+from bmcmanager.utils import wait
+
+
+class TaskResult(object):
+    """
+    Result of running a task for a single item
+    """
+
+    def __init__(self, item, value=None, error=None, elapsed=0.0):
+        self.item = item
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+def _run_task(func, item):
+    start = time.monotonic()
+    try:
+        value, error = func(item), None
+    except Exception as e:
+        log.exception("Unhandled exception: {}".format(e))
+        value, error = None, e
+    except SystemExit as e:
+        # do not abort the tasks of the other items
+        log.error("Task exited with code {}".format(e.code))
+        value, error = None, e
+
+    return TaskResult(item, value, error, time.monotonic() - start)
+
+
+def run_tasks(func, items, parallel=1):
+    """
+    Run func(item) for all items, using at most `parallel` worker threads.
+    Returns a list of TaskResult objects, in the same order as items.
+
+    With parallel <= 1, tasks run one after the other in the calling thread,
+    so that interactive commands keep working as expected.
+    """
+    items = list(items)
+    if parallel <= 1 or len(items) <= 1:
+        return [_run_task(func, item) for item in items]
+
+    workers = min(parallel, len(items))
+    log.debug("Running {} tasks with {} workers".format(len(items), workers))
+    task = context.inherit(_run_task)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(task, func, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        except KeyboardInterrupt:
+            # do not keep waiting for workers that poll a server state
+            wait.cancel_all()
+            for future in futures:
+                future.cancel()
+            raise
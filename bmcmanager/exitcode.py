@@ -13,14 +13,23 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from bmcmanager import context
 
 _exitcode = 0
 
 
 def update(code):
     global _exitcode
-    _exitcode = code
+    ctx = context.current()
+    if ctx is not None:
+        ctx.exitcode = code
+    else:
+        _exitcode = code
 
 
 def get():
+    ctx = context.current()
+    if ctx is not None:
+        return ctx.exitcode
+
     return _exitcode
@@ -0,0 +1,767 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# IPMI commands over a lanplus session. Output is formatted like the output
+# of ipmitool (and of ipmi-sensors for sensors), so that it can be used
+# instead of running them.
+
+import json
+import math
+import struct
+import time
+
+from bmcmanager.cache import write_json
+from bmcmanager.ipmi.lanplus import (
+    NETFN_APP,
+    NETFN_CHASSIS,
+    NETFN_DCMI,
+    NETFN_SENSOR,
+    NETFN_STORAGE,
+    CompletionCodeError,
+    IpmiError,
+)
+from bmcmanager.logs import log
+
+BOOT_DEVICES = {
+    "none": 0x00,
+    "pxe": 0x04,
+    "disk": 0x08,
+    "safe": 0x0C,
+    "diag": 0x10,
+    "cdrom": 0x14,
+    "bios": 0x18,
+}
+
+POWER_CONTROL = {
+    "off": (0x00, "Down/Off"),
+    "on": (0x01, "Up/On"),
+    "cycle": (0x02, "Cycle"),
+    "reset": (0x03, "Reset"),
+    "soft": (0x05, "Soft"),
+}
+
+RESTORE_POLICIES = ["always-off", "previous", "always-on", "unknown"]
+
+SENSOR_TYPES = {
+    0x01: "Temperature",
+    0x02: "Voltage",
+    0x03: "Current",
+    0x04: "Fan",
+    0x05: "Physical Security",
+    0x06: "Platform Security Violation Attempt",
+    0x07: "Processor",
+    0x08: "Power Supply",
+    0x09: "Power Unit",
+    0x0A: "Cooling Device",
+    0x0B: "Other Units Based Sensor",
+    0x0C: "Memory",
+    0x0D: "Drive Slot",
+    0x0E: "POST Memory Resize",
+    0x0F: "System Firmware Progress",
+    0x10: "Event Logging Disabled",
+    0x11: "Watchdog 1",
+    0x12: "System Event",
+    0x13: "Critical Interrupt",
+    0x14: "Button Switch",
+    0x15: "Module Board",
+    0x16: "Microcontroller Coprocessor",
+    0x17: "Add In Card",
+    0x18: "Chassis",
+    0x19: "Chip Set",
+    0x1A: "Other FRU",
+    0x1B: "Cable Interconnect",
+    0x1C: "Terminator",
+    0x1D: "System Boot Initiated",
+    0x1E: "Boot Error",
+    0x1F: "OS Boot",
+    0x20: "OS Critical Stop",
+    0x21: "Slot Connector",
+    0x22: "System ACPI Power State",
+    0x23: "Watchdog 2",
+    0x24: "Platform Alert",
+    0x25: "Entity Presence",
+    0x26: "Monitor ASIC IC",
+    0x27: "LAN",
+    0x28: "Management Subsystem Health",
+    0x29: "Battery",
+    0x2A: "Session Audit",
+    0x2B: "Version Change",
+    0x2C: "FRU State",
+}
+
+UNITS = {
+    1: "C",
+    2: "F",
+    3: "K",
+    4: "V",
+    5: "A",
+    6: "W",
+    7: "J",
+    18: "RPM",
+    19: "Hz",
+}
+
+LINEARIZATION = {
+    0x01: math.log,
+    0x02: math.log10,
+    0x03: math.log2,
+    0x04: math.exp,
+    0x05: lambda x: 10**x,
+    0x06: lambda x: 2**x,
+    0x07: lambda x: 1 / x,
+    0x08: lambda x: x**2,
+    0x09: lambda x: x**3,
+    0x0A: math.sqrt,
+    0x0B: lambda x: math.copysign(abs(x) ** (1 / 3), x),
+}
+
+# (event, state) of sensor-specific offsets, per sensor type
+SENSOR_STATES = {
+    0x07: [
+        ("IERR", "Critical"),
+        ("Thermal Trip", "Critical"),
+        ("FRB1/BIST failure", "Critical"),
+        ("FRB2/Hang in POST failure", "Critical"),
+        ("FRB3/Processor Startup/Initialization failure", "Critical"),
+        ("Configuration Error", "Critical"),
+        ("SMBIOS Uncorrectable CPU-complex Error", "Critical"),
+        ("Processor Presence detected", "Nominal"),
+        ("Processor disabled", "Critical"),
+        ("Terminator Presence Detected", "Nominal"),
+        ("Processor Automatically Throttled", "Warning"),
+        ("Machine Check Exception", "Critical"),
+        ("Correctable Machine Check Error", "Warning"),
+    ],
+    0x08: [
+        ("Presence detected", "Nominal"),
+        ("Power Supply Failure detected", "Critical"),
+        ("Predictive Failure", "Warning"),
+        ("Power Supply input lost (AC/DC)", "Critical"),
+        ("Power Supply input lost or out-of-range", "Critical"),
+        ("Power Supply input out-of-range, but present", "Critical"),
+        ("Configuration error", "Critical"),
+        ("Power Supply Inactive/standby state", "Nominal"),
+    ],
+    0x0C: [
+        ("Correctable ECC", "Warning"),
+        ("Uncorrectable ECC", "Critical"),
+        ("Parity", "Critical"),
+        ("Memory Scrub Failed", "Critical"),
+        ("Memory Device Disabled", "Critical"),
+        ("Correctable ECC memory error logging limit reached", "Warning"),
+        ("Presence detected", "Nominal"),
+        ("Configuration error", "Critical"),
+        ("Spare", "Nominal"),
+        ("Memory Automatically Throttled", "Warning"),
+        ("Critical Overtemperature", "Critical"),
+    ],
+    0x0D: [
+        ("Drive Presence", "Nominal"),
+        ("Drive Fault", "Critical"),
+        ("Predictive Failure", "Warning"),
+        ("Hot Spare", "Nominal"),
+        ("Consistency Check In Progress", "Nominal"),
+        ("In Critical Array", "Critical"),
+        ("In Failed Array", "Critical"),
+        ("Rebuild/Remap In Progress", "Warning"),
+        ("Rebuild/Remap Aborted", "Critical"),
+    ],
+}
+
+# events of threshold sensors, per offset
+THRESHOLD_EVENTS = [
+    "Lower Non-critical going low",
+    "Lower Non-critical going high",
+    "Lower Critical going low",
+    "Lower Critical going high",
+    "Lower Non-recoverable going low",
+    "Lower Non-recoverable going high",
+    "Upper Non-critical going low",
+    "Upper Non-critical going high",
+    "Upper Critical going low",
+    "Upper Critical going high",
+    "Upper Non-recoverable going low",
+    "Upper Non-recoverable going high",
+]
+
+# threshold status bits, in the order of the ipmi-sensors columns
+THRESHOLDS = [
+    (2, 39, "Lower Non-Recoverable"),
+    (1, 40, "Lower Critical"),
+    (0, 41, "Lower Non-Critical"),
+    (3, 38, "Upper Non-Critical"),
+    (4, 37, "Upper Critical"),
+    (5, 36, "Upper Non-Recoverable"),
+]
+
+SEVERITY = ["Nominal", "Warning", "Critical"]
+
+SDR_FULL = 0x01
+SDR_COMPACT = 0x02
+
+EVENT_TYPE_THRESHOLD = 0x01
+EVENT_TYPE_SENSOR_SPECIFIC = 0x6F
+
+# completion code of Get SEL Entry for a record that does not exist
+CC_NOT_PRESENT = 0xCB
+
+SDR_CHUNK = 16
+
+SENSORS_HEADER = (
+    "ID | Name | Type | State | Reading | Units | Lower NR | Lower C | Lower NC"
+    " | Upper NC | Upper C | Upper NR | Event"
+)
+
+
+class NotSupported(Exception):
+    """
+    Raised for commands that are not implemented natively
+    """
+
+    pass
+
+
+def _signed(value, bits):
+    if value & (1 << (bits - 1)):
+        return value - (1 << bits)
+    return value
+
+
+def _deadline(timeout):
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def _remaining(deadline):
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+
+def _hex(data):
+    return " ".join("{:02x}".format(b) for b in data)
+
+
+class Sensor(object):
+    """
+    Sensor described by a full or compact SDR record
+    """
+
+    def __init__(self, record_id, record):
+        self.record_id = record_id
+        self.record = record
+        self.kind = record[3]
+        self.owner = record[5]
+        self.lun = record[6] & 0x03
+        self.number = record[7]
+        self.sensor_type = record[12]
+        self.event_type = record[13]
+        self.units = record[21]
+
+        offset = 47 if self.kind == SDR_FULL else 31
+        length = record[offset] & 0x1F
+        name = record[offset + 1 : offset + 1 + length]
+        self.name = name.decode("latin-1").rstrip("\x00").strip()
+
+    @property
+    def analog(self):
+        return (
+            self.kind == SDR_FULL
+            and self.event_type == EVENT_TYPE_THRESHOLD
+            and self.record[20] >> 6 != 3
+        )
+
+    def convert(self, raw):
+        """
+        Convert a raw reading to a value, using the formula of the SDR
+        """
+        record = self.record
+        analog_format = record[20] >> 6
+        if analog_format == 1:
+            raw = _signed(raw, 8) + (1 if raw & 0x80 else 0)
+        elif analog_format == 2:
+            raw = _signed(raw, 8)
+
+        m = _signed(record[24] | (record[25] & 0xC0) << 2, 10)
+        b = _signed(record[26] | (record[27] & 0xC0) << 2, 10)
+        r_exp = _signed(record[29] >> 4, 4)
+        b_exp = _signed(record[29] & 0x0F, 4)
+
+        value = (m * raw + b * 10**b_exp) * 10**r_exp
+        func = LINEARIZATION.get(record[23] & 0x7F)
+        if func is not None:
+            try:
+                value = func(value)
+            except (ValueError, ZeroDivisionError, OverflowError):
+                return None
+
+        return value
+
+    def thresholds(self):
+        """
+        Return the readable thresholds, in the order of THRESHOLDS
+        """
+        readable = self.record[18]
+        return [
+            self.convert(self.record[offset]) if readable & (1 << bit) else None
+            for bit, offset, _ in THRESHOLDS
+        ]
+
+
+def _format_value(value):
+    return "N/A" if value is None else "{:.2f}".format(value)
+
+
+class Bmc(object):
+    """
+    Run ipmitool-style commands using a lanplus session
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._sdr = None
+        self._commands = [
+            (("chassis", "power", "status"), self.power_status),
+            (("chassis", "power"), self.power_control),
+            (("chassis", "status"), self.chassis_status),
+            (("chassis", "identify"), self.identify),
+            (("chassis", "bootdev"), self.bootdev),
+            (("mc", "info"), self.mc_info),
+            (("mc", "reset"), self.mc_reset),
+            (("sel", "list"), self.sel_list),
+            (("sel", "clear"), self.sel_clear),
+            (("raw",), self.raw),
+        ]
+
+    def close(self):
+        self.session.close()
+
+    def request(self, netfn, cmd, data=b"", timeout=None, lun=0):
+        return self.session.request(netfn, cmd, data, timeout, lun)
+
+    def execute(self, args, timeout=None):
+        """
+        Execute an ipmitool command, e.g. ["chassis", "power", "status"], and
+        return its output. Raises NotSupported for other commands.
+        """
+        for prefix, func in self._commands:
+            if tuple(args[: len(prefix)]) == prefix:
+                return func(list(args[len(prefix) :]), timeout)
+
+        raise NotSupported(" ".join(args))
+
+    def power_status(self, args, timeout):
+        status = self.request(NETFN_CHASSIS, 0x01, timeout=timeout)
+        return "Chassis Power is {}\n".format("on" if status[0] & 0x01 else "off")
+
+    def power_control(self, args, timeout):
+        if len(args) != 1 or args[0] not in POWER_CONTROL:
+            raise NotSupported("chassis power {}".format(" ".join(args)))
+
+        value, name = POWER_CONTROL[args[0]]
+        self.request(NETFN_CHASSIS, 0x02, [value], timeout)
+        return "Chassis Power Control: {}\n".format(name)
+
+    def chassis_status(self, args, timeout):
+        status = self.request(NETFN_CHASSIS, 0x01, timeout=timeout)
+        power, event, misc = status[0], status[1], status[2]
+
+        def flag(value, bit, names=("false", "true")):
+            return names[bool(value & (1 << bit))]
+
+        events = ["ac-failed", "overload", "interlock", "fault", "command"]
+        lines = [
+            ("System Power", flag(power, 0, ("off", "on"))),
+            ("Power Overload", flag(power, 1)),
+            ("Power Interlock", flag(power, 2, ("inactive", "active"))),
+            ("Main Power Fault", flag(power, 3)),
+            ("Power Control Fault", flag(power, 4)),
+            ("Power Restore Policy", RESTORE_POLICIES[power >> 5 & 0x03]),
+            (
+                "Last Power Event",
+                " ".join(name for bit, name in enumerate(events) if event & 1 << bit),
+            ),
+            ("Chassis Intrusion", flag(misc, 0, ("inactive", "active"))),
+            ("Front-Panel Lockout", flag(misc, 1, ("inactive", "active"))),
+            ("Drive Fault", flag(misc, 2)),
+            ("Cooling/Fan Fault", flag(misc, 3)),
+        ]
+        return "".join("{:<20} : {}\n".format(key, value) for key, value in lines)
+
+    def identify(self, args, timeout):
+        interval = args[0] if args else None
+        if interval == "force":
+            data, result = [0, 1], "indefinite"
+        elif interval is None:
+            data, result = [], "default (15 seconds)"
+        else:
+            try:
+                seconds = int(interval)
+            except ValueError:
+                raise NotSupported("chassis identify {}".format(interval))
+            if not 0 <= seconds <= 255:
+                raise IpmiError("Invalid identify interval {}".format(seconds))
+
+            data = [seconds]
+            result = "off" if seconds == 0 else "{} seconds".format(seconds)
+
+        self.request(NETFN_CHASSIS, 0x04, data, timeout)
+        return "Chassis identify interval: {}\n".format(result)
+
+    def bootdev(self, args, timeout):
+        if len(args) != 1 or args[0] not in BOOT_DEVICES:
+            raise NotSupported("chassis bootdev {}".format(" ".join(args)))
+
+        # boot flags parameter, valid for the next boot only
+        data = [0x05, 0x80, BOOT_DEVICES[args[0]], 0, 0, 0]
+        self.request(NETFN_CHASSIS, 0x08, data, timeout)
+        return "Set Boot Device to {}\n".format(args[0])
+
+    def mc_info(self, args, timeout):
+        info = self.request(NETFN_APP, 0x01, timeout=timeout)
+        if len(info) < 11:
+            raise IpmiError("Invalid Get Device ID response")
+
+        manufacturer = info[6] | info[7] << 8 | info[8] << 16
+        product = info[9] | info[10] << 8
+        lines = [
+            ("Device ID", info[0]),
+            ("Device Revision", info[1] & 0x0F),
+            ("Firmware Revision", "{}.{:02x}".format(info[2] & 0x7F, info[3])),
+            ("IPMI Version", "{}.{}".format(info[4] & 0x0F, info[4] >> 4)),
+            ("Manufacturer ID", manufacturer),
+            ("Product ID", "{} (0x{:04x})".format(product, product)),
+            ("Device Available", "no" if info[2] & 0x80 else "yes"),
+            ("Provides Device SDRs", "yes" if info[1] & 0x80 else "no"),
+        ]
+        if len(info) >= 15:
+            lines.append(("Aux Firmware Rev Info", _hex(info[11:15])))
+
+        return "".join("{:<25} : {}\n".format(key, value) for key, value in lines)
+
+    def mc_reset(self, args, timeout):
+        if args not in (["cold"], ["warm"]):
+            raise NotSupported("mc reset {}".format(" ".join(args)))
+
+        self.request(NETFN_APP, 0x02 if args[0] == "cold" else 0x03, timeout=timeout)
+        # the BMC drops the session when it resets
+        self.session.close()
+        return "Sent {} reset command to MC\n".format(args[0])
+
+    def raw(self, args, timeout):
+        try:
+            netfn, cmd, *data = [int(arg, 0) for arg in args]
+        except ValueError:
+            raise NotSupported("raw {}".format(" ".join(args)))
+
+        response = self.request(netfn, cmd, data, timeout)
+        lines = [response[i : i + 16] for i in range(0, len(response), 16)]
+        return "".join(" {}\n".format(_hex(line)) for line in lines) or "\n"
+
+    def sel_clear(self, args, timeout):
+        reservation = self.request(NETFN_STORAGE, 0x42, timeout=timeout)[:2]
+        self.request(NETFN_STORAGE, 0x47, reservation + b"CLR\xaa", timeout)
+        return "Clearing SEL.  Please allow a few seconds to erase.\n"
+
+    def sel_entries(self, timeout=None, start=0):
+        """
+        Yield the raw 16-byte SEL records, starting from record id start
+        """
+        deadline = _deadline(timeout)
+        info = self.request(NETFN_STORAGE, 0x40, timeout=timeout)
+        if struct.unpack("<H", info[1:3])[0] == 0:
+            return
+
+        record_id = start
+        while record_id != 0xFFFF:
+            data = struct.pack("<HHBB", 0, record_id, 0, 0xFF)
+            response = self.request(NETFN_STORAGE, 0x43, data, _remaining(deadline))
+            record_id = struct.unpack("<H", response[:2])[0]
+            yield response[2:18]
+
+    def _sel_event(self, entry):
+        """
+        Return (event, state) of a system event record. The state is
+        Nominal, Warning, Critical or N/A, as in `ipmi-sel --output-event-state`
+        """
+        sensor_type, direction = entry[10], entry[12]
+        offset = entry[13] & 0x0F
+        if direction & 0x7F == EVENT_TYPE_THRESHOLD and offset < len(THRESHOLD_EVENTS):
+            event = THRESHOLD_EVENTS[offset]
+            state = "Warning" if "Non-critical" in event else "Critical"
+        elif direction & 0x7F == EVENT_TYPE_SENSOR_SPECIFIC and offset < len(
+            SENSOR_STATES.get(sensor_type, [])
+        ):
+            event, state = SENSOR_STATES[sensor_type][offset]
+        else:
+            event, state = "Event offset 0x{:02x}".format(offset), "N/A"
+
+        if direction & 0x80:
+            # deassertion events report that the condition is gone
+            state = "Nominal"
+        return event, state
+
+    def _format_sel_entry(self, entry):
+        record_id, record_type, timestamp = struct.unpack("<HBI", entry[:7])
+        if record_type >= 0xC0:
+            return "{:>4x} | OEM record {:02x} | {}".format(
+                record_id, record_type, _hex(entry[3:])
+            )
+
+        if timestamp < 0x20000000:
+            date, hour = "Pre-Init", "{:010d}".format(timestamp)
+        else:
+            date = time.strftime("%m/%d/%Y", time.gmtime(timestamp))
+            hour = time.strftime("%H:%M:%S", time.gmtime(timestamp))
+
+        sensor_type, number, direction = entry[10], entry[11], entry[12]
+        name = "{} #0x{:02x}".format(SENSOR_TYPES.get(sensor_type, "OEM"), number)
+        event, _ = self._sel_event(entry)
+        state = "Deasserted" if direction & 0x80 else "Asserted"
+        return "{:>4x} | {} | {} | {} | {} | {}".format(
+            record_id, date, hour, name, event, state
+        )
+
+    def _sel_record(self, entry):
+        record_id, record_type, timestamp = struct.unpack("<HBI", entry[:7])
+        if record_type >= 0xC0:
+            oem = "OEM record {:02x}".format(record_type)
+            return [str(record_id), "N/A", "N/A", oem, oem, "N/A", _hex(entry[3:])]
+
+        if timestamp < 0x20000000:
+            date = hour = "PostInit"
+        else:
+            date = time.strftime("%b-%d-%Y", time.gmtime(timestamp))
+            hour = time.strftime("%H:%M:%S", time.gmtime(timestamp))
+
+        sensor_type, number = entry[10], entry[11]
+        sensor = SENSOR_TYPES.get(sensor_type, "OEM")
+        name = "{} #0x{:02x}".format(sensor, number)
+        event, state = self._sel_event(entry)
+        return [str(record_id), date, hour, name, sensor, state, event]
+
+    def sel_records(self, start=None, timeout=None):
+        """
+        Return the SEL records with id >= start (all records if start is
+        None), as lists of the columns of `ipmi-sel --output-event-state`:
+        id, date, time, name, type, state, event. Returns an empty list if
+        record start no longer exists, e.g. because the SEL was cleared.
+        """
+        try:
+            entries = self.sel_entries(timeout, start or 0)
+            return [self._sel_record(entry) for entry in entries]
+        except CompletionCodeError as e:
+            if start is None or e.code != CC_NOT_PRESENT:
+                raise
+            return []
+
+    def sel_list(self, args, timeout):
+        if args:
+            raise NotSupported("sel list {}".format(" ".join(args)))
+
+        lines = [self._format_sel_entry(entry) for entry in self.sel_entries(timeout)]
+        if not lines:
+            return "SEL has no entries\n"
+
+        return "".join(line + "\n" for line in lines)
+
+    def power_reading(self, timeout=None):
+        """
+        Return the current power consumption in Watts (DCMI Get Power Reading)
+        """
+        response = self.request(NETFN_DCMI, 0x02, [0xDC, 0x01, 0, 0], timeout)
+        return struct.unpack("<H", response[1:3])[0]
+
+    def _sdr_repository_stamp(self, timeout):
+        """
+        Return the last addition and erase timestamps of the SDR repository,
+        which change when the SDR records change
+        """
+        info = self.request(NETFN_STORAGE, 0x20, timeout=timeout)
+        return list(struct.unpack("<II", info[5:13]))
+
+    def _read_sdr_records(self, deadline):
+        records = []
+        reservation = None
+        record_id = 0
+        while record_id != 0xFFFF:
+            if reservation is None:
+                reservation = self.request(
+                    NETFN_STORAGE, 0x22, timeout=_remaining(deadline)
+                )[:2]
+
+            try:
+                next_id, record = self._read_sdr_record(
+                    reservation, record_id, deadline
+                )
+            except CompletionCodeError as e:
+                if e.code != 0xC5:
+                    raise
+
+                # reservation lost, e.g. another client reserved the repository
+                reservation = None
+                continue
+
+            records.append(record)
+            record_id = next_id
+
+        return records
+
+    def _read_sdr_record(self, reservation, record_id, deadline):
+        def read(offset, count):
+            data = reservation + struct.pack("<HBB", record_id, offset, count)
+            response = self.request(NETFN_STORAGE, 0x23, data, _remaining(deadline))
+            return struct.unpack("<H", response[:2])[0], response[2:]
+
+        next_id, record = read(0, 5)
+        length = 5 + record[4]
+        while len(record) < length:
+            _, chunk = read(len(record), min(SDR_CHUNK, length - len(record)))
+            if not chunk:
+                raise IpmiError("Empty SDR record chunk")
+            record += chunk
+
+        return next_id, record
+
+    def sdr(self, timeout=None, cache=None):
+        """
+        Return the sensors of the SDR repository. The records are kept in
+        memory, and in the cache file if given, until the repository changes.
+        The timeout applies to all requests.
+        """
+        deadline = _deadline(timeout)
+        stamp = self._sdr_repository_stamp(timeout)
+        if self._sdr is not None and self._sdr[0] == stamp:
+            return self._sdr[1]
+
+        records = None
+        if cache is not None:
+            try:
+                with open(cache) as fin:
+                    data = json.load(fin)
+                if data["stamp"] == stamp:
+                    records = [bytes.fromhex(record) for record in data["records"]]
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                log.warning("Ignoring SDR cache {}: {}".format(cache, e))
+
+        if records is None:
+            log.debug("Reading SDR repository")
+            records = self._read_sdr_records(deadline)
+            if cache is not None:
+                try:
+                    write_json(
+                        cache, {"stamp": stamp, "records": [r.hex() for r in records]}
+                    )
+                except OSError as e:
+                    log.warning("Could not write SDR cache {}: {}".format(cache, e))
+
+        sensors = []
+        for record in records:
+            if len(record) < 32 or record[3] not in (SDR_FULL, SDR_COMPACT):
+                continue
+            if record[3] == SDR_FULL and len(record) < 48:
+                continue
+
+            sensors.append(Sensor(struct.unpack("<H", record[:2])[0], record))
+
+        self._sdr = (stamp, sensors)
+        return sensors
+
+    def _sensor_row(self, sensor, reading):
+        sensor_type = SENSOR_TYPES.get(sensor.sensor_type, "OEM Reserved")
+        thresholds = [None] * len(THRESHOLDS)
+        value = unit = None
+        state, events = "Nominal", []
+        if sensor.event_type == EVENT_TYPE_THRESHOLD:
+            if sensor.analog:
+                value = sensor.convert(reading[0])
+                thresholds = sensor.thresholds()
+                unit = UNITS.get(sensor.units)
+
+            status = reading[2] if len(reading) > 2 else 0
+            for bit, _, name in reversed(THRESHOLDS):
+                if status & (1 << bit):
+                    events.append(
+                        "At or {} {} Threshold".format(
+                            "Above (>=)" if name.startswith("Upper") else "Below (<=)",
+                            name,
+                        )
+                    )
+                    if "Non-Critical" not in name:
+                        state = "Critical"
+                    elif state == "Nominal":
+                        state = "Warning"
+        else:
+            asserted = reading[2] if len(reading) > 2 else 0
+            if len(reading) > 3:
+                asserted |= (reading[3] & 0x7F) << 8
+
+            states = []
+            if sensor.event_type == EVENT_TYPE_SENSOR_SPECIFIC:
+                states = SENSOR_STATES.get(sensor.sensor_type, [])
+            if not states:
+                state = "N/A"
+
+            for offset in range(15):
+                if not asserted & (1 << offset):
+                    continue
+                if offset < len(states):
+                    event, offset_state = states[offset]
+                    events.append(event)
+                    state = max(state, offset_state, key=SEVERITY.index)
+                else:
+                    events.append("State offset {}".format(offset))
+
+        return [
+            str(sensor.record_id),
+            sensor.name,
+            sensor_type,
+            state,
+            _format_value(value),
+            unit or "N/A",
+            *map(_format_value, thresholds),
+            "'{}'".format("' '".join(events or ["OK"])),
+        ]
+
+    def sensors(self, timeout=None, cache=None):
+        """
+        Read all sensors, and return them in the format of
+        `ipmi-sensors --output-sensor-state --output-sensor-thresholds`
+        """
+        deadline = _deadline(timeout)
+        lines = [SENSORS_HEADER]
+        for sensor in self.sdr(_remaining(deadline), cache):
+            if sensor.owner != 0x20:
+                # sensors of satellite controllers need bridged requests
+                continue
+
+            try:
+                reading = self.request(
+                    NETFN_SENSOR,
+                    0x2D,
+                    [sensor.number],
+                    _remaining(deadline),
+                    sensor.lun,
+                )
+            except CompletionCodeError as e:
+                log.debug("Skipping sensor {}: {}".format(sensor.name, e))
+                continue
+
+            # skip sensors with scanning disabled or unavailable readings
+            if len(reading) < 2 or not reading[1] & 0x40 or reading[1] & 0x20:
+                continue
+
+            lines.append(" | ".join(self._sensor_row(sensor, reading)))
+
+        return "".join(line + "\n" for line in lines)
@@ -0,0 +1,464 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# IPMI v2.0 RMCP+ ("lanplus") client, using cipher suite 17: RAKP-HMAC-SHA256
+# authentication, HMAC-SHA256-128 integrity and AES-CBC-128 confidentiality.
+# See section 13 of the IPMI v2.0 specification.
+
+import hashlib
+import hmac
+import os
+import socket
+import struct
+import threading
+import time
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from bmcmanager.logs import log
+
+RMCP_HEADER = b"\x06\x00\xff\x07"
+AUTH_TYPE_RMCPP = 0x06
+
+PAYLOAD_IPMI = 0x00
+PAYLOAD_OPEN_SESSION_REQUEST = 0x10
+PAYLOAD_OPEN_SESSION_RESPONSE = 0x11
+PAYLOAD_RAKP1 = 0x12
+PAYLOAD_RAKP2 = 0x13
+PAYLOAD_RAKP3 = 0x14
+PAYLOAD_RAKP4 = 0x15
+
+PAYLOAD_ENCRYPTED = 0x80
+PAYLOAD_AUTHENTICATED = 0x40
+
+# cipher suite 17
+AUTH_RAKP_HMAC_SHA256 = 0x03
+INTEGRITY_HMAC_SHA256_128 = 0x04
+CONFIDENTIALITY_AES_CBC_128 = 0x01
+
+PRIVILEGES = {"callback": 1, "user": 2, "operator": 3, "administrator": 4}
+
+# RAKP 1 role flag, look up the user by name only
+NAME_ONLY_LOOKUP = 0x10
+
+BMC_ADDRESS = 0x20
+CONSOLE_ADDRESS = 0x81
+
+NETFN_CHASSIS = 0x00
+NETFN_SENSOR = 0x04
+NETFN_APP = 0x06
+NETFN_STORAGE = 0x0A
+NETFN_DCMI = 0x2C
+
+CMD_SET_SESSION_PRIVILEGE = 0x3B
+CMD_CLOSE_SESSION = 0x3C
+
+RMCPP_STATUS = {
+    0x01: "insufficient resources to create a session",
+    0x02: "invalid session ID",
+    0x03: "invalid payload type",
+    0x04: "invalid authentication algorithm",
+    0x05: "invalid integrity algorithm",
+    0x09: "inactive session ID",
+    0x0A: "invalid role",
+    0x0B: "unauthorized role or privilege level requested",
+    0x0C: "insufficient resources to create a session at the requested role",
+    0x0D: "invalid name length",
+    0x0E: "unauthorized name",
+    0x0F: "unauthorized GUID",
+    0x10: "invalid integrity check value",
+    0x11: "invalid confidentiality algorithm",
+    0x12: "no cipher suite match with proposed security algorithms",
+}
+
+COMPLETION_CODES = {
+    0xC0: "node busy",
+    0xC1: "invalid command",
+    0xC3: "timeout while processing command",
+    0xC5: "reservation canceled or invalid reservation ID",
+    0xC7: "request data length invalid",
+    0xC9: "parameter out of range",
+    0xCA: "cannot return number of requested data bytes",
+    0xCB: "requested sensor, data, or record not present",
+    0xCC: "invalid data field in request",
+    0xD4: "insufficient privilege level",
+    0xD5: "command not supported in present state",
+    0xFF: "unspecified error",
+}
+
+
+class IpmiError(Exception):
+    pass
+
+
+class IpmiTimeoutError(IpmiError):
+    pass
+
+
+class CompletionCodeError(IpmiError):
+    def __init__(self, code, netfn, cmd):
+        self.code = code
+        super(CompletionCodeError, self).__init__(
+            "netfn 0x{:02x} cmd 0x{:02x}: {} (0x{:02x})".format(
+                netfn, cmd, COMPLETION_CODES.get(code, "error"), code
+            )
+        )
+
+
+def checksum(data):
+    return -sum(data) & 0xFF
+
+
+def hmac_sha256(key, data):
+    return hmac.new(key, data, hashlib.sha256).digest()
+
+
+def encode_request(
+    netfn, cmd, data, seq, lun=0, rs_addr=BMC_ADDRESS, rq_addr=CONSOLE_ADDRESS
+):
+    """
+    Encode an IPMI LAN request message
+    """
+    header = bytes([rs_addr, netfn << 2 | lun])
+    body = bytes([rq_addr, seq << 2, cmd]) + bytes(data)
+    return header + bytes([checksum(header)]) + body + bytes([checksum(body)])
+
+
+def decode_message(message):
+    """
+    Decode an IPMI LAN message. Returns (netfn, seq, cmd, data).
+    """
+    if len(message) < 7:
+        raise IpmiError("IPMI message too short")
+    if checksum(message[:2]) != message[2] or checksum(message[3:-1]) != message[-1]:
+        raise IpmiError("Invalid IPMI message checksum")
+
+    return message[1] >> 2, message[4] >> 2, message[5], message[6:-1]
+
+
+def encrypt(key, payload):
+    pad = (16 - (len(payload) + 1) % 16) % 16
+    data = payload + bytes(range(1, pad + 1)) + bytes([pad])
+    iv = os.urandom(16)
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    return iv + encryptor.update(data) + encryptor.finalize()
+
+
+def decrypt(key, data):
+    if len(data) < 32 or len(data) % 16:
+        raise IpmiError("Invalid encrypted payload length")
+
+    decryptor = Cipher(algorithms.AES(key), modes.CBC(data[:16])).decryptor()
+    plain = decryptor.update(data[16:]) + decryptor.finalize()
+    return plain[: -1 - plain[-1]]
+
+
+class SessionKeys(object):
+    """
+    Keys derived from the RAKP exchange (section 13.31)
+    """
+
+    def __init__(self, kg, rm, rc, role, username):
+        sik = hmac_sha256(kg, rm + rc + bytes([role, len(username)]) + username)
+        self.sik = sik
+        self.k1 = hmac_sha256(sik, b"\x01" * 20)
+        self.aes_key = hmac_sha256(sik, b"\x02" * 20)[:16]
+
+
+def encode_packet(payload_type, payload, session_id=0, seq=0, keys=None):
+    """
+    Encode an RMCP+ packet. With keys, the payload is encrypted and the
+    packet is authenticated.
+    """
+    if keys is not None:
+        payload_type |= PAYLOAD_ENCRYPTED | PAYLOAD_AUTHENTICATED
+        payload = encrypt(keys.aes_key, payload)
+
+    msg = struct.pack(
+        "<BBIIH", AUTH_TYPE_RMCPP, payload_type, session_id, seq, len(payload)
+    )
+    msg += payload
+    if keys is not None:
+        pad = (4 - (len(msg) + 2) % 4) % 4
+        msg += b"\xff" * pad + bytes([pad, 0x07])
+        msg += hmac_sha256(keys.k1, msg)[:16]
+
+    return RMCP_HEADER + msg
+
+
+def decode_packet(packet, keys=None):
+    """
+    Decode an RMCP+ packet. Returns (payload type, session id, seq, payload).
+    """
+    if len(packet) < 16 or packet[:4] != RMCP_HEADER or packet[4] != AUTH_TYPE_RMCPP:
+        raise IpmiError("Not an RMCP+ packet")
+
+    payload_type = packet[5]
+    session_id, seq, length = struct.unpack("<IIH", packet[6:16])
+    payload = packet[16 : 16 + length]
+    if len(payload) != length:
+        raise IpmiError("Truncated RMCP+ packet")
+
+    if payload_type & PAYLOAD_AUTHENTICATED:
+        if keys is None:
+            raise IpmiError("Unexpected authenticated packet")
+        authcode = hmac_sha256(keys.k1, packet[4:-16])[:16]
+        if not hmac.compare_digest(authcode, packet[-16:]):
+            raise IpmiError("Invalid integrity check value")
+
+    if payload_type & PAYLOAD_ENCRYPTED:
+        if keys is None:
+            raise IpmiError("Unexpected encrypted packet")
+        payload = decrypt(keys.aes_key, payload)
+
+    return payload_type & 0x3F, session_id, seq, payload
+
+
+class Session(object):
+    """
+    Authenticated RMCP+ session with a BMC. The session is opened on the
+    first request, and re-opened if it has expired. Requests are serialized,
+    so that the session can be shared by threads.
+    """
+
+    def __init__(
+        self,
+        host,
+        username,
+        password,
+        port=623,
+        privilege="administrator",
+        kg=None,
+        timeout=1.0,
+        retries=3,
+    ):
+        self.host = host
+        self.port = port
+        self.username = (username or "").encode("utf-8")
+        self.password = (password or "").encode("utf-8")
+        self.privilege = PRIVILEGES[privilege]
+        self.kg = kg
+        self.timeout = timeout
+        self.retries = retries
+
+        self._lock = threading.RLock()
+        self._sock = None
+        self._keys = None
+        self._console_id = None
+        self._bmc_id = None
+        self._seq = 0
+        self._rq_seq = 0
+
+    @property
+    def active(self):
+        return self._keys is not None
+
+    def _send_receive(self, packet, match, deadline=None, attempts=None):
+        """
+        Send packet until a response is accepted by match(), which returns
+        None for packets that are not a response to this one
+        """
+        for attempt in range(attempts or self.retries):
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+
+            self._sock.send(packet)
+            attempt_deadline = now + self.timeout
+            if deadline is not None:
+                attempt_deadline = min(attempt_deadline, deadline)
+
+            while True:
+                remaining = attempt_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                self._sock.settimeout(remaining)
+                try:
+                    data = self._sock.recv(65536)
+                except socket.timeout:
+                    break
+                except OSError as e:
+                    raise IpmiError("Cannot reach {}: {}".format(self.host, e))
+
+                try:
+                    result = match(data)
+                except IpmiError as e:
+                    log.debug("Ignoring packet from {}: {}".format(self.host, e))
+                    continue
+
+                if result is not None:
+                    return result
+
+        raise IpmiTimeoutError("No response from {}".format(self.host))
+
+    def _handshake(self, payload_type, payload, response_type, deadline):
+        packet = encode_packet(payload_type, payload)
+
+        def match(data):
+            rtype, _, _, response = decode_packet(data)
+            if rtype != response_type or len(response) < 8:
+                return None
+            if struct.unpack("<I", response[4:8])[0] != self._console_id:
+                return None
+            return response
+
+        response = self._send_receive(packet, match, deadline)
+        if response[1] != 0:
+            raise IpmiError(
+                "Cannot open session: {}".format(
+                    RMCPP_STATUS.get(response[1], "error 0x{:02x}".format(response[1]))
+                )
+            )
+
+        return response
+
+    def open(self, deadline=None):
+        """
+        Open session, using the RAKP handshake (section 13.20)
+        """
+        with self._lock:
+            self.close()
+            log.debug("Opening IPMI session with {}".format(self.host))
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                self._sock.connect((self.host, self.port))
+            except OSError as e:
+                raise IpmiError("Cannot reach {}: {}".format(self.host, e))
+
+            self._console_id = struct.unpack("<I", os.urandom(4))[0] | 1
+            request = struct.pack("<BBxxI", 0, 0, self._console_id)
+            request += bytes([0x00, 0, 0, 8, AUTH_RAKP_HMAC_SHA256, 0, 0, 0])
+            request += bytes([0x01, 0, 0, 8, INTEGRITY_HMAC_SHA256_128, 0, 0, 0])
+            request += bytes([0x02, 0, 0, 8, CONFIDENTIALITY_AES_CBC_128, 0, 0, 0])
+            response = self._handshake(
+                PAYLOAD_OPEN_SESSION_REQUEST,
+                request,
+                PAYLOAD_OPEN_SESSION_RESPONSE,
+                deadline,
+            )
+            bmc_id = struct.unpack("<I", response[8:12])[0]
+
+            rm = os.urandom(16)
+            role = self.privilege | NAME_ONLY_LOOKUP
+            user = self.username
+            rakp1 = struct.pack("<BxxxI", 0, bmc_id) + rm
+            rakp1 += bytes([role, 0, 0, len(user)]) + user
+            rakp2 = self._handshake(PAYLOAD_RAKP1, rakp1, PAYLOAD_RAKP2, deadline)
+
+            rc, guid = rakp2[8:24], rakp2[24:40]
+            kuid = self.password.ljust(20, b"\x00")
+            expected = hmac_sha256(
+                kuid,
+                struct.pack("<II", self._console_id, bmc_id)
+                + rm
+                + rc
+                + guid
+                + bytes([role, len(user)])
+                + user,
+            )
+            if not hmac.compare_digest(expected, rakp2[40:72]):
+                raise IpmiError("Authentication failed, invalid username or password")
+
+            keys = SessionKeys(self.kg or kuid, rm, rc, role, user)
+            authcode = hmac_sha256(
+                kuid,
+                rc
+                + struct.pack("<I", self._console_id)
+                + bytes([role, len(user)])
+                + user,
+            )
+            rakp3 = struct.pack("<BBxxI", 0, 0, bmc_id) + authcode
+            rakp4 = self._handshake(PAYLOAD_RAKP3, rakp3, PAYLOAD_RAKP4, deadline)
+
+            expected = hmac_sha256(keys.sik, rm + struct.pack("<I", bmc_id) + guid)
+            if not hmac.compare_digest(expected[:16], rakp4[8:24]):
+                raise IpmiError("Invalid RAKP 4 integrity check value")
+
+            self._bmc_id = bmc_id
+            self._keys = keys
+            self._seq = 0
+            self._request(
+                NETFN_APP, CMD_SET_SESSION_PRIVILEGE, [self.privilege], deadline
+            )
+
+    def close(self):
+        with self._lock:
+            if self._keys is not None:
+                try:
+                    self._request(
+                        NETFN_APP,
+                        CMD_CLOSE_SESSION,
+                        struct.pack("<I", self._bmc_id),
+                        time.monotonic() + self.timeout,
+                    )
+                except IpmiError as e:
+                    log.debug("Closing IPMI session failed: {}".format(e))
+
+            self._keys = None
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    def _request(self, netfn, cmd, data, deadline, lun=0, attempts=None):
+        self._seq = self._seq % 0xFFFFFFFF + 1
+        self._rq_seq = (self._rq_seq + 1) % 64
+        rq_seq = self._rq_seq
+        message = encode_request(netfn, cmd, data, rq_seq, lun)
+        packet = encode_packet(
+            PAYLOAD_IPMI, message, self._bmc_id, self._seq, self._keys
+        )
+
+        def match(data):
+            ptype, session_id, _, payload = decode_packet(data, self._keys)
+            if ptype != PAYLOAD_IPMI or session_id != self._console_id:
+                return None
+            rnetfn, rseq, rcmd, response = decode_message(payload)
+            if rnetfn != netfn + 1 or rseq != rq_seq or rcmd != cmd:
+                return None
+            return response
+
+        response = self._send_receive(packet, match, deadline, attempts)
+        if not response:
+            raise IpmiError("Empty response")
+        if response[0] != 0:
+            raise CompletionCodeError(response[0], netfn, cmd)
+
+        return response[1:]
+
+    def request(self, netfn, cmd, data=b"", timeout=None, lun=0):
+        """
+        Send an IPMI request, and return the response data without the
+        completion code. Raises CompletionCodeError on errors.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            reused = self.active
+            if not reused:
+                self.open(deadline)
+
+            if not reused:
+                return self._request(netfn, cmd, data, deadline, lun)
+
+            try:
+                return self._request(netfn, cmd, data, deadline, lun, attempts=1)
+            except IpmiTimeoutError:
+                pass
+
+            # the BMC may have closed an idle session
+            log.debug("No response in reused session, opening a new one")
+            self._keys = None
+            self.open(deadline)
+            return self._request(netfn, cmd, data, deadline, lun)
@@ -0,0 +1,466 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Simulated BMC, speaking IPMI v2.0 over RMCP+ with cipher suite 17. It
+# implements the commands used by bmcmanager.ipmi, for testing and
+# benchmarking without hardware:
+#
+#   $ python -m bmcmanager.mock.ipmi --port 6230 --username ADMIN --password ADMIN
+#   $ export BMCMANAGER_USERNAME=ADMIN BMCMANAGER_PASSWORD=ADMIN
+#
+# and set the IPMI address of a server to 127.0.0.1:6230, with
+# `ipmi_backend = native` in the configuration.
+
+import argparse
+import hmac
+import os
+import socketserver
+import struct
+import threading
+import time
+
+from bmcmanager.ipmi import lanplus
+from bmcmanager.ipmi.lanplus import NETFN_APP, hmac_sha256
+from bmcmanager.logs import log
+
+SUITE_17 = bytes(
+    [
+        *(0x00, 0, 0, 8, lanplus.AUTH_RAKP_HMAC_SHA256, 0, 0, 0),
+        *(0x01, 0, 0, 8, lanplus.INTEGRITY_HMAC_SHA256_128, 0, 0, 0),
+        *(0x02, 0, 0, 8, lanplus.CONFIDENTIALITY_AES_CBC_128, 0, 0, 0),
+    ]
+)
+
+CC_OK = 0x00
+CC_INVALID_COMMAND = 0xC1
+CC_INVALID_RESERVATION = 0xC5
+CC_NOT_PRESENT = 0xCB
+CC_INVALID_DATA = 0xCC
+
+
+def full_record(
+    record_id, number, sensor_type, name, unit, m=1, r_exp=0, thresholds=None
+):
+    """
+    Build a full sensor SDR record of a threshold sensor. thresholds maps
+    threshold status bits (see bmcmanager.ipmi.commands.THRESHOLDS) to raw
+    values.
+    """
+    record = bytearray(48)
+    struct.pack_into("<HBB", record, 0, record_id, 0x51, 0x01)
+    record[5:14] = bytes([0x20, 0, number, 0x07, 1, 0x7F, 0x68, sensor_type, 0x01])
+    record[21] = unit
+    record[24] = m & 0xFF
+    record[25] = (m >> 2) & 0xC0
+    record[29] = (r_exp & 0x0F) << 4
+    for bit, raw in (thresholds or {}).items():
+        record[18] |= 1 << bit
+        # upper thresholds are at offsets 38..36, lower at 41..39
+        record[38 - (bit - 3) if bit >= 3 else 41 - bit] = raw
+
+    encoded = name.encode("latin-1")
+    record[47] = 0xC0 | len(encoded)
+    record += encoded
+    record[4] = len(record) - 5
+    return bytes(record)
+
+
+def compact_record(record_id, number, sensor_type, name):
+    """
+    Build a compact SDR record of a sensor-specific discrete sensor
+    """
+    record = bytearray(32)
+    struct.pack_into("<HBB", record, 0, record_id, 0x51, 0x02)
+    record[5:14] = bytes([0x20, 0, number, 0x0A, 1, 0x7F, 0x40, sensor_type, 0x6F])
+
+    encoded = name.encode("latin-1")
+    record[31] = 0xC0 | len(encoded)
+    record += encoded
+    record[4] = len(record) - 5
+    return bytes(record)
+
+
+def sel_record(record_id, timestamp, sensor_type, number, event_type, offset):
+    return struct.pack(
+        "<HBIHBBBBBBB",
+        record_id,
+        0x02,
+        timestamp,
+        0x0020,
+        0x04,
+        sensor_type,
+        number,
+        event_type,
+        offset,
+        0xFF,
+        0xFF,
+    )
+
+
+class _Session(object):
+    def __init__(self, console_id, bmc_id):
+        self.console_id = console_id
+        self.bmc_id = bmc_id
+        self.keys = None
+        self.rm = self.role = self.username = None
+        self.rc = os.urandom(16)
+
+
+class SimulatedBmc(object):
+    """
+    State and protocol handling of a simulated BMC
+    """
+
+    def __init__(self, username="ADMIN", password="ADMIN", latency=0):
+        self.username = username.encode("utf-8")
+        self.kuid = password.encode("utf-8").ljust(20, b"\x00")
+        self.latency = latency
+        self.guid = os.urandom(16)
+        self.sessions_opened = 0
+        self.requests = 0
+
+        self.power = True
+        self.identify = 0
+        self.bootdev = 0
+        self.watts = 245
+        self.sel = [
+            sel_record(1, 1590000000, 0x08, 0x51, 0x6F, 0x00),
+            sel_record(2, 1590000600, 0x01, 0x01, 0x01, 0x09),
+        ]
+        self.sel_reservation = 0
+        self.sel_erase = int(time.time())
+        self.sdr = [
+            full_record(1, 0x01, 0x01, "CPU Temp", 1, thresholds={3: 80, 4: 90, 5: 95}),
+            full_record(
+                2, 0x02, 0x02, "12V", 4, m=6, r_exp=-2, thresholds={1: 180, 4: 220}
+            ),
+            full_record(3, 0x03, 0x04, "FAN1", 18, m=100, thresholds={1: 5}),
+            compact_record(4, 0x04, 0x08, "PSU1 Status"),
+            compact_record(5, 0x05, 0x08, "PSU2 Status"),
+        ]
+        self.sdr_reservation = 0
+        self.sdr_stamp = int(time.time())
+        # sensor number: (raw reading, state bits)
+        self.readings = {
+            0x01: (45, 0x00),
+            0x02: (200, 0x00),
+            0x03: (50, 0x00),
+            0x04: (0, 0x01),
+            0x05: (0, 0x01),
+        }
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def handle(self, packet):
+        """
+        Handle a request packet, and return the response packet or None
+        """
+        if len(packet) < 16 or packet[:4] != lanplus.RMCP_HEADER:
+            return None
+
+        session_id = struct.unpack("<I", packet[6:10])[0]
+        with self._lock:
+            session = self._sessions.get(session_id)
+            try:
+                ptype, _, _, payload = lanplus.decode_packet(
+                    packet, session.keys if session else None
+                )
+            except lanplus.IpmiError as e:
+                log.debug("Dropping packet: {}".format(e))
+                return None
+
+            if ptype == lanplus.PAYLOAD_OPEN_SESSION_REQUEST:
+                return self._open_session(payload)
+            elif ptype == lanplus.PAYLOAD_RAKP1:
+                return self._rakp1(payload)
+            elif ptype == lanplus.PAYLOAD_RAKP3:
+                return self._rakp3(payload)
+            elif ptype == lanplus.PAYLOAD_IPMI and session and session.keys:
+                return self._ipmi(session, payload)
+
+        return None
+
+    def _reply(self, ptype, payload, session=None):
+        if self.latency:
+            time.sleep(self.latency)
+
+        if session is None:
+            return lanplus.encode_packet(ptype, payload)
+
+        return lanplus.encode_packet(
+            ptype, payload, session.console_id, 0, session.keys
+        )
+
+    def _open_session(self, payload):
+        tag = payload[0]
+        console_id = struct.unpack("<I", payload[4:8])[0]
+        if payload[8:32] != SUITE_17:
+            response = struct.pack("<BBBxI", tag, 0x12, 0, console_id)
+            return self._reply(lanplus.PAYLOAD_OPEN_SESSION_RESPONSE, response)
+
+        bmc_id = struct.unpack("<I", os.urandom(4))[0] | 1
+        self._sessions[bmc_id] = _Session(console_id, bmc_id)
+        response = struct.pack("<BBBxII", tag, 0, 4, console_id, bmc_id) + SUITE_17
+        return self._reply(lanplus.PAYLOAD_OPEN_SESSION_RESPONSE, response)
+
+    def _rakp1(self, payload):
+        tag, bmc_id = payload[0], struct.unpack("<I", payload[4:8])[0]
+        session = self._sessions.get(bmc_id)
+        if session is None:
+            return None
+
+        username = payload[28 : 28 + payload[27]]
+        status = 0 if username == self.username else 0x0E
+        session.rm, session.role, session.username = (
+            payload[8:24],
+            payload[24],
+            username,
+        )
+        authcode = hmac_sha256(
+            self.kuid,
+            struct.pack("<II", session.console_id, bmc_id)
+            + session.rm
+            + session.rc
+            + self.guid
+            + bytes([session.role, len(username)])
+            + username,
+        )
+        response = struct.pack("<BBxxI", tag, status, session.console_id)
+        if status == 0:
+            response += session.rc + self.guid + authcode
+        return self._reply(lanplus.PAYLOAD_RAKP2, response)
+
+    def _rakp3(self, payload):
+        tag, bmc_id = payload[0], struct.unpack("<I", payload[4:8])[0]
+        session = self._sessions.get(bmc_id)
+        if session is None or session.rm is None:
+            return None
+
+        role_user = bytes([session.role, len(session.username)]) + session.username
+        expected = hmac_sha256(
+            self.kuid, session.rc + struct.pack("<I", session.console_id) + role_user
+        )
+        if not hmac.compare_digest(expected, payload[8:40]):
+            del self._sessions[bmc_id]
+            response = struct.pack("<BBxxI", tag, 0x0F, session.console_id)
+            return self._reply(lanplus.PAYLOAD_RAKP4, response)
+
+        keys = lanplus.SessionKeys(
+            self.kuid, session.rm, session.rc, session.role, session.username
+        )
+        icv = hmac_sha256(keys.sik, session.rm + struct.pack("<I", bmc_id) + self.guid)
+        response = struct.pack("<BBxxI", tag, 0, session.console_id) + icv[:16]
+        reply = self._reply(lanplus.PAYLOAD_RAKP4, response)
+        session.keys = keys
+        self.sessions_opened += 1
+        return reply
+
+    def _ipmi(self, session, payload):
+        try:
+            netfn, seq, cmd, data = lanplus.decode_message(payload)
+        except lanplus.IpmiError:
+            return None
+
+        self.requests += 1
+        handler = getattr(self, "_cmd_{:02x}_{:02x}".format(netfn, cmd), None)
+        if handler is None:
+            cc, response = CC_INVALID_COMMAND, b""
+        else:
+            cc, response = handler(session, data)
+
+        message = lanplus.encode_request(
+            netfn + 1,
+            cmd,
+            bytes([cc]) + bytes(response),
+            seq,
+            payload[1] & 0x03,
+            rs_addr=lanplus.CONSOLE_ADDRESS,
+            rq_addr=lanplus.BMC_ADDRESS,
+        )
+        reply = self._reply(lanplus.PAYLOAD_IPMI, message, session)
+        if netfn == NETFN_APP and cmd == lanplus.CMD_CLOSE_SESSION:
+            del self._sessions[session.bmc_id]
+        return reply
+
+    # App
+    def _cmd_06_01(self, session, data):
+        return CC_OK, bytes(
+            [0x20, 0x81, 0x02, 0x51, 0x02, 0xBF, 0x7C, 0x2A, 0, 0x69, 0x08]
+        )
+
+    def _cmd_06_02(self, session, data):
+        return CC_OK, b""
+
+    _cmd_06_03 = _cmd_06_02
+
+    def _cmd_06_3b(self, session, data):
+        return CC_OK, bytes([data[0] & 0x0F])
+
+    def _cmd_06_3c(self, session, data):
+        return CC_OK, b""
+
+    # Chassis
+    def _cmd_00_01(self, session, data):
+        identify = 0x60 if self.identify else 0x40
+        return CC_OK, bytes([0x20 | int(self.power), 0x10, identify, 0])
+
+    def _cmd_00_02(self, session, data):
+        if not data or data[0] not in (0, 1, 2, 3, 5):
+            return CC_INVALID_DATA, b""
+
+        self.power = data[0] in (1, 2, 3)
+        return CC_OK, b""
+
+    def _cmd_00_04(self, session, data):
+        self.identify = 1 if len(data) > 1 and data[1] else (data[0] if data else 15)
+        return CC_OK, b""
+
+    def _cmd_00_08(self, session, data):
+        if len(data) == 6 and data[0] == 0x05:
+            self.bootdev = data[2]
+        return CC_OK, b""
+
+    # Sensor
+    def _cmd_04_2d(self, session, data):
+        if not data or data[0] not in self.readings:
+            return CC_NOT_PRESENT, b""
+
+        raw, states = self.readings[data[0]]
+        return CC_OK, bytes([raw, 0xC0, states & 0xFF, 0x80 | states >> 8])
+
+    # Storage, SDR repository
+    def _cmd_0a_20(self, session, data):
+        return CC_OK, struct.pack(
+            "<BHHIIB", 0x51, len(self.sdr), 0xFFFF, self.sdr_stamp, self.sdr_stamp, 0x02
+        )
+
+    def _cmd_0a_22(self, session, data):
+        self.sdr_reservation = self.sdr_reservation % 0xFFFF + 1
+        return CC_OK, struct.pack("<H", self.sdr_reservation)
+
+    def _cmd_0a_23(self, session, data):
+        reservation, record_id, offset, count = struct.unpack("<HHBB", data)
+        if offset and reservation != self.sdr_reservation:
+            return CC_INVALID_RESERVATION, b""
+
+        ids = [struct.unpack("<H", record[:2])[0] for record in self.sdr]
+        index = (
+            0 if record_id == 0 else ids.index(record_id) if record_id in ids else -1
+        )
+        if index < 0:
+            return CC_NOT_PRESENT, b""
+
+        next_id = ids[index + 1] if index + 1 < len(ids) else 0xFFFF
+        record = self.sdr[index]
+        return CC_OK, struct.pack("<H", next_id) + record[offset : offset + count]
+
+    # Storage, SEL
+    def _cmd_0a_40(self, session, data):
+        stamp = struct.unpack("<I", self.sel[-1][3:7])[0] if self.sel else 0
+        return CC_OK, struct.pack(
+            "<BHHIIB", 0x51, len(self.sel), 0xFFFF, stamp, self.sel_erase, 0x02
+        )
+
+    def _cmd_0a_42(self, session, data):
+        self.sel_reservation = self.sel_reservation % 0xFFFF + 1
+        return CC_OK, struct.pack("<H", self.sel_reservation)
+
+    def _cmd_0a_43(self, session, data):
+        _, record_id, offset, count = struct.unpack("<HHBB", data)
+        ids = [struct.unpack("<H", record[:2])[0] for record in self.sel]
+        if not ids:
+            return CC_NOT_PRESENT, b""
+
+        index = (
+            0 if record_id == 0 else ids.index(record_id) if record_id in ids else -1
+        )
+        if index < 0:
+            return CC_NOT_PRESENT, b""
+
+        next_id = ids[index + 1] if index + 1 < len(ids) else 0xFFFF
+        return CC_OK, struct.pack("<H", next_id) + self.sel[index]
+
+    def _cmd_0a_47(self, session, data):
+        if len(data) != 6 or data[2:5] != b"CLR":
+            return CC_INVALID_DATA, b""
+        if struct.unpack("<H", data[:2])[0] != self.sel_reservation:
+            return CC_INVALID_RESERVATION, b""
+
+        self.sel = []
+        self.sel_erase = int(time.time())
+        return CC_OK, b"\x01"
+
+    # DCMI
+    def _cmd_2c_02(self, session, data):
+        if not data or data[0] != 0xDC:
+            return CC_INVALID_DATA, b""
+
+        watts = self.watts
+        return CC_OK, struct.pack(
+            "<BHHHHIIB", 0xDC, watts, watts, watts, watts, int(time.time()), 1000, 0x40
+        )
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        packet, sock = self.request
+        response = self.server.bmc.handle(packet)
+        if response is not None:
+            sock.sendto(response, self.client_address)
+
+
+class Server(socketserver.UDPServer):
+    def __init__(self, bmc, address="127.0.0.1", port=0):
+        self.bmc = bmc
+        super(Server, self).__init__((address, port), _Handler)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+def start(bmc=None, address="127.0.0.1", port=0):
+    """
+    Start a simulated BMC in a background thread, and return the server.
+    Call server.shutdown() to stop it.
+    """
+    server = Server(bmc or SimulatedBmc(), address, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated IPMI lanplus BMC")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6230)
+    parser.add_argument("--username", default="ADMIN")
+    parser.add_argument("--password", default="ADMIN")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds to wait before replies"
+    )
+    args = parser.parse_args()
+
+    bmc = SimulatedBmc(args.username, args.password, args.latency)
+    server = Server(bmc, args.address, args.port)
+    print("Listening on {}:{}".format(args.address, server.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
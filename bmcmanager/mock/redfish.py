@@ -0,0 +1,541 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Simulated Redfish service of a single server, over plain HTTP. It
+# implements the resources and actions used by bmcmanager.oob.redfish, for
+# testing and benchmarking without hardware:
+#
+#   $ python -m bmcmanager.mock.redfish --port 8000 --username ADMIN --password ADMIN
+#   $ export BMCMANAGER_USERNAME=ADMIN BMCMANAGER_PASSWORD=ADMIN
+#
+# and set the IPMI address of a server to http://127.0.0.1:8000, with
+# `driver = redfish` in the configuration.
+
+import argparse
+import copy
+import http.server
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+import urllib.parse
+
+from bmcmanager.logs import log
+
+SESSIONS = "/redfish/v1/SessionService/Sessions"
+SYSTEM = "/redfish/v1/Systems/1"
+MANAGER = "/redfish/v1/Managers/1"
+CHASSIS = "/redfish/v1/Chassis/1"
+SEL = MANAGER + "/LogServices/Sel"
+
+GIB = 1024**3
+
+MAX_EXPAND_LEVELS = 2
+
+
+def _link(path):
+    return {"@odata.id": path}
+
+
+def _error(message):
+    return {
+        "error": {
+            "code": "Base.1.0.GeneralError",
+            "message": message,
+            "@Message.ExtendedInfo": [{"Message": message}],
+        }
+    }
+
+
+def _resources():
+    """
+    Return the resources of the service, keyed by path
+    """
+    resources = {}
+
+    def add(path, **data):
+        resources[path] = {"@odata.id": path, "Id": path.split("/")[-1], **data}
+
+    def collection(path, members):
+        add(path, Members=[_link(member) for member in members])
+
+    ok = {"State": "Enabled", "Health": "OK"}
+
+    resources["/redfish/v1"] = {
+        "@odata.id": "/redfish/v1",
+        "Id": "RootService",
+        "RedfishVersion": "1.6.0",
+        "ProtocolFeaturesSupported": {
+            "ExpandQuery": {
+                "ExpandAll": False,
+                "Levels": True,
+                "Links": False,
+                "NoLinks": True,
+                "MaxLevels": MAX_EXPAND_LEVELS,
+            },
+            "SelectQuery": True,
+        },
+        "Systems": _link("/redfish/v1/Systems"),
+        "Chassis": _link("/redfish/v1/Chassis"),
+        "Managers": _link("/redfish/v1/Managers"),
+        "SessionService": _link("/redfish/v1/SessionService"),
+        "UpdateService": _link("/redfish/v1/UpdateService"),
+    }
+    add("/redfish/v1/SessionService", Sessions=_link(SESSIONS))
+    collection(SESSIONS, [])
+
+    collection("/redfish/v1/Systems", [SYSTEM])
+    add(
+        SYSTEM,
+        Name="System",
+        Manufacturer="Simulated",
+        Model="Redfish Server",
+        SerialNumber="SIM0001",
+        PowerState="On",
+        IndicatorLED="Off",
+        BiosVersion="1.2.3",
+        Status=ok,
+        ProcessorSummary={"Count": 2, "Model": "Simulated CPU"},
+        MemorySummary={"TotalSystemMemoryGiB": 256},
+        Boot={
+            "BootSourceOverrideEnabled": "Disabled",
+            "BootSourceOverrideTarget": "None",
+        },
+        Storage=_link(SYSTEM + "/Storage"),
+        Memory=_link(SYSTEM + "/Memory"),
+        LogServices=_link(SYSTEM + "/LogServices"),
+        Actions={
+            "#ComputerSystem.Reset": {
+                "target": SYSTEM + "/Actions/ComputerSystem.Reset"
+            }
+        },
+    )
+    collection(SYSTEM + "/LogServices", [])
+
+    dimms = ["{}/Memory/DIMM{}".format(SYSTEM, idx) for idx in range(10)]
+    collection(SYSTEM + "/Memory", dimms)
+    for idx, dimm in enumerate(dimms):
+        if idx >= 8:
+            add(dimm, Name="DIMM{}".format(idx), Status={"State": "Absent"})
+            continue
+
+        add(
+            dimm,
+            Name="DIMM{}".format(idx),
+            CapacityMiB=32768,
+            MemoryDeviceType="DDR4",
+            OperatingSpeedMhz=2933,
+            Manufacturer="Simulated",
+            PartNumber="SIM-32G",
+            Status=ok,
+        )
+
+    drives = ["{}/Storage/RAID/Drives/{}".format(SYSTEM, idx) for idx in range(4)]
+    collection(SYSTEM + "/Storage", [SYSTEM + "/Storage/RAID"])
+    add(
+        SYSTEM + "/Storage/RAID",
+        Name="RAID Controller",
+        Status=ok,
+        Drives=[_link(drive) for drive in drives],
+    )
+    for idx, drive in enumerate(drives):
+        add(
+            drive,
+            Name="Drive {}".format(idx),
+            Manufacturer="Simulated",
+            CapacityBytes=960 * GIB if idx < 2 else 3840 * GIB,
+            MediaType="SSD" if idx < 2 else "HDD",
+            Protocol="SAS",
+            CapableSpeedGbs=12,
+            PhysicalLocation={"PartLocation": {"LocationOrdinalValue": idx}},
+            Status=ok,
+        )
+
+    collection("/redfish/v1/Chassis", [CHASSIS])
+    add(
+        CHASSIS,
+        Name="Chassis",
+        Status=ok,
+        Thermal=_link(CHASSIS + "/Thermal"),
+        Power=_link(CHASSIS + "/Power"),
+    )
+    add(
+        CHASSIS + "/Thermal",
+        Temperatures=[
+            {
+                "MemberId": str(idx),
+                "Name": name,
+                "ReadingCelsius": reading,
+                "UpperThresholdNonCritical": 80,
+                "UpperThresholdCritical": 90,
+                "UpperThresholdFatal": 95,
+                "Status": ok,
+            }
+            for idx, (name, reading) in enumerate(
+                [("CPU1 Temp", 45), ("CPU2 Temp", 47), ("Inlet Temp", 22)]
+            )
+        ],
+        Fans=[
+            {
+                "MemberId": str(idx),
+                "Name": "FAN{}".format(idx + 1),
+                "Reading": 6000,
+                "ReadingUnits": "RPM",
+                "LowerThresholdCritical": 500,
+                "Status": ok,
+            }
+            for idx in range(4)
+        ],
+    )
+    add(
+        CHASSIS + "/Power",
+        PowerControl=[{"MemberId": "0", "PowerConsumedWatts": 245}],
+        Voltages=[
+            {
+                "MemberId": "0",
+                "Name": "12V",
+                "ReadingVolts": 12.1,
+                "LowerThresholdCritical": 10.8,
+                "UpperThresholdCritical": 13.2,
+                "Status": ok,
+            }
+        ],
+        PowerSupplies=[
+            {
+                "MemberId": "0",
+                "Name": "PSU1",
+                "Model": "SIM-800W",
+                "PowerCapacityWatts": 800,
+                "LastPowerOutputWatts": 130,
+                "FirmwareVersion": "00.1A.00",
+                "Status": ok,
+            },
+            {
+                "MemberId": "1",
+                "Name": "PSU2",
+                "Model": "SIM-800W",
+                "PowerCapacityWatts": 800,
+                "LastPowerOutputWatts": 0,
+                "FirmwareVersion": "00.1A.00",
+                "Status": {"State": "Enabled", "Health": "Critical"},
+            },
+        ],
+    )
+
+    collection("/redfish/v1/Managers", [MANAGER])
+    add(
+        MANAGER,
+        Name="Manager",
+        FirmwareVersion="2.10",
+        Status=ok,
+        LogServices=_link(MANAGER + "/LogServices"),
+        Actions={"#Manager.Reset": {"target": MANAGER + "/Actions/Manager.Reset"}},
+    )
+    collection(MANAGER + "/LogServices", [SEL])
+    add(
+        SEL,
+        Name="System Event Log",
+        Entries=_link(SEL + "/Entries"),
+        Actions={
+            "#LogService.ClearLog": {"target": SEL + "/Actions/LogService.ClearLog"}
+        },
+    )
+    entries = [
+        ("2020-05-20T10:00:00+00:00", "OK", "System Event", "Log area reset"),
+        ("2020-05-21T12:30:05+00:00", "OK", "Power Supply", "PSU2 presence detected"),
+        ("2020-05-22T08:15:42+00:00", "Critical", "Power Supply", "PSU2 failure"),
+    ]
+    add(
+        SEL + "/Entries",
+        Members=[
+            {
+                "@odata.id": "{}/Entries/{}".format(SEL, idx + 1),
+                "Id": str(idx + 1),
+                "Name": "Log Entry {}".format(idx + 1),
+                "Created": created,
+                "Severity": severity,
+                "SensorType": sensor_type,
+                "EntryType": "SEL",
+                "Message": message,
+            }
+            for idx, (created, severity, sensor_type, message) in enumerate(entries)
+        ],
+    )
+
+    firmwares = [("BIOS", "1.2.3"), ("BMC", "2.10"), ("PSU1", "00.1A.00")]
+    inventory = "/redfish/v1/UpdateService/FirmwareInventory"
+    add("/redfish/v1/UpdateService", FirmwareInventory=_link(inventory))
+    collection(inventory, ["{}/{}".format(inventory, name) for name, _ in firmwares])
+    for name, version in firmwares:
+        add(
+            "{}/{}".format(inventory, name),
+            Name=name,
+            Version=version,
+            Updateable=True,
+            Status=ok,
+        )
+
+    return resources
+
+
+class SimulatedRedfish(object):
+    """
+    State of the simulated Redfish service
+    """
+
+    def __init__(self, username="ADMIN", password="ADMIN", latency=0, query=True):
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.resources = _resources()
+        if not query:
+            # a service without $expand and $select
+            del self.resources["/redfish/v1"]["ProtocolFeaturesSupported"]
+        self.logins = 0
+        self.requests = 0
+
+        # session token to session path
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def expire_sessions(self):
+        with self._lock:
+            self._sessions.clear()
+            self.resources[SESSIONS]["Members"] = []
+
+    def handle(self, method, path, token, body):
+        """
+        Handle a request, and return (status, headers, data)
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urllib.parse.urlsplit(path)
+        path = url.path.rstrip("/") or "/"
+        query = urllib.parse.parse_qs(url.query)
+        with self._lock:
+            self.requests += 1
+            if method == "POST" and path == SESSIONS:
+                return self._login(body)
+
+            if path not in ("/redfish", "/redfish/v1") and token not in self._sessions:
+                return 401, {}, _error("Authentication required")
+
+            if method == "GET":
+                return self._get(path, query)
+
+            if method == "PATCH":
+                return self._patch(path, body)
+
+            if method == "DELETE" and path == self._sessions.get(token):
+                self._logout(token)
+                return 204, {}, None
+
+            if method == "POST" and "/Actions/" in path:
+                resource, action = path.split("/Actions/")
+                return self._action(resource, action, body)
+
+            return 405, {}, _error("Method not allowed")
+
+    def _get(self, path, query):
+        resource = self.resources.get(path)
+        if resource is None:
+            return 404, {}, _error("Resource not found")
+
+        # query parameters are ignored if not advertised, like some BMCs do
+        supported = "ProtocolFeaturesSupported" in self.resources["/redfish/v1"]
+        if supported and "$expand" in query:
+            match = re.match(r"^\.(?:\(\$levels=(\d+)\))?$", query["$expand"][0])
+            levels = int(match.group(1) or 1) if match else 0
+            if not 0 < levels <= MAX_EXPAND_LEVELS:
+                return 400, {}, _error("Unsupported $expand")
+
+            resource = self._expand(resource, levels)
+
+        if supported and "$select" in query:
+            select = query["$select"][0].split(",")
+            resource = {
+                key: value
+                for key, value in resource.items()
+                if key in select or key.startswith("@odata.")
+            }
+
+        return 200, {}, copy.deepcopy(resource)
+
+    def _expand(self, resource, levels):
+        """
+        Replace references to subordinate resources with the resources, for
+        the given number of levels
+        """
+
+        def expand(value):
+            if isinstance(value, list):
+                return [expand(item) for item in value]
+
+            if isinstance(value, dict) and list(value) == ["@odata.id"]:
+                subordinate = self.resources.get(value["@odata.id"])
+                if subordinate is not None:
+                    return self._expand(subordinate, levels - 1)
+
+            return value
+
+        if levels <= 0:
+            return resource
+
+        return {
+            key: value if key == "Links" else expand(value)
+            for key, value in resource.items()
+        }
+
+    def _login(self, body):
+        if (body.get("UserName"), body.get("Password")) != (
+            self.username,
+            self.password,
+        ):
+            return 401, {}, _error("Invalid username or password")
+
+        self.logins += 1
+        token = os.urandom(16).hex()
+        path = "{}/{}".format(SESSIONS, self.logins)
+        self._sessions[token] = path
+        self.resources[SESSIONS]["Members"].append(_link(path))
+        self.resources[path] = {"@odata.id": path, "Id": str(self.logins)}
+        return 201, {"X-Auth-Token": token, "Location": path}, {"@odata.id": path}
+
+    def _logout(self, token):
+        path = self._sessions.pop(token)
+        self.resources.pop(path, None)
+        self.resources[SESSIONS]["Members"].remove(_link(path))
+
+    def _patch(self, path, body):
+        resource = self.resources.get(path)
+        if resource is None:
+            return 404, {}, _error("Resource not found")
+
+        for key, value in body.items():
+            if key not in resource:
+                return 400, {}, _error("Property {} is not writable".format(key))
+
+            if isinstance(value, dict):
+                resource[key].update(value)
+            else:
+                resource[key] = value
+
+        return 200, {}, copy.deepcopy(resource)
+
+    def _action(self, path, action, body):
+        resource = self.resources.get(path)
+        if resource is None or "#{}".format(action) not in resource.get("Actions", {}):
+            return 404, {}, _error("Action not found")
+
+        if action == "ComputerSystem.Reset":
+            reset_type = body.get("ResetType")
+            if reset_type in ("ForceOff", "GracefulShutdown"):
+                resource["PowerState"] = "Off"
+            elif reset_type in ("On", "ForceOn", "ForceRestart", "PowerCycle"):
+                resource["PowerState"] = "On"
+            else:
+                return 400, {}, _error("Invalid ResetType {}".format(reset_type))
+        elif action == "LogService.ClearLog":
+            self.resources[path + "/Entries"]["Members"] = []
+
+        return 204, {}, None
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # keep-alive connections, without delayed replies
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            body = None
+
+        if body is None:
+            status, headers, data = 400, {}, _error("Invalid JSON")
+        else:
+            status, headers, data = self.server.redfish.handle(
+                self.command, self.path, self.headers.get("X-Auth-Token"), body
+            )
+
+        payload = json.dumps(data).encode() if data is not None else b""
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if payload:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, fmt, *args):
+        log.debug("Redfish: {}".format(fmt % args))
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, redfish, address="127.0.0.1", port=0):
+        super(Server, self).__init__((address, port), Handler)
+        self.redfish = redfish
+        self.port = self.server_address[1]
+
+
+def start(redfish=None, address="127.0.0.1", port=0):
+    """
+    Start a simulated Redfish service in a background thread, and return the
+    server. Call server.shutdown() to stop it.
+    """
+    server = Server(redfish or SimulatedRedfish(), address, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Redfish service")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--username", default="ADMIN")
+    parser.add_argument("--password", default="ADMIN")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds to wait before replies"
+    )
+    parser.add_argument(
+        "--no-query",
+        action="store_true",
+        help="do not support the $expand and $select query parameters",
+    )
+    args = parser.parse_args()
+
+    redfish = SimulatedRedfish(
+        args.username, args.password, args.latency, query=not args.no_query
+    )
+    server = Server(redfish, args.address, args.port)
+    print("Listening on http://{}:{}".format(args.address, server.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
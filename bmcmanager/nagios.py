@@ -14,6 +14,12 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+from contextlib import contextmanager
+import re
+import sys
+import threading
+import time
+
 from bmcmanager import exitcode
 
 OK, WARNING, CRITICAL, UNKNOWN = range(4)
@@ -24,21 +30,129 @@ RESULT = {
     UNKNOWN: "UNKNOWN",
 }
 
+# states, from best to worst
+SEVERITY = [OK, UNKNOWN, WARNING, CRITICAL]
 
-def result(status, msg, lines=[], perfdata=[], pre=""):
-    if isinstance(msg, list):
-        msg = ", ".join(msg)
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def worst(states):
+    """
+    Return the worst of a list of states
+    """
+    return max(states, key=SEVERITY.index, default=OK)
+
+
+class Result(object):
+    """
+    Result of a single Nagios check
+    """
+
+    def __init__(self, status, msg, lines=[], perfdata=[], pre="", name=None):
+        if isinstance(msg, list):
+            msg = ", ".join(msg)
+
+        self.status = status
+        self.msg = msg
+        self.lines = list(lines)
+        self.perfdata = list(perfdata)
+        self.pre = pre
+        self.name = name
+        self.elapsed = None
+
+    def summary(self):
+        return "{} {}: {}".format(self.pre, RESULT[self.status], self.msg).strip()
+
+    def text(self):
+        out = [self.summary() + (" |" if self.lines or self.perfdata else "")]
+        out.extend(line.replace("|", "/") for line in self.lines)
+        if self.perfdata:
+            out.append("| " + "\n".join(self.perfdata))
+
+        return "\n".join(out) + "\n"
+
+
+class Collector(object):
+    """
+    Collects the results of Nagios checks that run concurrently, so that they
+    can be reported together.
+    """
 
-    print("{} {}: {}".format(pre, RESULT[status], msg).strip(), end="")
-    print(" |" if lines or perfdata else "")
+    def __init__(self):
+        self.results = []
+        self._lock = threading.Lock()
 
-    for line in lines:
-        print(line.replace("|", "/"))
+    @contextmanager
+    def collect(self, name=None):
+        """
+        Collect results of checks that run in the current thread
+        """
+        previous = getattr(_local, "collect", None)
+        _local.collect = (self, name, time.monotonic())
+        try:
+            yield self
+        finally:
+            _local.collect = previous
 
-    if perfdata:
-        print("| ", end="")
+    def add(self, result):
+        with self._lock:
+            self.results.append(result)
+
+    def status(self):
+        return worst(r.status for r in self.results)
+
+    def _perfdata(self, result):
+        if result.name is None:
+            return result.perfdata
+
+        def rename(match):
+            return "'{} {}'=".format(result.name, match.group(1))
+
+        return [re.sub(r"'([^']*)'=", rename, p) for p in result.perfdata]
+
+    def text(self):
+        """
+        Format collected results. Multiple results are merged into a single
+        report, with the worst state first.
+        """
+        if len(self.results) <= 1:
+            return "".join(r.text() for r in self.results)
+
+        results = sorted(
+            self.results, key=lambda r: (-SEVERITY.index(r.status), r.name or "")
+        )
+        counts = [
+            "{} {}".format(len([r for r in results if r.status == s]), RESULT[s])
+            for s in reversed(SEVERITY)
+            if any(r.status == s for r in results)
+        ]
+
+        lines, perfdata = [], []
+        for result in results:
+            lines.append(result.summary())
+            lines.extend("  {}".format(line) for line in result.lines)
+            perfdata.extend(self._perfdata(result))
+
+        return Result(self.status(), counts, lines, perfdata).text()
+
+    def report(self):
+        sys.stdout.write(self.text())
+        sys.stdout.flush()
+
+
+def result(status, msg, lines=[], perfdata=[], pre=""):
+    collect = getattr(_local, "collect", None)
+    if collect is None:
+        res = Result(status, msg, lines, perfdata, pre)
+        sys.stdout.write(res.text())
+    else:
+        collector, name, start = collect
+        res = Result(status, msg, lines, perfdata, pre, name)
+        res.elapsed = time.monotonic() - start
+        collector.add(res)
 
-    for perf in perfdata:
-        print(perf)
+    with _lock:
+        exitcode.update(worst([exitcode.get(), status]))
 
-    exitcode.update(status)
+    return res
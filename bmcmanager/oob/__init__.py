@@ -16,10 +16,12 @@
 from bmcmanager.oob.lenovo import Lenovo
 from bmcmanager.oob.dell import Dell
 from bmcmanager.oob.fujitsu import Fujitsu
+from bmcmanager.oob.redfish import Redfish
 
 OOBS = {
     "lenovo": Lenovo,
     "dell": Dell,
     "dell-inc": Dell,
     "fujitsu": Fujitsu,
+    "redfish": Redfish,
 }
@@ -16,13 +16,30 @@
 
 import os
 import re
-from subprocess import Popen, check_output, CalledProcessError, call
+from subprocess import (
+    Popen,
+    check_output,
+    CalledProcessError,
+    TimeoutExpired,
+    call,
+    run,
+    PIPE,
+)
 import sys
+import tempfile
+import threading
+import time
+import uuid
 
 import paramiko
 
+from bmcmanager import context, sessions
+from bmcmanager.executor import run_tasks
 from bmcmanager.interactive import posix_shell
-from bmcmanager.utils import firmware
+from bmcmanager.ipmi import lanplus
+from bmcmanager.ipmi.commands import Bmc, NotSupported
+from bmcmanager.oob.cache import SelCache, sdr_cache_dir
+from bmcmanager.utils import firmware, wait
 from bmcmanager import nagios
 from bmcmanager.logs import log
 
@@ -59,17 +76,62 @@ class OobBase(object):
 
     URL_LOGIN = "/rpc/WEBSES/create.asp"
     URL_VALIDATE = "/rpc/WEBSES/validate.asp"
+    URL_LOGOUT = "/rpc/WEBSES/logout.asp"
     URL_VNC = "/Java/jviewer.jnlp?EXTRNIP={}&JNLPSTR=JViewer"
 
+    # guards creating native IPMI sessions from concurrent collectors
+    _native_lock = threading.Lock()
+
     def __init__(self, parsed_args, dcim, oob_config, oob_info):
         self.parsed_args = parsed_args
         self.oob_info = oob_info
         self.dcim = dcim
         self.oob_config = oob_config
-        self.username = self.oob_config["username"]
-        self.password = self.oob_config["password"]
         self.nfs_share = self.oob_config["nfs_share"]
         self.http_share = self.oob_config["http_share"]
+        self._credentials = None
+
+    def _get_credentials(self):
+        """
+        Resolve the OOB credentials. The DCIM secret is only retrieved the
+        first time the username or password is needed.
+        """
+        if self._credentials is not None:
+            return self._credentials
+
+        username = context.getenv("BMCMANAGER_USERNAME")
+        password = context.getenv("BMCMANAGER_PASSWORD")
+
+        get_secret = self.oob_config.get("get_secret")
+        if get_secret is not None and (username is None or password is None):
+            secret = get_secret()
+            if secret["name"] and username is None:
+                username = secret["name"]
+            if secret["plaintext"] and password is None:
+                password = secret["plaintext"]
+
+        if username is None:
+            username = self.oob_config["username"]
+        if password is None:
+            password = self.oob_config["password"]
+
+        self._credentials = (username, password)
+        return self._credentials
+
+    @property
+    def username(self):
+        return self._get_credentials()[0]
+
+    @property
+    def password(self):
+        return self._get_credentials()[1]
+
+    def close(self):
+        """
+        Called when a command is done with the OOB, to release any sessions
+        """
+        if self._credentials is not None and self._native_backend():
+            sessions.pool.release(self._native_key())
 
     def _print(self, msg):
         sys.stdout.write("{}:\n{}\n".format(self.oob_info["identifier"], msg))
@@ -100,15 +162,33 @@ class OobBase(object):
     def open(self):
         self._execute_popen([BROWSER_OPEN, self._get_http_ipmi_host()])
 
+    def _get_power_state(self):
+        """
+        Return "on" or "off"
+        """
+        stdout = self._execute(["chassis", "power", "status"], output=True)
+        return "off" if "off" in stdout else "on"
+
+    def _wait_for_power(self, state, timeout=None):
+        """
+        Poll the power status with backoff, until it is "on" or "off"
+        """
+        try:
+            wait.wait_for(
+                lambda: self._get_power_state() == state,
+                "power is {}".format(state),
+                timeout=timeout,
+                maximum=10,
+                errors=(OobError,),
+            )
+        except wait.WaitError as e:
+            raise OobTimeoutError(str(e))
+
     def ssh(self):
-        status_command = ["chassis", "power", "status"]
         if self.parsed_args.wait:
-            if "off" in self._execute(status_command, output=True):
+            if self._get_power_state() == "off":
                 log.info("Waiting for machine to turn on...")
-
-            while 1:
-                if "off" not in self._execute(status_command, output=True):
-                    break
+                self._wait_for_power("on", self.parsed_args.timeout)
 
         host = self.oob_info["asset_tag"]
         if not host:
@@ -130,25 +210,142 @@ class OobBase(object):
             "-C 17",
         ]
 
+    def _native_backend(self):
+        backend = self.oob_config["oob_params"].get("ipmi_backend", "ipmitool")
+        return backend == "native" and bool(self.oob_info["ipmi"])
+
+    def _native_key(self):
+        return ("ipmi", self.oob_info["ipmi"].replace("https://", ""), self.username)
+
+    def _get_native_bmc(self):
+        """
+        Return the native IPMI client of the BMC, or None if the native
+        backend is not enabled. The lanplus session is kept in the session
+        pool, so that all commands of the BMC reuse it.
+        """
+        if not self._native_backend():
+            return None
+
+        key = self._native_key()
+        with self._native_lock:
+            bmc = sessions.pool.get(key)
+            if bmc is None:
+                host, _, port = key[1].partition(":")
+                session = lanplus.Session(
+                    host, self.username, self.password, port=int(port or 623)
+                )
+                bmc = Bmc(session)
+                sessions.pool.put(key, bmc, Bmc.close)
+
+        return bmc
+
+    def _native(self, func, *args):
+        try:
+            return func(*args)
+        except lanplus.IpmiTimeoutError as e:
+            raise OobTimeoutError(str(e))
+        except lanplus.IpmiError as e:
+            raise OobError("IPMI request failed: {}".format(e))
+
     # command is an array
-    def _execute(self, command, output=False):
+    def _execute(self, command, output=False, timeout=None):
         if not self.oob_info["ipmi"]:
             log.warn("No IPMI field for {}".format(self.oob_info["oob"]))
             return ""
 
+        bmc = self._get_native_bmc()
+        if bmc is not None:
+            try:
+                result = self._native(bmc.execute, command, timeout)
+                if output:
+                    return result
+
+                sys.stdout.write(result)
+                return
+            except NotSupported:
+                log.debug("Using ipmitool for {}".format(" ".join(command)))
+
         prefix = self._get_ipmi_tool_prefix()
         command = prefix + command
 
-        return self._execute_cmd(command, output)
+        return self._execute_cmd(command, output, timeout)
+
+    # commands is an array of arrays
+    def _execute_batch(self, commands, output=False, timeout=None):
+        """
+        Execute multiple ipmitool commands in order, using a single IPMI
+        session, and return the output of each command. Only for commands
+        that do not depend on the output of previous ones: a failed command
+        is reported on stderr, and does not stop the following commands.
+        """
+        if not self.oob_info["ipmi"]:
+            log.warn("No IPMI field for {}".format(self.oob_info["oob"]))
+            return [""] * len(commands)
+
+        if len(commands) == 1 or self._native_backend():
+            # native commands share the session of the BMC anyway
+            results = [self._execute(command, True, timeout) for command in commands]
+        else:
+            results = self._execute_script(commands, timeout)
+
+        if output:
+            return results
+
+        sys.stdout.write("".join(results))
+
+    def _execute_script(self, commands, timeout=None):
+        """
+        Execute commands with `ipmitool exec`. An `echo` of a unique marker
+        after each command separates their output.
+        """
+        marker = "bmcmanager-{}".format(uuid.uuid4().hex)
+        fd, path = tempfile.mkstemp(prefix="bmcmanager-", suffix=".ipmitool")
+        try:
+            with os.fdopen(fd, "w") as fout:
+                for idx, command in enumerate(commands):
+                    fout.write(" ".join(map(_exec_quote, command)) + "\n")
+                    fout.write("echo {} {}\n".format(marker, idx))
+
+            stdout = self._execute(["exec", path], output=True, timeout=timeout)
+        finally:
+            os.unlink(path)
+
+        results, lines = [], []
+        for line in stdout.splitlines(keepends=True):
+            if line.strip() == "{} {}".format(marker, len(results)):
+                results.append("".join(lines))
+                lines = []
+            else:
+                lines.append(line)
+
+        if len(results) != len(commands):
+            raise OobError(
+                "ipmitool exec stopped after {}/{} commands".format(
+                    len(results), len(commands)
+                )
+            )
+
+        return results
 
     # command is an array
-    def _execute_cmd(self, command, output=False):
+    def _execute_cmd(self, command, output=False, timeout=None):
         log.debug("Executing {}".format(" ".join(command)))
         try:
             if output:
-                return check_output(command).decode("utf-8")
-
-            call(command)
+                return check_output(command, timeout=timeout).decode("utf-8")
+
+            if sys.stdout is not sys.__stdout__:
+                # output is redirected, e.g. to a `bmcmanager serve` client
+                result = run(command, stdout=PIPE, stderr=PIPE, timeout=timeout)
+                sys.stdout.write(result.stdout.decode("utf-8", "replace"))
+                sys.stderr.write(result.stderr.decode("utf-8", "replace"))
+                return
+
+            call(command, timeout=timeout)
+        except TimeoutExpired:
+            raise OobTimeoutError(
+                "Command {} timed out after {} seconds".format(command[0], timeout)
+            )
         except CalledProcessError as e:
             raise OobError("Command {} failed: {}".format(" ".join(command), str(e)))
         except UnicodeError as e:
@@ -192,12 +389,17 @@ class OobBase(object):
             cmd.append("off")
         else:
             cmd.append("soft")
-        self._execute(cmd)
-        if self.parsed_args.wait:
-            while 1:
-                stdout = self._execute(["chassis", "power", "status"], output=True)
-                if "off" in stdout:
-                    break
+
+        if not self.parsed_args.wait:
+            self._execute(cmd)
+            return
+
+        # the first status check uses the same session as the power off
+        status_cmd = ["chassis", "power", "status"]
+        result, stdout = self._execute_batch([cmd, status_cmd], output=True)
+        sys.stdout.write(result)
+        if "off" not in stdout:
+            self._wait_for_power("off", self.parsed_args.timeout)
 
     def power_cycle(self):
         self._execute(["chassis", "power", "cycle"])
@@ -205,11 +407,22 @@ class OobBase(object):
     def power_reset(self):
         self._execute(["chassis", "power", "reset"])
 
+    def _boot(self, device):
+        commands = [["chassis", "bootdev", device]]
+        if getattr(self.parsed_args, "reboot", False):
+            commands = [
+                ["chassis", "power", "off"],
+                *commands,
+                ["chassis", "power", "on"],
+            ]
+
+        self._execute_batch(commands)
+
     def boot_pxe(self):
-        self._execute(["chassis", "bootdev", "pxe"])
+        self._boot("pxe")
 
     def boot_local(self):
-        self._execute(["chassis", "bootdev", "disk"])
+        self._boot("disk")
 
     def ipmi_reset(self):
         cmd = ["mc", "reset"]
@@ -233,6 +446,10 @@ class OobBase(object):
 
     def clear_ipmi_logs(self):
         self._print(self._execute(["sel", "clear"], output=True).strip())
+        try:
+            SelCache.clear(self.oob_info["ipmi"].replace("https://", ""))
+        except OSError as e:
+            log.warning("Could not clear SEL cache: {}".format(e))
 
     def console(self):
         raise NotImplementedError("console")
@@ -240,6 +457,9 @@ class OobBase(object):
     def diagnostics(self):
         raise NotImplementedError("diagnostics")
 
+    def jobs(self):
+        raise NotImplementedError("jobs")
+
     def autoupdate(self):
         raise NotImplementedError("autoupdate")
 
@@ -261,12 +481,21 @@ class OobBase(object):
     def storage_status(self):
         raise NotImplementedError("storage-status")
 
+    def vdisks_status(self):
+        raise NotImplementedError("vdisks-status")
+
     def controllers_status(self):
         raise NotImplementedError("controllers-status")
 
-    def system_ram(self):
+    def _system_ram(self):
+        """
+        Return the installed RAM in GB
+        """
         raise NotImplementedError("system-ram")
 
+    def system_ram(self):
+        return ("ram_gb",), (self._system_ram(),)
+
     def factory_reset(self):
         raise NotImplementedError("factory-reset")
 
@@ -276,10 +505,14 @@ class OobBase(object):
     def unlock_power_switch(self):
         raise NotImplementedError("unlock-power-switch")
 
-    def _ipmi_sensors_cmd(self, host, username, password, args=[]):
-        if os.getenv("XDG_CACHE_HOME"):
-            cache_dir_arg = "--sdr-cache-dir=$XDG_CACHE_HOME"
-            args = [*args, os.path.expandvars(cache_dir_arg)]
+    def _ipmi_sensors_cmd(self, host, username, password, args=[], sdr_cache=None):
+        if sdr_cache is not None:
+            args = [*args, "--sdr-cache-dir={}".format(sdr_cache)]
+        else:
+            args = [*args, "--sdr-cache-recreate"]
+            if os.getenv("XDG_CACHE_HOME"):
+                cache_dir_arg = "--sdr-cache-dir=$XDG_CACHE_HOME"
+                args = [*args, os.path.expandvars(cache_dir_arg)]
 
         return [
             "ipmi-sensors",
@@ -292,7 +525,6 @@ class OobBase(object):
             "-l",
             "user",
             "--quiet-cache",
-            "--sdr-cache-recreate",
             "--interpret-oem-data",
             "--output-sensor-state",
             "--ignore-not-available-sensors",
@@ -337,10 +569,75 @@ class OobBase(object):
             *args,
         ]
 
+    def _get_firmware_id(self, deadline=None):
+        """
+        Identify the BMC firmware, using the versions from the DCIM if
+        available, or `mc info` otherwise
+        """
+        info = self.oob_info.get("info") or {}
+        if info.get("tsm") or info.get("bios"):
+            return "tsm-{}-bios-{}".format(info.get("tsm"), info.get("bios"))
+
+        deadline = deadline or Deadline()
+        output = self._execute(
+            ["mc", "info"], output=True, timeout=deadline.remaining()
+        )
+        fields = re.findall(
+            r"^(?:Manufacturer ID|Product ID|Firmware Revision)\s*:\s*(.*?)\s*$",
+            output,
+            re.MULTILINE,
+        )
+        return "-".join(fields)
+
+    def _get_sdr_cache(self, host, deadline=None):
+        """
+        Return the SDR cache directory for the BMC, or None if disabled
+        """
+        if self.oob_config["oob_params"].get("sdr_cache", "true") == "false":
+            return None
+
+        try:
+            firmware = self._get_firmware_id(deadline)
+            if firmware:
+                return sdr_cache_dir(host, firmware)
+        except OobTimeoutError:
+            raise
+        except (OobError, OSError) as e:
+            log.warning("SDR cache is not available: {}".format(e))
+
+        return None
+
+    def _read_sensors(self, host, deadline=None):
+        """
+        Run ipmi-sensors, reusing the SDR cache of the BMC if possible. All
+        steps together are limited by the deadline.
+        """
+        deadline = deadline or Deadline()
+        sdr_cache = self._get_sdr_cache(host, deadline)
+        bmc = self._get_native_bmc()
+        if bmc is not None:
+            cache = os.path.join(sdr_cache, "native.json") if sdr_cache else None
+            return self._native(bmc.sensors, deadline.remaining(), cache)
+
+        cmd = self._ipmi_sensors_cmd(
+            host, self.username, self.password, sdr_cache=sdr_cache
+        )
+        try:
+            return self._execute_cmd(cmd, output=True, timeout=deadline.remaining())
+        except OobTimeoutError:
+            raise
+        except OobError:
+            if sdr_cache is None:
+                raise
+
+            # e.g. SDR cache out of date
+            log.info("Retrying ipmi-sensors with a new SDR cache")
+            cmd.append("--sdr-cache-recreate")
+            return self._execute_cmd(cmd, output=True, timeout=deadline.remaining())
+
     def ipmi_sensors(self):
         host = self.oob_info["ipmi"].replace("https://", "")
-        cmd = self._ipmi_sensors_cmd(host, self.username, self.password)
-        lines = self._execute_cmd(cmd, output=True).strip().split("\n")
+        lines = self._read_sensors(host).strip().split("\n")
         columns = list(map(str.strip, lines[0].split("|")))
         values = [list(map(str.strip, line.split("|"))) for line in lines[1:]]
 
@@ -387,13 +684,76 @@ class OobBase(object):
             ]
         )
 
-    def _get_sel_errors(self, host):
-        cmd = self._ipmi_sel_cmd(host, self.username, self.password)
-        logs = self._execute_cmd(cmd, output=True)
-        for line in reversed(logs.split("\n")[1:-1]):
-            split = list(map(lambda x: x.strip(), line.split("|")))
-            if split[SEL_STATE] != "Nominal":
-                yield split
+    def _get_sel_cache(self, kind):
+        if self.oob_config["oob_params"].get("sel_cache", "true") == "false":
+            return None
+
+        try:
+            return SelCache(self.oob_info["ipmi"].replace("https://", ""), kind)
+        except OSError as e:
+            log.warning("SEL cache is not available: {}".format(e))
+            return None
+
+    def _read_sel(self, kind, read, record_id, keep=None):
+        """
+        Return the SEL records for which keep(record) is true. read(start)
+        returns the SEL records with id >= start, or all records if start is
+        None. Only records newer than the ones of the previous call are read,
+        unless the SEL has been cleared since.
+        """
+        keep = keep or (lambda record: True)
+        cache = self._get_sel_cache(kind)
+        last, entries = cache.load() if cache is not None else (None, [])
+
+        records = None
+        start = record_id(last) if last is not None else None
+        if start is not None:
+            records = read(start)
+            if records and records[0] == last:
+                log.debug("Read {} new SEL records".format(len(records) - 1))
+                entries = entries + [r for r in records[1:] if keep(r)]
+            else:
+                log.info("SEL has changed since last read, reading all records")
+                records = None
+
+        if records is None:
+            records = read(None)
+            entries = [r for r in records if keep(r)]
+
+        if cache is not None:
+            cache.save(records[-1] if records else None, entries)
+
+        return entries
+
+    def _parse_sel(self, output):
+        for line in output.split("\n")[1:]:
+            if line.strip():
+                yield list(map(lambda x: x.strip(), line.split("|")))
+
+    def _get_sel_errors(self, host, deadline=None):
+        deadline = deadline or Deadline()
+        bmc = self._get_native_bmc()
+
+        def read_native(start):
+            start = int(start) if start is not None else None
+            return self._native(bmc.sel_records, start, deadline.remaining())
+
+        def read(start):
+            args = []
+            if start is not None:
+                args.append("--display-range={}-65535".format(start))
+
+            cmd = self._ipmi_sel_cmd(host, self.username, self.password, args)
+            output = self._execute_cmd(cmd, output=True, timeout=deadline.remaining())
+            return list(self._parse_sel(output))
+
+        errors = self._read_sel(
+            "native-sel" if bmc is not None else "ipmi-sel",
+            read_native if bmc is not None else read,
+            lambda record: record[SEL_ID],
+            lambda record: record[SEL_STATE] != "Nominal",
+        )
+        return reversed(errors)
 
     def _sel_is_firmware_upgrade(self, line):
         checks = {
@@ -403,6 +763,20 @@ class OobBase(object):
         }
         return all(line[k] == v for k, v in checks.items())
 
+    def _read_dcmi(self, host, deadline=None):
+        """
+        Return the current power consumption, or None if not available
+        """
+        deadline = deadline or Deadline()
+        bmc = self._get_native_bmc()
+        if bmc is not None:
+            return str(self._native(bmc.power_reading, deadline.remaining()))
+
+        cmd = self._ipmi_dcmi_cmd(host, self.username, self.password)
+        output = self._execute_cmd(cmd, output=True, timeout=deadline.remaining())
+        match = re.findall(r"Current Power\s*:\s*(\d+)", output)
+        return match[0] if match else None
+
     def check_ipmi(self):
         pre = "{} IPMI Status".format(self.oob_info["identifier"])
         try:
@@ -411,30 +785,45 @@ class OobBase(object):
             nagios.result(nagios.UNKNOWN, "No IPMI information", pre=pre)
             return
 
-        perfdata = []
-        cmd = self._ipmi_dcmi_cmd(host, self.username, self.password)
-        try:
-            dcmi_output = self._execute_cmd(cmd, output=True)
-        except OobError:
-            nagios.result(nagios.UNKNOWN, "ipmi-dcmi failed", pre=pre)
-            return
-
-        match = re.findall(r"Current Power\s*:\s*(\d+)", dcmi_output)
-        if match:
-            perfdata.append("'Current Power'={}".format(match[0]))
+        # each collector must finish within the timeout, including retries
+        timeout = getattr(self.parsed_args, "timeout", None)
+        collectors = {
+            "ipmi-dcmi": lambda deadline: self._read_dcmi(host, deadline),
+            "ipmi-sel": lambda deadline: list(self._get_sel_errors(host, deadline)),
+            "ipmi-sensors": lambda deadline: self._read_sensors(host, deadline),
+        }
 
-        sel_errors = list(self._get_sel_errors(host))
+        def collect(name):
+            try:
+                return collectors[name](Deadline(timeout)), None
+            except OobTimeoutError:
+                return None, "{} timed out".format(name)
+            except OobError as e:
+                log.debug("{} failed: {}".format(name, e))
+                return None, "{} failed".format(name)
+
+        # resolve credentials once, then run the collectors concurrently
+        self._get_credentials()
+        results = run_tasks(collect, collectors, parallel=len(collectors))
+        collected = {
+            r.item: r.value or (None, "{} failed".format(r.item)) for r in results
+        }
+        failed = [error for _, error in collected.values() if error is not None]
 
-        cmd = self._ipmi_sensors_cmd(host, self.username, self.password)
-        try:
-            sensors = self._execute_cmd(cmd, output=True)
-        except OobError:
-            nagios.result(nagios.UNKNOWN, "ipmi-sensors failed", pre=pre)
+        power, _ = collected["ipmi-dcmi"]
+        sel_errors, _ = collected["ipmi-sel"]
+        sensors, _ = collected["ipmi-sensors"]
+        if power is None and sel_errors is None and sensors is None:
+            nagios.result(nagios.UNKNOWN, failed, pre=pre)
             return
 
+        perfdata = []
+        if power is not None:
+            perfdata.append("'Current Power'={}".format(power))
+
         sensor_warnings = []
         sensor_errors = []
-        for line in sensors.split("\n")[1:-1]:
+        for line in (sensors or "").split("\n")[1:-1]:
             split = list(map(lambda x: x.strip(), line.split("|")))
 
             data = self._format_sensor_perfdata(split)
@@ -481,6 +870,11 @@ class OobBase(object):
                 [sel_entries_header, *map(lambda x: self._format_sel(x), sel_errors)]
             )
 
+        if failed:
+            # partial result
+            status = nagios.worst([status, nagios.UNKNOWN])
+            msg.extend(failed)
+
         perfdata = [" ".join(perfdata)]
         nagios.result(status, msg or "SEL, Sensors OK", lines, perfdata, pre)
 
@@ -525,7 +919,26 @@ class OobBase(object):
         nagios.result(state, msg, pre=pre)
 
     def check_ram(self):
-        raise NotImplementedError("check-ram")
+        pre = "{} installed RAM".format(self.oob_info["identifier"])
+        expected = self.parsed_args.expected
+
+        ram = self._system_ram()
+        if (expected is None and ram > 0) or (expected is not None and ram == expected):
+            nagios.result(nagios.OK, "{}GB".format(str(ram)), pre=pre)
+        elif expected is None:
+            nagios.result(nagios.UNKNOWN, "Failed to read RAM")
+        elif ram < expected:
+            nagios.result(
+                nagios.CRITICAL,
+                "{}GB, expected {}GB".format(str(ram), str(expected)),
+                pre=pre,
+            )
+        elif ram > expected:
+            nagios.result(
+                nagios.WARNING,
+                "{}GB, expected {}GB".format(str(ram), str(expected)),
+                pre=pre,
+            )
 
     def check_disks(self):
         raise NotImplementedError("check-disks")
@@ -533,6 +946,9 @@ class OobBase(object):
     def get_disks(self):
         raise NotImplementedError("get-disks")
 
+    def inventory(self):
+        raise NotImplementedError("inventory")
+
     def refresh_firmware(self):
         raise NotImplementedError("refresh-firmware")
 
@@ -661,5 +1077,46 @@ class OobBase(object):
         self._execute_popen([BROWSER_OPEN, self.dcim.oob_url(self.oob_info)])
 
 
+def _exec_quote(arg):
+    """
+    Quote an argument for an `ipmitool exec` script
+    """
+    if "\n" in arg or ('"' in arg and "'" in arg):
+        raise OobError("Cannot pass {!r} to ipmitool exec".format(arg))
+    if arg and not re.search(r"[\s\"'#]", arg):
+        return arg
+    if '"' in arg:
+        return "'{}'".format(arg)
+
+    return '"{}"'.format(arg)
+
+
 class OobError(Exception):
     pass
+
+
+class OobTimeoutError(OobError):
+    pass
+
+
+class Deadline(object):
+    """
+    Time limit shared by consecutive steps, e.g. the commands of a check
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._end = None if timeout is None else time.monotonic() + timeout
+
+    def remaining(self):
+        """
+        Return the seconds left for the next step, or None if there is no
+        limit. Raises OobTimeoutError if the deadline has passed.
+        """
+        if self._end is None:
+            return None
+
+        remaining = self._end - time.monotonic()
+        if remaining <= 0:
+            raise OobTimeoutError("Timed out after {} seconds".format(self.timeout))
+        return remaining
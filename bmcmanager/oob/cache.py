@@ -0,0 +1,90 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import glob
+import json
+import os
+import re
+import shutil
+
+from bmcmanager.cache import cache_dir, write_json
+from bmcmanager.logs import log
+
+
+def _safe(name):
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def _host_dir(host):
+    return cache_dir("sel", _safe(host))
+
+
+def sdr_cache_dir(host, firmware):
+    """
+    Return the SDR cache directory of a BMC for a firmware version. Cache
+    directories of other firmware versions of the BMC are removed.
+    """
+    name = _safe(firmware)
+    host_dir = cache_dir("sdr", _safe(host))
+    for entry in os.listdir(host_dir):
+        if entry != name:
+            log.info("Firmware has changed, removing SDR cache {}".format(entry))
+            shutil.rmtree(os.path.join(host_dir, entry), ignore_errors=True)
+
+    return cache_dir("sdr", _safe(host), name)
+
+
+class SelCache(object):
+    """
+    SEL entries already read from a BMC, one file per kind of entries (e.g.
+    "ipmi-sel") in a directory per BMC. Keeps the last record that was read
+    (the high-water mark), so that later reads only fetch newer records, and
+    the older entries that are still needed.
+    """
+
+    def __init__(self, host, kind):
+        self.path = os.path.join(_host_dir(host), "{}.json".format(kind))
+
+    def load(self):
+        """
+        Return (last record, entries), or (None, []) if nothing is stored
+        """
+        try:
+            with open(self.path) as fin:
+                data = json.load(fin)
+            return data["last"], data["entries"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("Ignoring SEL cache {}: {}".format(self.path, e))
+
+        return None, []
+
+    def save(self, last, entries):
+        try:
+            write_json(self.path, {"last": last, "entries": entries})
+        except OSError as e:
+            log.warning("Could not write SEL cache {}: {}".format(self.path, e))
+
+    @staticmethod
+    def clear(host):
+        """
+        Remove all stored entries of a BMC, e.g. after the SEL is cleared
+        """
+        for path in glob.glob(os.path.join(_host_dir(host), "*.json")):
+            try:
+                os.unlink(path)
+            except OSError as e:
+                log.warning("Could not remove SEL cache {}: {}".format(path, e))
@@ -14,18 +14,151 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import collections
 import re
-import sys
+import socket
+import threading
 import time
 import paramiko
 
 from subprocess import Popen
 
-from bmcmanager.oob.base import OobBase
+from bmcmanager import nagios, sessions
+from bmcmanager.executor import run_tasks
+from bmcmanager.oob.base import OobBase, OobError, OobTimeoutError
+from bmcmanager.utils import ssh, wait
 from bmcmanager.logs import log
 
+# maximum concurrent channels per SSH connection, see Dell._ssh_batch()
+SSH_CHANNELS = 4
+
+# final states of Lifecycle Controller jobs
+JOB_COMPLETED = ("Completed",)
+JOB_FAILED = ("Failed", "Completed with Errors", "CompletedWithErrors")
+
+# `racadm storage get <kind> -o` columns, as (column, property)
+STORAGE_COLUMNS = collections.OrderedDict(
+    [
+        (
+            "controllers",
+            [
+                ("fqdd", "FQDD"),
+                ("name", "Name"),
+                ("status", "Status"),
+                ("rollup_status", "RollupStatus"),
+                ("firmware", "FirmwareVersion"),
+            ],
+        ),
+        (
+            "vdisks",
+            [
+                ("fqdd", "FQDD"),
+                ("name", "Name"),
+                ("status", "Status"),
+                ("state", "State"),
+                ("layout", "Layout"),
+                ("size", "Size"),
+            ],
+        ),
+        (
+            "pdisks",
+            [
+                ("fqdd", "FQDD"),
+                ("name", "Name"),
+                ("status", "Status"),
+                ("state", "State"),
+                ("size", "Size"),
+                ("media", "MediaType"),
+                ("protocol", "BusProtocol"),
+                ("failure_predicted", "FailurePredicted"),
+            ],
+        ),
+    ]
+)
+
+# nagios state of storage Status values, anything else is CRITICAL
+STORAGE_STATUS = {"Ok": nagios.OK, "Non-Critical": nagios.WARNING}
+
+# physical disk states that are healthy
+PDISK_STATES = ("Online", "Ready", "Non-RAID")
+
+
+def _parse_storage(output):
+    """
+    Return the components of `racadm storage get <kind> -o` output, e.g.
+    [{"FQDD": "Disk.Bay.0:...", "Status": "Ok", "State": "Online", ...}]
+    """
+    components = []
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+
+        key, sep, value = line.partition("=")
+        if not line[0].isspace() and not sep:
+            components.append({"FQDD": line.strip()})
+        elif sep and components:
+            components[-1][key.strip()] = value.strip()
+
+    if not components and "ERROR" in output:
+        raise OobError("Failed to get storage: {}".format(output.strip()))
+
+    return components
+
+
+def _size_gb(size):
+    """
+    Return a racadm size, e.g. "558.38 GB", in GB
+    """
+    units = {"MB": 1 / 1024, "GB": 1, "TB": 1024}
+    match = re.match(r"([\d.]+)\s*([MGT]B)", size or "")
+    if match is None:
+        return 0
+
+    return int(float(match.group(1)) * units[match.group(2)])
+
+
+def _parse_job(output):
+    """
+    Return the fields of `racadm jobqueue view -i <JID>` output, e.g.
+    {"Job ID": "JID_...", "Status": "Running", "Percent Complete": "40"}
+    """
+    job = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            job[key.strip().lstrip("[")] = value.strip().strip("[]")
+
+    return job
+
+
+def _parse_jobqueue(output):
+    """
+    Return the jobs of `racadm jobqueue view` output, as a list of fields
+    """
+    blocks = re.split(r"^\s*\[?Job ID=", output, flags=re.MULTILINE)
+    return [_parse_job("Job ID=" + block) for block in blocks[1:]]
+
+
+def _job_state(job):
+    """
+    Return "completed", "failed" or "pending"
+    """
+    status = job.get("Status")
+    if status in JOB_COMPLETED:
+        return "completed"
+    elif status in JOB_FAILED:
+        return "failed"
+
+    return "pending"
+
 
 class Dell(OobBase):
+    # guard opening the SSH connection of each BMC, keyed by _ssh_key()
+    _ssh_locks = {}
+
+    # (time, jobs) of the last job queue read of this OOB, see _get_jobs()
+    _jobs = None
+
     def console(self):
         ipmi_host = self.oob_info["ipmi"]
         try:
@@ -41,64 +174,261 @@ class Dell(OobBase):
                 ]
             )
         except OSError:
-            print('Please run "gem install moob"')
-            sys.exit(10)
-
-    def _ssh(self, command):
-        # performs command using ssh
-        # returns decoded output
-
-        nbytes = 4096
-        port = 22
-        hostname = self.oob_info["ipmi"].replace("https://", "")
-        username = self.username
-        password = self.password
-
-        client = paramiko.Transport((hostname, port))
-        client.connect(username=username, password=password)
-        stdout_data = []
-        stderr_data = []
-        session = client.open_channel(kind="session")
-        session.exec_command(command)
-        while True:
-            if session.recv_ready():
-                stdout_data.append(session.recv(nbytes))
-            if session.recv_stderr_ready():
-                stderr_data.append(session.recv_stderr(nbytes))
-            if session.exit_status_ready():
-                break
-        output = b"".join(stdout_data)
-        session.close()
-        client.close()
-
-        return output.decode("utf-8")
+            raise OobError('Please run "gem install moob"')
+
+    def close(self):
+        super(Dell, self).close()
+        if self._credentials is not None and self.oob_info["ipmi"]:
+            sessions.pool.release(self._ssh_key())
+
+    def _ssh_timeout(self):
+        """
+        Seconds to wait for the SSH connection, and for each racadm command
+        """
+        return float(self.oob_config["oob_params"].get("ssh_timeout", 300))
+
+    def _ssh_key(self):
+        return ("ssh", self.oob_info["ipmi"].replace("https://", ""), self.username)
+
+    def _get_transport(self):
+        """
+        Return the SSH connection to the BMC, opening it on first use. The
+        connection is kept in the session pool, so that all racadm commands
+        of a command share it.
+        """
+        key = self._ssh_key()
+        with self._ssh_locks.setdefault(key, threading.Lock()):
+            transport = sessions.pool.get(key)
+            if transport is not None and not transport.is_active():
+                sessions.pool.discard(key)
+                transport = None
+
+            if transport is None:
+                log.debug("Opening SSH connection to {}".format(key[1]))
+                host, _, port = key[1].partition(":")
+                sock = None
+                try:
+                    sock = socket.create_connection(
+                        (host, int(port or 22)), self._ssh_timeout()
+                    )
+                    transport = paramiko.Transport(sock)
+                    transport.connect(username=self.username, password=self.password)
+                except (paramiko.SSHException, OSError) as e:
+                    if transport is not None:
+                        transport.close()
+                    elif sock is not None:
+                        sock.close()
+                    raise OobError("SSH connection to {} failed: {}".format(key[1], e))
+
+                sessions.pool.put(key, transport, paramiko.Transport.close)
+
+        return transport
+
+    def _open_channel(self):
+        transport = self._get_transport()
+        try:
+            return transport.open_session()
+        except paramiko.ChannelException:
+            # the BMC refused another channel, see _ssh_batch()
+            raise
+        except (paramiko.SSHException, OSError) as e:
+            # e.g. the BMC closed an idle connection
+            log.debug("Reopening SSH connection: {}".format(e))
+            key = self._ssh_key()
+            with self._ssh_locks.setdefault(key, threading.Lock()):
+                if sessions.pool.get(key) is transport:
+                    sessions.pool.discard(key)
+
+            return self._get_transport().open_session()
+
+    def _log_line(self, line):
+        log.debug("{}: {}".format(self.oob_info["identifier"], line))
+
+    def _ssh(self, command, on_line=None):
+        """
+        Run a command over the SSH connection of the BMC, and return its
+        decoded output. Output lines are logged as they arrive, or passed to
+        on_line(line) if set. Raises OobTimeoutError if the command does not
+        finish within the `ssh_timeout` of the BMC.
+        """
+        session = self._open_channel()
+        try:
+            session.exec_command(command)
+            status, stdout, stderr = ssh.read_channel(
+                session, timeout=self._ssh_timeout(), on_line=on_line or self._log_line
+            )
+        except TimeoutError as e:
+            raise OobTimeoutError("SSH command {} failed: {}".format(command, e))
+        except (paramiko.SSHException, OSError) as e:
+            raise OobError("SSH command {} failed: {}".format(command, e))
+        finally:
+            session.close()
+
+        if status != 0:
+            log.debug(
+                "{} exited with status {}: {}".format(
+                    command, status, stderr.decode("utf-8", "replace").strip()
+                )
+            )
+
+        return stdout.decode("utf-8")
+
+    def _ssh_batch(self, commands):
+        """
+        Run independent commands concurrently, over channels of the same SSH
+        connection, and return their outputs in order. Commands for which the
+        BMC refuses a concurrent channel run again after the others.
+        """
+
+        def run(command):
+            try:
+                return self._ssh(command)
+            except paramiko.ChannelException as e:
+                return e
+
+        self._get_transport()
+        results = run_tasks(run, commands, parallel=SSH_CHANNELS)
+
+        outputs = []
+        for command, result in zip(commands, results):
+            if result.failed:
+                raise result.error
+
+            if isinstance(result.value, paramiko.ChannelException):
+                # channels of finished commands may take a moment to close
+                log.debug("Channel refused, running {} again".format(command))
+                output = wait.wait_for(
+                    lambda: [self._ssh(command)],
+                    "an SSH channel is available",
+                    timeout=30,
+                    initial=0.2,
+                    maximum=5,
+                    errors=(paramiko.ChannelException,),
+                )
+                outputs.append(output[0])
+            else:
+                outputs.append(result.value)
+
+        return outputs
 
     def _find_jid(self, output):
         try:
-            return re.search(r"JID_.*", output).group(0)
+            return re.search(r"JID_\w+", output).group(0)
         except AttributeError:
-            print("No Job ID found.\nCommand output: ", output)
-            sys.exit(10)
+            raise OobError("No Job ID found. Command output: {}".format(output))
+
+    def _wait_for_jobs(self, jids, timeout=None):
+        """
+        Poll Lifecycle Controller jobs with backoff, until all of them have
+        completed, and return their fields by JID. Jobs are viewed
+        concurrently, over the SSH connection of the BMC. Raises OobError if
+        a job fails.
+        """
+        identifier = self.oob_info["identifier"]
+        pending, jobs = list(jids), {}
+
+        def check():
+            commands = ["racadm jobqueue view -i {}".format(jid) for jid in pending]
+            for jid, output in zip(list(pending), self._ssh_batch(commands)):
+                job = _parse_job(output)
+                status = job.get("Status")
+                if status is None and "ERROR" in output:
+                    job = {"Status": "Failed", "Message": output.strip()}
+                    status = job["Status"]
+
+                log.debug(
+                    "{}: {} is {} ({}%)".format(
+                        identifier, jid, status, job.get("Percent Complete", "?")
+                    )
+                )
+                if status in JOB_COMPLETED or status in JOB_FAILED:
+                    jobs[jid] = job
+                    pending.remove(jid)
+
+            return not pending
 
-    def _confirm_job(self, jid):
         try:
-            re.search(r"Job completed successfully", jid).group(0)
-        except AttributeError:
-            print("Job did not complete successfully.\nCommand output: ", jid)
-            sys.exit(10)
+            wait.wait_for(
+                check,
+                "{} jobs {} are done".format(identifier, ", ".join(jids)),
+                timeout=timeout,
+                initial=10,
+                maximum=60,
+                errors=(OobError,),
+            )
+        except wait.WaitError as e:
+            raise OobTimeoutError(str(e))
+
+        for jid, job in jobs.items():
+            if job["Status"] not in JOB_COMPLETED:
+                raise OobError(
+                    "Job {} {}: {}".format(
+                        jid, job["Status"].lower(), job.get("Message", "")
+                    )
+                )
+
+        return jobs
+
+    def _get_jobs(self, full_refresh=None):
+        """
+        Return the Lifecycle Controller jobs of the BMC, as {jid: fields}.
+
+        The first call reads the whole job queue. If full_refresh is set,
+        later calls only view the jobs that were still pending, and read the
+        whole job queue again (e.g. for new jobs) every full_refresh seconds.
+        """
+        now = time.monotonic()
+        if (
+            self._jobs is None
+            or full_refresh is None
+            or now - self._jobs[0] >= full_refresh
+        ):
+            queue = _parse_jobqueue(self._ssh("racadm jobqueue view"))
+            jobs = collections.OrderedDict((job["Job ID"], job) for job in queue)
+            self._jobs = (now, jobs)
+            return jobs
+
+        jobs = self._jobs[1]
+        pending = [jid for jid, job in jobs.items() if _job_state(job) == "pending"]
+        commands = ["racadm jobqueue view -i {}".format(jid) for jid in pending]
+        for jid, output in zip(pending, self._ssh_batch(commands)):
+            job = _parse_job(output)
+            if "Status" in job:
+                jobs[jid] = job
+
+        return jobs
+
+    def jobs(self):
+        jobs = self._get_jobs(getattr(self.parsed_args, "full_refresh", None))
+        if self.parsed_args.details:
+            columns = ["jid", "name", "status", "state", "percent", "message"]
+            values = [
+                [
+                    jid,
+                    job.get("Job Name", ""),
+                    job.get("Status", ""),
+                    _job_state(job),
+                    job.get("Percent Complete", ""),
+                    job.get("Message", ""),
+                ]
+                for jid, job in jobs.items()
+            ]
+            return columns, values
+
+        counts = collections.Counter(_job_state(job) for job in jobs.values())
+        columns = ["pending", "failed", "completed"]
+        return columns, [[counts[column] for column in columns]]
 
     def diagnostics(self):
-        jobqueue_view = "racadm jobqueue view -i {}"
+        timeout = self.parsed_args.timeout
         output = self._ssh("racadm techsupreport collect")
         jid = self._find_jid(output)
-        log.info("Sleeping for 3 minutes to collect the TSR report")
-        time.sleep(180)
-        view_output = self._ssh(jobqueue_view.format(jid))
-        self._confirm_job(view_output)
+        log.info("Waiting for job {} to collect the TSR report".format(jid))
+        self._wait_for_jobs([jid], timeout)
         output = self._ssh("racadm techsupreport export -l {}".format(self.nfs_share))
         jid = self._find_jid(output)
-        view_output = self._ssh(jobqueue_view.format(jid))
-        self._confirm_job(view_output)
+        log.info("Waiting for job {} to export the TSR report".format(jid))
+        self._wait_for_jobs([jid], timeout)
 
     def autoupdate(self):
         enable_updates_output = self._ssh(
@@ -123,8 +453,8 @@ class Dell(OobBase):
     def idrac_info(self):
         firm_info = "racadm get idrac.info"
         bios_info = "racadm get bios.sysinformation"
-        print(self._ssh(firm_info))
-        print(self._ssh(bios_info))
+        for output in self._ssh_batch([firm_info, bios_info]):
+            print(output)
 
     def clear_autoupdate(self):
         clear_command = "racadm autoupdatescheduler clear"
@@ -134,14 +464,145 @@ class Dell(OobBase):
         flush_command = "racadm jobqueue delete --all"
         print(self._ssh(flush_command))
 
+    def _get_storage(self, kinds):
+        """
+        Return the storage components of each kind (e.g. "pdisks"), reading
+        them concurrently over the SSH connection of the BMC
+        """
+        commands = ["racadm storage get {} -o".format(kind) for kind in kinds]
+        outputs = self._ssh_batch(commands)
+        return collections.OrderedDict(
+            (kind, _parse_storage(output)) for kind, output in zip(kinds, outputs)
+        )
+
+    def _storage_status(self, kind):
+        components = self._get_storage([kind])[kind]
+        columns = [column for column, _ in STORAGE_COLUMNS[kind]]
+        values = [
+            [component.get(key, "") for _, key in STORAGE_COLUMNS[kind]]
+            for component in components
+        ]
+        return columns, values
+
     def pdisks_status(self):
-        pdisks_status_command = "racadm storage get pdisks -o"
-        print(self._ssh(pdisks_status_command))
+        return self._storage_status("pdisks")
 
-    def storage_status(self):
-        storage_status_command = "racadm storage get status"
-        print(self._ssh(storage_status_command))
+    def vdisks_status(self):
+        return self._storage_status("vdisks")
 
     def controllers_status(self):
-        controllers_status_command = "racadm storage get controllers -o"
-        print(self._ssh(controllers_status_command))
+        return self._storage_status("controllers")
+
+    def storage_status(self):
+        storage = self._get_storage(list(STORAGE_COLUMNS))
+        columns = ["type", "fqdd", "name", "status", "state"]
+        values = [
+            [
+                kind,
+                component["FQDD"],
+                component.get("Name", ""),
+                component.get("Status", ""),
+                component.get("State", component.get("RollupStatus", "")),
+            ]
+            for kind, components in storage.items()
+            for component in components
+        ]
+        return columns, values
+
+    def _disk_row(self, index, disk):
+        fqdd = disk["FQDD"]
+        slot = re.search(r"Disk\.\w+\.(\d+)", fqdd)
+        return [
+            index,
+            fqdd.split(":")[-1],
+            slot.group(1) if slot else "N/A",
+            _size_gb(disk.get("Size")),
+            disk.get("MediaType") or "N/A",
+            disk.get("State") or "unknown",
+            disk.get("BusProtocol") or "unknown",
+            disk.get("NegotiatedSpeed") or "unknown",
+            disk.get("Manufacturer") or "N/A",
+        ]
+
+    def get_disks(self):
+        columns = [
+            "index",
+            "ctrl",
+            "slot",
+            "size_gb",
+            "type",
+            "state",
+            "interface",
+            "speed",
+            "vendor",
+        ]
+        pdisks = self._get_storage(["pdisks"])["pdisks"]
+        values = [self._disk_row(index, disk) for index, disk in enumerate(pdisks)]
+        return columns, values
+
+    def _format_disk(self, row):
+        return "{}/{}: {}GB {} {} ({})".format(
+            row[1], row[2], row[3], row[4], row[8], row[5]
+        )
+
+    def _disk_status(self, disk):
+        status = STORAGE_STATUS.get(disk.get("Status"), nagios.CRITICAL)
+        if disk.get("State") not in PDISK_STATES:
+            status = nagios.CRITICAL
+        elif disk.get("FailurePredicted") == "YES":
+            status = max(status, nagios.WARNING)
+
+        return status
+
+    def check_disks(self):
+        pre = "{} disks".format(self.oob_info["identifier"])
+        expected = self.parsed_args.expected
+
+        # controllers, virtual and physical disks over one SSH connection
+        storage = self._get_storage(list(STORAGE_COLUMNS))
+
+        disks_ok, disks_crit = [], []
+        status = nagios.OK
+        for index, disk in enumerate(storage["pdisks"]):
+            disk_status = self._disk_status(disk)
+            status = max(status, disk_status)
+            row = self._disk_row(index, disk)
+            if disk_status != nagios.OK or row[3] <= 0:
+                disks_crit.append(row)
+            else:
+                disks_ok.append(row)
+
+        msg, lines = [], []
+        if disks_crit:
+            status = max(status, nagios.WARNING)
+            lines.append("{} disks not OK:".format(len(disks_crit)))
+            lines.extend(map(lambda d: "- {}".format(self._format_disk(d)), disks_crit))
+            msg.append("{} disks not OK".format(len(disks_crit)))
+
+        msg.append("{} disks OK".format(len(disks_ok)))
+        for kind in ("vdisks", "controllers"):
+            failed = [c for c in storage[kind] if c.get("Status") not in ("Ok", None)]
+            for component in failed:
+                status = max(
+                    status, STORAGE_STATUS.get(component["Status"], nagios.CRITICAL)
+                )
+                lines.append(
+                    "- {} {}: {}".format(
+                        component["FQDD"],
+                        component.get("Name", ""),
+                        component.get("State", component["Status"]),
+                    )
+                )
+            if failed:
+                msg.append("{} {} not OK".format(len(failed), kind))
+
+        if expected is not None and len(disks_ok) != expected:
+            msg.append("expected {}".format(expected))
+            status = max(status, nagios.WARNING)
+
+            lines.append("{} disks OK:".format(len(disks_ok)))
+            lines.extend(map(lambda d: "- {}".format(self._format_disk(d)), disks_ok))
+            if len(disks_ok) < expected:
+                status = max(status, nagios.CRITICAL)
+
+        nagios.result(status, msg, lines, pre=pre)
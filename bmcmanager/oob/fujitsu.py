@@ -14,67 +14,182 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-import re
+import os
 from subprocess import Popen
-from urllib import error as urlerror
-from urllib import request
 import tempfile
 
+import requests
+from requests.auth import HTTPDigestAuth
 from bs4 import BeautifulSoup
 
-from bmcmanager.oob.base import OobBase
+from bmcmanager import sessions
+from bmcmanager.logs import log
+from bmcmanager.oob.base import OobBase, OobError
+
+# seconds to wait for a response of the iRMC web interface
+TIMEOUT = 30
+
+
+class CachedDigestAuth(HTTPDigestAuth):
+    """
+    HTTP digest auth that starts from a saved challenge of the server, so
+    that the first request of a later command is authenticated instead of
+    being rejected. Stale challenges are renewed by HTTPDigestAuth.
+    """
+
+    def __init__(self, username, password, challenge=None, nonce_count=0):
+        super(CachedDigestAuth, self).__init__(username, password)
+        self._challenge = challenge
+        self._nonce_count = nonce_count
+
+    def init_per_thread_state(self):
+        seed = not hasattr(self._thread_local, "init")
+        super(CachedDigestAuth, self).init_per_thread_state()
+        if seed and self._challenge:
+            self._thread_local.chal = dict(self._challenge)
+            self._thread_local.last_nonce = self._challenge.get("nonce", "")
+            self._thread_local.nonce_count = self._nonce_count
+
+    def state(self):
+        """
+        Return (challenge, nonce count) of the current thread, to be saved
+        """
+        if getattr(self._thread_local, "chal", None):
+            self._challenge = dict(self._thread_local.chal)
+            self._nonce_count = self._thread_local.nonce_count
+
+        return self._challenge, self._nonce_count
+
+
+class WebSession(object):
+    """
+    Pooled HTTP session of a BMC web interface, and the console (AVR) URL
+    """
+
+    def __init__(self, auth, avr_url=None):
+        self.http = requests.Session()
+        self.http.verify = False
+        self.http.auth = auth
+        self.avr_url = avr_url
+
+    def close(self):
+        self.http.close()
 
 
 class Fujitsu(OobBase):
-    def _get_realm(self):
-        """Do an unauthenticated request to get the realm for auth."""
-        opener = request.build_opener()
-        request.install_opener(opener)
+    def _session_key(self):
+        return ("fujitsu", self.oob_info["ipmi"], self.username)
+
+    def _get_session_store(self):
+        """
+        Return the store for the digest challenge and AVR URL of each BMC,
+        or None if disabled
+        """
+        params = self.oob_config["oob_params"]
+        if params.get("web_session_cache", "true") == "false":
+            return None
+
+        try:
+            return sessions.SessionStore("fujitsu-sessions")
+        except OSError as e:
+            log.warning("Web session cache is not available: {}".format(e))
+            return None
+
+    def _get_session(self):
+        """
+        Return the pooled web session of the BMC, with the digest challenge
+        and AVR URL of the previous command if any
+        """
+        key = self._session_key()
+        session = sessions.pool.get(key)
+        if session is not None:
+            return session
+
+        saved = {}
+        store = self._get_session_store()
+        if store is not None:
+            saved = store.get(" ".join(key))[0] or {}
+
+        auth = CachedDigestAuth(
+            self.username,
+            self.password,
+            saved.get("challenge"),
+            saved.get("nonce_count", 0),
+        )
+        session = WebSession(auth, saved.get("avr_url"))
+        sessions.pool.put(key, session, WebSession.close)
+        return session
+
+    def close(self):
+        super(Fujitsu, self).close()
+        if self._credentials is None:
+            # the BMC was not used, see OobBase.username
+            return
+
+        key = self._session_key()
+        session = sessions.pool.get(key)
+        if session is None:
+            return
+
+        store = self._get_session_store()
+        challenge, nonce_count = session.http.auth.state()
+        if store is not None and challenge:
+            saved = {
+                "challenge": challenge,
+                "nonce_count": nonce_count,
+                "avr_url": session.avr_url,
+            }
+            store.put(" ".join(key), saved)
+
+        sessions.pool.release(key)
+
+    def _get(self, url):
+        session = self._get_session()
         try:
-            request.urlopen(self.oob_info["ipmi"])
-        except urlerror.HTTPError as err:
-            header = err.headers.get("WWW-Authenticate")
-            m = re.match(r'Digest realm="([@\w\s-]+)",', header)
-            realm = m.groups()[0]
-        return realm
-
-    def _install_auth(self):
-        """Setup digest auth"""
-        realm = self._get_realm()
-
-        uri = self.oob_info["ipmi"]
-        username = self.username
-        password = self.password
-
-        auth_handler = request.HTTPDigestAuthHandler()
-        auth_handler.add_password(realm=realm, uri=uri, user=username, passwd=password)
-        opener = request.build_opener(auth_handler)
-        request.install_opener(opener)
+            resp = session.http.get(url, timeout=TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            raise OobError("Request to {} failed: {}".format(url, e))
+
+        if resp.status_code != 200:
+            raise OobError("GET {}: HTTP {}".format(url, resp.status_code))
+
+        return resp
 
     def _find_avr_url(self):
         """Parse the main page to find the URL for JWS"""
         url = self.oob_info["ipmi"]
 
-        req = request.Request(url)
-        data = request.urlopen(req).read()
-        soup = BeautifulSoup(data)
-        jnlp_desc = [u"Video Redirection (JWS)"]
+        soup = BeautifulSoup(self._get(url).content, "html.parser")
+        jnlp_desc = ["Video Redirection (JWS)"]
         links = soup.find_all("a", href=True)
         for link in links:
             if link.contents == jnlp_desc:
                 return url + "/" + link["href"]
 
-    def _save_tmp_jnlp(self):
-        """Fetch the XML jnlp file and save in tmp"""
-        avr_url = self._find_avr_url()
-        resource = request.urlopen(request.Request(avr_url))
-        xml_data = resource.read().decode("utf-8")
-        _, tmppath = tempfile.mkstemp()
-        with open(tmppath, "w") as tmpfile:
-            tmpfile.write(xml_data)
-        return tmppath
+        raise OobError("Could not find the Video Redirection (JWS) link")
+
+    def _get_jnlp(self):
+        """
+        Return the JNLP file of the console, using the cached AVR URL if any
+        """
+        session = self._get_session()
+        if session.avr_url is not None:
+            try:
+                resp = self._get(session.avr_url)
+                if b"<jnlp" in resp.content:
+                    return resp.content
+            except OobError as e:
+                log.debug("Cached AVR URL failed: {}".format(e))
+
+            log.debug("Cached AVR URL is no longer valid")
+
+        session.avr_url = self._find_avr_url()
+        return self._get(session.avr_url).content
 
     def console(self):
-        self._install_auth()
-        avr_file = self._save_tmp_jnlp()
-        Popen(["/usr/bin/javaws", avr_file])
+        jnlp = self._get_jnlp()
+        fd, tmppath = tempfile.mkstemp(suffix=".jnlp")
+        with os.fdopen(fd, "wb") as tmpfile:
+            tmpfile.write(jnlp)
+
+        Popen(["/usr/bin/javaws", tmppath])
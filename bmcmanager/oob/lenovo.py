@@ -14,10 +14,9 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-from datetime import datetime, timedelta
+from datetime import datetime
 import re
 from subprocess import Popen
-import sys
 import tempfile
 import time
 import urllib3
@@ -25,10 +24,11 @@ import urllib3
 import paramiko
 import requests
 
-from bmcmanager.oob.base import OobBase
+from bmcmanager.oob.base import OobBase, OobError
 from bmcmanager.logs import log
-from bmcmanager import nagios
+from bmcmanager import nagios, sessions
 
+from bmcmanager.utils import rpc, wait
 from bmcmanager.utils.firmware import version_tuple
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -84,22 +84,136 @@ class Lenovo(OobBase):
         Parse response and return (list of results, retryable)
         """
         try:
-            start = text.find("[")
-            end = text.rfind("]")
-            results = eval(text[start : end + 1])
+            return rpc.parse_records(text), False
 
-            # drop empty '{}' objects from list of responses
-            return [r for r in results if r], False
-
-        except (SyntaxError, TypeError, ValueError):
+        except rpc.RpcParseError:
             if "session_expired.html" in text:
-                log.critical("Failed due to expired session")
+                log.warning("Web session has expired")
                 return [], True
             else:
                 log.critical("Could not parse response text")
                 log.debug("Response was:\n{}".format(text))
                 return [], False
 
+    def _session_key(self):
+        return ("lenovo", self._get_http_ipmi_host(), self.username)
+
+    def _get_session_store(self):
+        """
+        Return the store for web sessions that are kept between commands, or
+        None if disabled
+        """
+        params = self.oob_config["oob_params"]
+        if params.get("web_session_cache", "true") == "false":
+            return None
+
+        try:
+            return sessions.SessionStore("lenovo-sessions")
+        except OSError as e:
+            log.warning("Web session cache is not available: {}".format(e))
+            return None
+
+    def _get_session_ttl(self):
+        params = self.oob_config["oob_params"]
+        try:
+            return int(params.get("web_session_ttl", 600))
+        except (TypeError, ValueError):
+            return 600
+
+    def _logout(self, session):
+        http_session, session_token, CSRF_token = session
+        store = self._get_session_store()
+        if store is not None:
+            store.pop(" ".join(self._session_key()))
+
+        log.debug("Logging out of web session")
+        try:
+            http_session.post(
+                self._get_http_ipmi_host() + self.URL_LOGOUT,
+                cookies=session_token,
+                headers=CSRF_token,
+                verify=False,
+                timeout=10,
+            )
+        finally:
+            http_session.close()
+
+    def _is_valid_session(self, session):
+        http_session, session_token, CSRF_token = session
+        try:
+            response = http_session.post(
+                self._get_http_ipmi_host() + self.URL_VALIDATE,
+                cookies=session_token,
+                headers=CSRF_token,
+                verify=False,
+                timeout=10,
+            )
+        except requests.exceptions.RequestException:
+            return False
+
+        return response.status_code == 200 and "session_expired" not in response.text
+
+    def _restore(self):
+        """
+        Return a web session saved by a previous command, if still valid
+        """
+        store = self._get_session_store()
+        if store is None:
+            return None
+
+        tokens, idle = store.get(" ".join(self._session_key()))
+        if tokens is None:
+            return None
+
+        session_token, CSRF_token = tokens
+        session = (
+            requests.session(),
+            {"SessionCookie": session_token},
+            {"CSRFTOKEN": CSRF_token},
+        )
+        if idle > self._get_session_ttl():
+            log.debug("Saved web session is too old")
+            self._logout(session)
+            return None
+
+        if not self._is_valid_session(session):
+            log.debug("Saved web session has expired")
+            store.pop(" ".join(self._session_key()))
+            session[0].close()
+            return None
+
+        sessions.pool.put(self._session_key(), session, self._logout)
+        return session
+
+    def _resume(self):
+        """
+        Reuse an open or saved web session, or create a new one
+        """
+        session = sessions.pool.get(self._session_key()) or self._restore()
+        if session is None:
+            self._connect()
+        else:
+            log.debug("Reusing web session")
+            self._session, self.session_token, self.CSRF_token = session
+
+    def close(self):
+        super(Lenovo, self).close()
+        if not hasattr(self, "CSRF_token"):
+            return
+
+        key = self._session_key()
+        store = self._get_session_store()
+        if store is not None:
+            tokens = [self.session_token["SessionCookie"], self.CSRF_token["CSRFTOKEN"]]
+            store.put(" ".join(key), tokens)
+            if not sessions.pool.keep_alive:
+                # keep the session open on the BMC, for the next command
+                sessions.pool.detach(key)
+                self._session.close()
+                return
+
+        sessions.pool.release(key)
+
     def _connect(self):
         url = self._get_http_ipmi_host() + self.URL_LOGIN
 
@@ -119,19 +233,23 @@ class Lenovo(OobBase):
                 break
 
         if not parsed:
-            log.error("Failed to create session")
-            sys.exit(10)
+            raise OobError("Failed to create session")
 
         session_token = parsed[0]["SESSION_COOKIE"]
         if session_token == "Failure_Session_Creation":
-            log.error("Probably reached session limit")
-            sys.exit(10)
+            raise OobError("Probably reached session limit")
 
         CSRF_token = parsed[0]["CSRFTOKEN"]
 
         self.session_token = {"SessionCookie": session_token}
         self.CSRF_token = {"CSRFTOKEN": CSRF_token}
 
+        sessions.pool.put(
+            self._session_key(),
+            (self._session, self.session_token, self.CSRF_token),
+            self._logout,
+        )
+
     def _post(self, url, data, cookies, headers):
         return self._session.post(
             url, data=data, cookies=cookies, headers=headers, verify=False, timeout=60
@@ -160,8 +278,7 @@ class Lenovo(OobBase):
             else:
                 Popen(cmd)
         except Exception as e:
-            sys.stderr.write("Could not open Java console. {}\n".format(e))
-            sys.exit(10)
+            raise OobError("Could not open Java console. {}".format(e))
 
     def _system_ram(self):
         port = 22
@@ -183,40 +300,15 @@ class Lenovo(OobBase):
         except:
             return 0
 
-    def system_ram(self):
-        return ("ram_gb",), (self._system_ram(),)
-
-    def check_ram(self):
-        pre = "{} installed RAM".format(self.oob_info["identifier"])
-        expected = self.parsed_args.expected
-
-        ram = self._system_ram()
-        if (expected is None and ram > 0) or (expected is not None and ram == expected):
-            nagios.result(nagios.OK, "{}GB".format(str(ram)), pre=pre)
-        elif expected is None:
-            nagios.result(nagios.UNKNOWN, "Failed to read RAM")
-        elif ram < expected:
-            nagios.result(
-                nagios.CRITICAL,
-                "{}GB, expected {}GB".format(str(ram), str(expected)),
-                pre=pre,
-            )
-        elif ram > expected:
-            nagios.result(
-                nagios.WARNING,
-                "{}GB, expected {}GB".format(str(ram), str(expected)),
-                pre=pre,
-            )
-
     def lock_power_switch(self):
         self._execute(["raw", "0x00", "0x0a", "0x01"])
 
     def unlock_power_switch(self):
         self._execute(["raw", "0x00", "0x0a", "0x00"])
 
-    def _get_rpc(self, rpc, item="", params=None):
+    def _get_rpc(self, rpc, item="", params=None, retry=True):
         if not hasattr(self, "CSRF_token"):
-            self._connect()
+            self._resume()
 
         ipmi_host = self._get_http_ipmi_host()
         url = ipmi_host + "/rpc/{}.asp".format(rpc)
@@ -228,16 +320,28 @@ class Lenovo(OobBase):
             )
             return []
 
-        resp, _ = self._parse_response(response.text)
+        resp, retryable = self._parse_response(response.text)
+        if retryable and retry:
+            # reused session has expired, login again
+            self._connect()
+            return self._get_rpc(rpc, item, params, retry=False)
+
         return resp
 
     def _get_disks(self):
         return self._get_rpc("gethddinfo", "disks")
 
     def _get_sel(self):
-        res = self._get_rpc(
-            "getanalysedsel", "SEL", params={"WEBVAR_END_RECORD": 65535}
-        )
+        def read(start):
+            params = {"WEBVAR_END_RECORD": 65535}
+            if start is not None:
+                params["WEBVAR_START_RECORD"] = start
+
+            return self._get_rpc("getanalysedsel", "SEL", params=params)
+
+        records = self._read_sel("lenovo-sel", read, lambda r: r.get("RecordID"))
+
+        res = [dict(r) for r in records]
         for r in res:
             r["TimeStamp"] = str(datetime.utcfromtimestamp(r.get("TimeStamp", 0)))
 
@@ -411,8 +515,7 @@ class Lenovo(OobBase):
                 handle = r[0]["HANDLE"]
                 log.info("Enter FW update mode: OK")
             else:
-                log.fatal("Cannot enter FW update mode")
-                sys.exit(-1)
+                raise OobError("Cannot enter FW update mode")
 
         log.info("Update session handle: {}".format(handle))
 
@@ -428,7 +531,7 @@ class Lenovo(OobBase):
         if 3 in args.stages:
             handle = handle or args.handle
             if not hasattr(self, "CSRF_token"):
-                self._connect()
+                self._resume()
 
             log.info("Uploading firmware bundle")
 
@@ -508,8 +611,8 @@ class Lenovo(OobBase):
         log.info("Firmware upgrade process started")
 
         if 9 in args.stages:
-            begin = datetime.utcnow()
-            while datetime.utcnow() < begin + timedelta(minutes=args.timeout):
+
+            def update_complete():
                 try:
                     r = self._get_rpc("getcompupdatestatus")
                     log.debug(r)
@@ -520,13 +623,22 @@ class Lenovo(OobBase):
                         log.info("Update in progress")
                     else:
                         log.info("Update progress: {}%".format(progress))
-                        if progress == 100:
-                            log.info("Update complete!")
-                            break
+                    return progress == 100
                 except (ConnectionResetError, BrokenPipeError):
                     log.info("Update in progress")
-
-                time.sleep(10)
+                    return False
+
+            try:
+                wait.wait_for(
+                    update_complete,
+                    "update is complete",
+                    timeout=args.timeout * 60,
+                    initial=5,
+                    maximum=20,
+                )
+                log.info("Update complete!")
+            except wait.WaitError as e:
+                log.error(str(e))
 
         if 10 in args.stages:
             handle = handle or args.handle
@@ -579,16 +691,13 @@ class Lenovo(OobBase):
 
         log.info("Factory reset process started")
         if args.wait:
-            begin = datetime.utcnow()
-            while datetime.utcnow() < begin + timedelta(minutes=args.timeout):
-                try:
-                    url = self._get_http_ipmi_host() + self.URL_VALIDATE
+            url = self._get_http_ipmi_host() + self.URL_VALIDATE
 
+            def reset_complete():
+                try:
                     answer = self._post(url, None, self.session_token, self.CSRF_token)
-                    if answer.status_code == 200:
-                        log.info("Done.")
-                        return
                     log.debug(answer)
+                    return answer.status_code == 200
                 except (
                     requests.exceptions.ReadTimeout,
                     requests.exceptions.ConnectionError,
@@ -596,5 +705,16 @@ class Lenovo(OobBase):
                     BrokenPipeError,
                 ):
                     log.info("In progress")
-
-                time.sleep(10)
+                    return False
+
+            try:
+                wait.wait_for(
+                    reset_complete,
+                    "factory reset is complete",
+                    timeout=args.timeout * 60,
+                    initial=10,
+                    maximum=60,
+                )
+                log.info("Done.")
+            except wait.WaitError as e:
+                log.error(str(e))
@@ -0,0 +1,862 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import functools
+import threading
+
+import requests
+import urllib3
+
+from bmcmanager import nagios, sessions
+from bmcmanager.executor import run_tasks
+from bmcmanager.ipmi.commands import SENSORS_HEADER
+from bmcmanager.logs import log
+from bmcmanager.oob.base import (
+    SEL_DATE,
+    SEL_EVENT,
+    SEL_ID,
+    SEL_STATE,
+    SEL_TIME,
+    SEL_TYPE,
+    Deadline,
+    OobBase,
+    OobError,
+    OobTimeoutError,
+)
+from bmcmanager.oob.cache import SelCache
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+ROOT = "/redfish/v1"
+SESSIONS = "/redfish/v1/SessionService/Sessions"
+SYSTEMS = "/redfish/v1/Systems"
+MANAGERS = "/redfish/v1/Managers"
+CHASSIS = "/redfish/v1/Chassis"
+FIRMWARE_INVENTORY = "/redfish/v1/UpdateService/FirmwareInventory"
+
+# maximum concurrent requests (and keep-alive connections) per BMC
+POOL_SIZE = 8
+
+# system properties used by the inventory, requested with $select
+SYSTEM_PROPERTIES = [
+    "Id",
+    "Manufacturer",
+    "Model",
+    "SerialNumber",
+    "BiosVersion",
+    "Status",
+    "ProcessorSummary",
+    "MemorySummary",
+]
+
+BOOT_TARGETS = {"pxe": "Pxe", "disk": "Hdd"}
+
+# Redfish health to ipmi-sensors/ipmi-sel state
+HEALTH_STATES = {"OK": "Nominal", "Warning": "Warning", "Critical": "Critical"}
+
+# SEL states that are reported as errors, see _get_sel_errors()
+SEL_ERROR_STATES = ("Warning", "Critical")
+
+# Redfish threshold properties, in the order of the ipmi-sensors columns
+THRESHOLDS = [
+    "LowerThresholdFatal",
+    "LowerThresholdCritical",
+    "LowerThresholdNonCritical",
+    "UpperThresholdNonCritical",
+    "UpperThresholdCritical",
+    "UpperThresholdFatal",
+]
+
+
+def _error(response):
+    """
+    Return the status and error message of a failed Redfish response
+    """
+    try:
+        error = response.json()["error"]
+        info = error.get("@Message.ExtendedInfo") or [error]
+        message = info[0].get("Message") or error.get("message")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        message = response.text[:200]
+
+    return "{} {}".format(response.status_code, message)
+
+
+def _format_value(value):
+    return "N/A" if value is None else "{:.2f}".format(value)
+
+
+def _describe(*parts):
+    """
+    Join the (format, value) parts whose value is set
+    """
+    return ", ".join(
+        fmt.format(value) for fmt, value in parts if value not in (None, "")
+    )
+
+
+class RedfishSession(object):
+    """
+    Authenticated Redfish session. All requests share the keep-alive
+    connections and the X-Auth-Token of a single login, which is repeated only
+    if the BMC expires the session.
+    """
+
+    def __init__(self, url, username, password, timeout=30):
+        self.url = url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.logins = 0
+
+        # paths of resources that do not change, e.g. the system
+        self.paths = {}
+
+        # query parameters supported by the service, see Redfish._features()
+        self.features = None
+
+        self._http = requests.Session()
+        self._http.verify = False
+        self._http.headers.update(
+            {"Accept": "application/json", "OData-Version": "4.0"}
+        )
+        # concurrent requests wait for a free connection, instead of opening
+        # more connections than the BMC may accept
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=True
+        )
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
+
+        self._token = None
+        self._location = None
+        self._lock = threading.Lock()
+
+    def _send(self, method, path, token=None, timeout=None, **kwargs):
+        url = path if path.startswith(("http://", "https://")) else self.url + path
+        headers = {"X-Auth-Token": token} if token is not None else {}
+        try:
+            return self._http.request(
+                method, url, headers=headers, timeout=timeout or self.timeout, **kwargs
+            )
+        except requests.Timeout:
+            raise OobTimeoutError("Redfish {} {} timed out".format(method, path))
+        except requests.RequestException as e:
+            raise OobError("Redfish {} {} failed: {}".format(method, path, e))
+
+    def _login(self):
+        response = self._send(
+            "POST",
+            SESSIONS,
+            json={"UserName": self.username, "Password": self.password},
+        )
+        if response.status_code >= 400:
+            raise OobError("Redfish login failed: {}".format(_error(response)))
+
+        token = response.headers.get("X-Auth-Token")
+        if not token:
+            raise OobError("Redfish login did not return a session token")
+
+        self._token = token
+        self._location = response.headers.get("Location")
+        self.logins += 1
+        log.debug("Logged in to {}".format(self.url))
+
+    def _get_token(self, expired=None):
+        """
+        Return the session token, logging in if there is none or if it is the
+        expired one. Concurrent requests wait for a single login.
+        """
+        with self._lock:
+            if self._token is None or self._token == expired:
+                self._login()
+
+            return self._token
+
+    def request(self, method, path, timeout=None, **kwargs):
+        token = self._get_token()
+        response = self._send(method, path, token, timeout, **kwargs)
+        if response.status_code == 401:
+            log.debug("Redfish session expired, logging in again")
+            token = self._get_token(expired=token)
+            response = self._send(method, path, token, timeout, **kwargs)
+
+        if response.status_code >= 400:
+            raise OobError(
+                "Redfish {} {} failed: {}".format(method, path, _error(response))
+            )
+
+        return response
+
+    def get(self, path, timeout=None, **params):
+        response = self.request("GET", path, timeout, params=params or None)
+        try:
+            return response.json()
+        except ValueError:
+            raise OobError("Invalid Redfish response for {}".format(path))
+
+    def post(self, path, data, timeout=None):
+        return self.request("POST", path, timeout, json=data)
+
+    def patch(self, path, data, timeout=None):
+        return self.request("PATCH", path, timeout, json=data)
+
+    def logout(self):
+        with self._lock:
+            token, location = self._token, self._location
+            self._token = self._location = None
+
+        if token is not None and location:
+            try:
+                self._send("DELETE", location, token)
+            except OobError as e:
+                log.debug("Redfish logout failed: {}".format(e))
+
+        self._http.close()
+
+
+class Redfish(OobBase):
+    """
+    Generic OOB for BMCs with a Redfish API. The Redfish session of each BMC is
+    kept in the session pool, so that all requests of a command reuse it.
+    """
+
+    # guards creating Redfish sessions from concurrent collectors
+    _session_lock = threading.Lock()
+
+    def _get_url(self):
+        url = self.oob_info["ipmi"]
+        if not url.startswith(("http://", "https://")):
+            url = "https://{}".format(url)
+
+        return url.rstrip("/")
+
+    def _session_key(self):
+        return ("redfish", self._get_url(), self.username)
+
+    def _get_session(self):
+        if not self.oob_info["ipmi"]:
+            raise OobError("No IPMI field for {}".format(self.oob_info["identifier"]))
+
+        key = self._session_key()
+        with self._session_lock:
+            session = sessions.pool.get(key)
+            if session is None:
+                timeout = float(
+                    self.oob_config["oob_params"].get("redfish_timeout", 30)
+                )
+                session = RedfishSession(
+                    key[1], self.username, self.password, timeout=timeout
+                )
+                sessions.pool.put(key, session, RedfishSession.logout)
+
+        return session
+
+    def close(self):
+        super(Redfish, self).close()
+        if self._credentials is not None and self.oob_info["ipmi"]:
+            sessions.pool.release(self._session_key())
+
+    def _get(self, path, timeout=None, **params):
+        # timeout is either seconds, or a Deadline shared by multiple requests
+        if isinstance(timeout, Deadline):
+            timeout = timeout.remaining()
+        return self._get_session().get(path, timeout, **params)
+
+    def _fetch(self, tasks):
+        """
+        Run the functions of the tasks dict concurrently over the session, and
+        return a dict with their results. Failures are logged, and their
+        result is None.
+        """
+
+        def run(name):
+            try:
+                return tasks[name]()
+            except OobError as e:
+                log.warning("Could not read {}: {}".format(name, e))
+                return None
+
+        results = run_tasks(run, tasks, parallel=POOL_SIZE)
+        return {r.item: r.value for r in results}
+
+    def _get_many(self, paths, timeout=None):
+        """
+        GET resources concurrently. Returns a list in the order of paths,
+        with None for resources that could not be read.
+        """
+        results = self._fetch(
+            {path: functools.partial(self._get, path, timeout) for path in paths}
+        )
+        return [results[path] for path in paths]
+
+    def _features(self, timeout=None):
+        """
+        Return the query parameters supported by the service, from the
+        ProtocolFeaturesSupported of the service root
+        """
+        session = self._get_session()
+        if session.features is None:
+            supported = self._get(ROOT, timeout).get("ProtocolFeaturesSupported", {})
+            expand = supported.get("ExpandQuery") or {}
+            session.features = {
+                # $expand=. expands subordinate resources, but not Links
+                "expand": bool(expand.get("NoLinks")),
+                "levels": (
+                    int(expand.get("MaxLevels") or 1) if expand.get("Levels") else 1
+                ),
+                "select": bool(supported.get("SelectQuery")),
+            }
+            log.debug("Redfish query parameters: {}".format(session.features))
+
+        return session.features
+
+    def _get_resource(self, path, select=None, timeout=None):
+        """
+        GET a resource. If the service supports $select, only the properties
+        listed in select are requested.
+        """
+        if select and self._features(timeout)["select"]:
+            path = "{}?$select={}".format(path, ",".join(select))
+
+        return self._get(path, timeout)
+
+    def _expanded(self, resources, timeout=None):
+        """
+        Replace the references ({"@odata.id": path}) in a list of resources
+        with the resources, retrieved concurrently. Resources that could not
+        be read are None.
+        """
+        links = [idx for idx, r in enumerate(resources) if list(r) == ["@odata.id"]]
+        fetched = self._get_many(
+            [resources[idx]["@odata.id"] for idx in links], timeout
+        )
+
+        resources = list(resources)
+        for idx, resource in zip(links, fetched):
+            resources[idx] = resource
+
+        return resources
+
+    def _get_collection(self, collection, levels=1, timeout=None):
+        """
+        Return the members of a collection. If the service supports $expand,
+        the members (and with levels=2 their subordinate resources, e.g. the
+        drives of storage controllers) are returned by a single request.
+        Members that are not expanded are retrieved concurrently.
+        """
+        features = self._features(timeout)
+        path = collection
+        if features["expand"]:
+            levels = min(levels, features["levels"])
+            path = "{}?$expand=.($levels={})".format(collection, levels)
+
+        members = []
+        while path:
+            data = self._get(path, timeout)
+            members.extend(data.get("Members", []))
+            path = data.get("Members@odata.nextLink")
+
+        return [m for m in self._expanded(members, timeout) if m is not None]
+
+    def _members(self, collection, timeout=None):
+        """
+        Return the member paths of a collection
+        """
+        paths = []
+        while collection:
+            data = self._get(collection, timeout)
+            paths.extend(member["@odata.id"] for member in data.get("Members", []))
+            collection = data.get("Members@odata.nextLink")
+
+        return paths
+
+    def _resource(self, collection, timeout=None):
+        """
+        Return the path of the first member of a collection, e.g. the system
+        of /redfish/v1/Systems. Paths are cached in the session.
+        """
+        session = self._get_session()
+        path = session.paths.get(collection)
+        if path is None:
+            members = self._members(collection, timeout)
+            if not members:
+                raise OobError("No members in {}".format(collection))
+
+            path = session.paths[collection] = members[0]
+
+        return path
+
+    def _system(self, timeout=None):
+        return self._resource(SYSTEMS, timeout)
+
+    def _manager(self, timeout=None):
+        return self._resource(MANAGERS, timeout)
+
+    def _chassis(self, timeout=None):
+        return self._resource(CHASSIS, timeout)
+
+    def _reset(self, path, action, reset_type):
+        log.debug("Requesting {} {}".format(action, reset_type))
+        self._get_session().post(
+            "{}/Actions/{}".format(path, action), {"ResetType": reset_type}
+        )
+
+    def _reset_system(self, reset_type):
+        self._reset(self._system(), "ComputerSystem.Reset", reset_type)
+
+    def _get_power_state(self):
+        state = self._get(self._system()).get("PowerState")
+        return "on" if state in ("On", "PoweringOff") else "off"
+
+    def power_status(self):
+        self._print("Chassis Power is {}".format(self._get_power_state()))
+
+    def power_on(self):
+        self._reset_system("On")
+
+    def power_off(self):
+        self._reset_system("ForceOff" if self.parsed_args.force else "GracefulShutdown")
+        if self.parsed_args.wait:
+            self._wait_for_power("off", self.parsed_args.timeout)
+
+    def power_cycle(self):
+        self._reset_system("PowerCycle")
+
+    def power_reset(self):
+        self._reset_system("ForceRestart")
+
+    def _boot(self, device):
+        self._get_session().patch(
+            self._system(),
+            {
+                "Boot": {
+                    "BootSourceOverrideTarget": BOOT_TARGETS[device],
+                    "BootSourceOverrideEnabled": "Once",
+                }
+            },
+        )
+        if getattr(self.parsed_args, "reboot", False):
+            if self._get_power_state() == "on":
+                self._reset_system("ForceRestart")
+            else:
+                self._reset_system("On")
+
+    def identify(self):
+        led = "Off" if self.parsed_args.off else "Blinking"
+        self._get_session().patch(self._system(), {"IndicatorLED": led})
+        self._print("Chassis identify LED: {}".format(led))
+
+    def status(self):
+        system = self._get(self._system())
+        fields = [
+            ("manufacturer", system.get("Manufacturer")),
+            ("model", system.get("Model")),
+            ("serial", system.get("SerialNumber")),
+            ("power", system.get("PowerState")),
+            ("health", system.get("Status", {}).get("Health")),
+            ("bios", system.get("BiosVersion")),
+            ("processors", system.get("ProcessorSummary", {}).get("Count")),
+            ("processor_model", system.get("ProcessorSummary", {}).get("Model")),
+            ("indicator_led", system.get("IndicatorLED")),
+        ]
+        return [f[0] for f in fields], [f[1] for f in fields]
+
+    def ipmi_reset(self):
+        reset_type = "ForceRestart" if self.parsed_args.force else "GracefulRestart"
+        self._reset(self._manager(), "Manager.Reset", reset_type)
+
+    def _log_service(self, timeout=None):
+        """
+        Return the path of the SEL log service, looking for it in the system
+        and manager log services
+        """
+        session = self._get_session()
+        path = session.paths.get("sel")
+        if path is not None:
+            return path
+
+        services = []
+        for resource in (self._system(timeout), self._manager(timeout)):
+            try:
+                services.extend(self._members(resource + "/LogServices", timeout))
+            except OobError as e:
+                log.debug("No log services in {}: {}".format(resource, e))
+
+        if not services:
+            raise OobError("No Redfish log services")
+
+        for name in ("sel", "eventlog"):
+            for service in services:
+                if service.rstrip("/").split("/")[-1].lower() == name:
+                    path = service
+                    break
+            if path is not None:
+                break
+
+        path = session.paths["sel"] = path or services[0]
+        return path
+
+    def _log_entries(self, timeout=None):
+        collection = self._log_service(timeout) + "/Entries"
+        entries = []
+        while collection:
+            data = self._get(collection, timeout)
+            entries.extend(data.get("Members", []))
+            collection = data.get("Members@odata.nextLink")
+
+        # most BMCs return the entries inline, others only link to them
+        links = [entry["@odata.id"] for entry in entries if "Created" not in entry]
+        if links:
+            entries = [entry for entry in entries if "Created" in entry]
+            entries.extend(self._get_many(links, timeout))
+            entries.sort(key=lambda entry: entry.get("Created") or "")
+
+        return entries
+
+    def _sel_record(self, entry):
+        """
+        Convert a log entry to an ipmi-sel record
+        """
+        created = entry.get("Created") or "N/A"
+        date, _, time = created.partition("T")
+        return [
+            str(entry.get("Id", "N/A")),
+            date,
+            time[:8] or "N/A",
+            entry.get("Name") or "N/A",
+            entry.get("SensorType") or entry.get("EntryType") or "N/A",
+            # Severity is deprecated in favor of MessageSeverity
+            HEALTH_STATES.get(
+                entry.get("MessageSeverity") or entry.get("Severity"), "N/A"
+            ),
+            entry.get("Message") or "N/A",
+        ]
+
+    def ipmi_logs(self):
+        records = map(self._sel_record, self._log_entries())
+        columns = ["id", "date", "time", "name", "event", "state"]
+        values = [
+            [
+                r[SEL_ID],
+                r[SEL_DATE],
+                r[SEL_TIME],
+                r[SEL_TYPE],
+                r[SEL_EVENT],
+                r[SEL_STATE],
+            ]
+            for r in records
+        ]
+        return columns, values
+
+    def clear_ipmi_logs(self):
+        self._get_session().post(
+            self._log_service() + "/Actions/LogService.ClearLog", {}
+        )
+        self._print("Clearing SEL")
+        try:
+            SelCache.clear(self.oob_info["ipmi"].replace("https://", ""))
+        except OSError as e:
+            log.warning("Could not clear SEL cache: {}".format(e))
+
+    def _get_sel_errors(self, host, deadline=None):
+        records = map(self._sel_record, self._log_entries(deadline))
+        return reversed([r for r in records if r[SEL_STATE] in SEL_ERROR_STATES])
+
+    def _sensor_row(self, index, sensor, sensor_type, reading, unit):
+        status = sensor.get("Status", {})
+        health = status.get("Health")
+        return [
+            str(index),
+            sensor.get("Name") or sensor.get("MemberId") or "N/A",
+            sensor_type,
+            HEALTH_STATES.get(health, "N/A"),
+            _format_value(reading),
+            unit,
+            *[_format_value(sensor.get(t)) for t in THRESHOLDS],
+            "'{}'".format(health or "N/A"),
+        ]
+
+    def _read_sensors(self, host, deadline=None):
+        """
+        Read the thermal and power sensors, in the format of ipmi-sensors
+        """
+        chassis = self._chassis(deadline)
+        results = self._fetch(
+            {
+                "thermal": lambda: self._get(chassis + "/Thermal", deadline),
+                "power": lambda: self._get(chassis + "/Power", deadline),
+            }
+        )
+        if results["thermal"] is None and results["power"] is None:
+            raise OobError("Could not read Redfish sensors")
+
+        thermal, power = results["thermal"] or {}, results["power"] or {}
+        readings = [
+            (thermal, "Temperatures", "Temperature", "ReadingCelsius", "C"),
+            (thermal, "Fans", "Fan", "Reading", None),
+            (power, "Voltages", "Voltage", "ReadingVolts", "V"),
+            (power, "PowerSupplies", "Power Supply", "LastPowerOutputWatts", "W"),
+        ]
+
+        lines = [SENSORS_HEADER]
+        for resource, name, sensor_type, reading, unit in readings:
+            for sensor in resource.get(name, []):
+                if sensor.get("Status", {}).get("State") == "Absent":
+                    continue
+
+                row = self._sensor_row(
+                    len(lines),
+                    sensor,
+                    sensor_type,
+                    sensor.get(reading),
+                    unit or sensor.get("ReadingUnits") or "N/A",
+                )
+                lines.append(" | ".join(row))
+
+        return "".join(line + "\n" for line in lines)
+
+    def _read_dcmi(self, host, deadline=None):
+        power = self._get(self._chassis(deadline) + "/Power", deadline)
+        for control in power.get("PowerControl", []):
+            if control.get("PowerConsumedWatts") is not None:
+                return str(control["PowerConsumedWatts"])
+
+        return None
+
+    def _system_ram(self):
+        system = self._get_resource(self._system(), ["MemorySummary"])
+        return int(system.get("MemorySummary", {}).get("TotalSystemMemoryGiB") or 0)
+
+    def get_firmware(self):
+        firmwares = self._get_collection(FIRMWARE_INVENTORY)
+        columns = ["id", "name", "version", "updateable"]
+        values = [
+            [f.get("Id"), f.get("Name"), f.get("Version"), f.get("Updateable")]
+            for f in firmwares
+        ]
+        return columns, values
+
+    def _get_disks(self, timeout=None):
+        """
+        Return the drives of all storage controllers, as (controller, drive)
+        """
+        controllers = self._get_collection(
+            self._system(timeout) + "/Storage", levels=2, timeout=timeout
+        )
+        ctrls = [
+            (controller.get("Id", "N/A"), drive)
+            for controller in controllers
+            for drive in controller.get("Drives", [])
+        ]
+        drives = self._expanded([drive for _, drive in ctrls], timeout)
+        return [
+            (ctrl, drive)
+            for (ctrl, _), drive in zip(ctrls, drives)
+            if drive is not None and drive.get("Status", {}).get("State") != "Absent"
+        ]
+
+    def _disk_row(self, ctrl, drive):
+        location = drive.get("PhysicalLocation", {}).get("PartLocation", {})
+        return [
+            drive.get("Id", "N/A"),
+            ctrl,
+            location.get("LocationOrdinalValue", "N/A"),
+            (drive.get("CapacityBytes") or 0) // 1024**3,
+            drive.get("MediaType") or "N/A",
+            drive.get("Status", {}).get("Health") or "unknown",
+            drive.get("Protocol") or "unknown",
+            drive.get("CapableSpeedGbs") or "unknown",
+            drive.get("Manufacturer") or "N/A",
+        ]
+
+    def get_disks(self):
+        columns = [
+            "index",
+            "ctrl",
+            "slot",
+            "size_gb",
+            "type",
+            "state",
+            "interface",
+            "speed",
+            "vendor",
+        ]
+        values = [self._disk_row(ctrl, drive) for ctrl, drive in self._get_disks()]
+        return columns, values
+
+    def _format_disk(self, row):
+        return "{}/{}: {}GB {} {} ({})".format(
+            row[1], row[0], row[3], row[4], row[8], row[5]
+        )
+
+    def check_disks(self):
+        pre = "{} disks".format(self.oob_info["identifier"])
+        expected = self.parsed_args.expected
+
+        disks_ok, disks_crit = [], []
+        for ctrl, drive in self._get_disks():
+            row = self._disk_row(ctrl, drive)
+            if drive.get("Status", {}).get("Health") != "OK" or row[3] <= 0:
+                disks_crit.append(row)
+            else:
+                disks_ok.append(row)
+
+        status, msg, lines = nagios.OK, [], []
+        if disks_crit:
+            status = nagios.CRITICAL
+            lines.append("{} disks CRITICAL:".format(len(disks_crit)))
+            lines.extend(map(lambda d: "- {}".format(self._format_disk(d)), disks_crit))
+            msg.append("{} disks CRITICAL".format(len(disks_crit)))
+
+        msg.append("{} disks OK".format(len(disks_ok)))
+        if expected is not None and len(disks_ok) != expected:
+            msg.append("expected {}".format(expected))
+            status = max(status, nagios.WARNING)
+
+            lines.append("{} disks OK:".format(len(disks_ok)))
+            lines.extend(map(lambda d: "- {}".format(self._format_disk(d)), disks_ok))
+            if len(disks_ok) < expected:
+                status = max(status, nagios.CRITICAL)
+
+        nagios.result(status, msg, lines, pre=pre)
+
+    def _inventory(self, timeout=None):
+        """
+        Read the hardware inventory of the server, using a few concurrent
+        requests ($expand and $select, if supported by the service)
+        """
+        system, chassis = self._system(timeout), self._chassis(timeout)
+        self._features(timeout)
+        return self._fetch(
+            {
+                "system": lambda: self._get_resource(
+                    system, SYSTEM_PROPERTIES, timeout
+                ),
+                "memory": lambda: self._get_collection(
+                    system + "/Memory", timeout=timeout
+                ),
+                "drives": lambda: self._get_disks(timeout),
+                "thermal": lambda: self._get_resource(
+                    chassis + "/Thermal", ["Temperatures", "Fans"], timeout
+                ),
+                "power": lambda: self._get_resource(
+                    chassis + "/Power", ["PowerControl", "PowerSupplies"], timeout
+                ),
+                "firmware": lambda: self._get_collection(
+                    FIRMWARE_INVENTORY, timeout=timeout
+                ),
+            }
+        )
+
+    def inventory(self):
+        inventory = self._inventory()
+        thermal = inventory["thermal"] or {}
+        power = inventory["power"] or {}
+
+        rows = []
+
+        def add(component, resource_id, resource, *parts):
+            status = resource.get("Status") or {}
+            if status.get("State") != "Absent":
+                health = status.get("Health") or "N/A"
+                rows.append([component, resource_id, _describe(*parts), health])
+
+        system = inventory["system"]
+        if system is not None:
+            cpus = system.get("ProcessorSummary", {})
+            memory = system.get("MemorySummary", {})
+            add(
+                "system",
+                system.get("Id"),
+                system,
+                ("{}", system.get("Manufacturer")),
+                ("{}", system.get("Model")),
+                ("serial {}", system.get("SerialNumber")),
+                ("BIOS {}", system.get("BiosVersion")),
+                ("{} CPUs", cpus.get("Count")),
+                ("{}", cpus.get("Model")),
+                ("{} GiB RAM", memory.get("TotalSystemMemoryGiB")),
+            )
+
+        for dimm in inventory["memory"] or []:
+            capacity = dimm.get("CapacityMiB")
+            add(
+                "memory",
+                dimm.get("Id"),
+                dimm,
+                ("{} GiB", capacity // 1024 if capacity else None),
+                ("{}", dimm.get("MemoryDeviceType")),
+                ("{} MHz", dimm.get("OperatingSpeedMhz")),
+                ("{}", dimm.get("Manufacturer")),
+                ("{}", dimm.get("PartNumber")),
+            )
+
+        for ctrl, drive in inventory["drives"] or []:
+            add(
+                "drive",
+                "{}/{}".format(ctrl, drive.get("Id")),
+                drive,
+                ("{} GiB", (drive.get("CapacityBytes") or 0) // 1024**3),
+                ("{}", drive.get("MediaType")),
+                ("{}", drive.get("Protocol")),
+                ("{}", drive.get("Manufacturer")),
+                ("{}", drive.get("Model")),
+            )
+
+        for psu in power.get("PowerSupplies", []):
+            add(
+                "psu",
+                psu.get("Name") or psu.get("MemberId"),
+                psu,
+                ("{}", psu.get("Model")),
+                ("{} W", psu.get("PowerCapacityWatts")),
+                ("firmware {}", psu.get("FirmwareVersion")),
+            )
+
+        for control in power.get("PowerControl", []):
+            add(
+                "power",
+                control.get("Name") or control.get("MemberId"),
+                control,
+                ("{} W consumed", control.get("PowerConsumedWatts")),
+            )
+
+        for fan in thermal.get("Fans", []):
+            add(
+                "fan",
+                fan.get("Name") or fan.get("MemberId"),
+                fan,
+                ("{} " + (fan.get("ReadingUnits") or ""), fan.get("Reading")),
+            )
+
+        for sensor in thermal.get("Temperatures", []):
+            add(
+                "temperature",
+                sensor.get("Name") or sensor.get("MemberId"),
+                sensor,
+                ("{} C", sensor.get("ReadingCelsius")),
+            )
+
+        for firmware in inventory["firmware"] or []:
+            add(
+                "firmware",
+                firmware.get("Id"),
+                firmware,
+                ("{}", firmware.get("Name")),
+                ("{}", firmware.get("Version")),
+            )
+
+        return ["component", "id", "description", "health"], rows
@@ -0,0 +1,197 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import atexit
+import json
+import os
+import threading
+import time
+
+from bmcmanager.cache import cache_dir, write_json
+from bmcmanager.logs import log
+
+
+class SessionPool(object):
+    """
+    Open sessions (e.g. BMC web or SSH sessions), keyed by a tuple such as
+    (kind, host, username).
+
+    Sessions are released when a command is done with them. By default, this
+    closes them. Long running processes (see `bmcmanager serve`) set
+    `keep_alive`, so that released sessions are reused by later commands,
+    until they have been idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, idle_timeout=300):
+        self.keep_alive = False
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _close(self, key, session, close):
+        if close is None:
+            return
+
+        log.debug("Closing session {}".format(key))
+        try:
+            close(session)
+        except Exception as e:
+            log.debug("Failed to close session {}: {}".format(key, e))
+
+    def get(self, key):
+        """
+        Return the session for key, or None
+        """
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                return None
+
+            session, close, last_used = entry
+            if time.monotonic() - last_used < self.idle_timeout:
+                entry[2] = time.monotonic()
+                return session
+
+            del self._sessions[key]
+
+        self._close(key, session, close)
+        return None
+
+    def put(self, key, session, close=None):
+        """
+        Add a session. close(session) is called when the session is closed.
+        """
+        with self._lock:
+            old = self._sessions.get(key)
+            self._sessions[key] = [session, close, time.monotonic()]
+
+        if old is not None and old[0] is not session:
+            self._close(key, old[0], old[1])
+
+    def detach(self, key):
+        """
+        Remove the session for key without closing it
+        """
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+
+        return entry[0] if entry is not None else None
+
+    def discard(self, key):
+        """
+        Close and remove the session for key
+        """
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+
+        if entry is not None:
+            self._close(key, entry[0], entry[1])
+
+    def release(self, key):
+        """
+        Called when a command is done with a session
+        """
+        if not self.keep_alive:
+            self.discard(key)
+            return
+
+        # sessions are idle from the time the last command released them
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                entry[2] = time.monotonic()
+
+    def close_idle(self):
+        """
+        Close the sessions that have not been used for idle_timeout seconds
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                (key, entry)
+                for key, entry in self._sessions.items()
+                if now - entry[2] >= self.idle_timeout
+            ]
+            for key, _ in idle:
+                del self._sessions[key]
+
+        for key, (session, close, _) in idle:
+            log.debug("Session {} is idle".format(key))
+            self._close(key, session, close)
+
+    def close_all(self):
+        with self._lock:
+            entries, self._sessions = self._sessions, {}
+
+        for key, (session, close, _) in entries.items():
+            self._close(key, session, close)
+
+
+class SessionStore(object):
+    """
+    Session tokens persisted across bmcmanager invocations, in a JSON file
+    that is only readable by the current user. Entries are keyed by a string
+    such as "lenovo <host> <username>", and keep the time they were last used.
+    """
+
+    # shared by all stores, since they may be used by parallel tasks
+    _lock = threading.Lock()
+
+    def __init__(self, name, path=None):
+        self.path = path or os.path.join(cache_dir(), "{}.json".format(name))
+
+    def _load(self):
+        try:
+            with open(self.path) as fin:
+                return json.load(fin)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning("Could not read {}: {}".format(self.path, e))
+            return {}
+
+    def _save(self, entries):
+        try:
+            write_json(self.path, entries)
+        except OSError as e:
+            log.warning("Could not write {}: {}".format(self.path, e))
+
+    def get(self, key):
+        """
+        Return (tokens, idle seconds) for key, or (None, None)
+        """
+        with self._lock:
+            entry = self._load().get(key)
+
+        if entry is None:
+            return None, None
+
+        return entry["tokens"], time.time() - entry["used"]
+
+    def put(self, key, tokens):
+        with self._lock:
+            entries = self._load()
+            entries[key] = {"tokens": tokens, "used": time.time()}
+            self._save(entries)
+
+    def pop(self, key):
+        with self._lock:
+            entries = self._load()
+            if entries.pop(key, None) is not None:
+                self._save(entries)
+
+
+pool = SessionPool()
+atexit.register(pool.close_all)
@@ -0,0 +1,230 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Parser for responses of the Lenovo (AMI MegaRAC) RPC web interface, e.g.:
+#
+#   WEBVAR_JSONVAR_HL_GETANALYSEDSEL = {
+#       WEBVAR_STRUCTNAME_HL_GETANALYSEDSEL : [
+#           { 'RecordID' : 1, 'SensorName' : 'PSU1_Status', ... },
+#           {} ],
+#       HAPI_STATUS:0 };
+#
+# The records are the items of the first list in the response.
+
+import json
+import re
+
+TOKEN = re.compile(
+    r"""
+    \s*(?:
+        (?P<punct>[\[\]{}:,])
+      | '(?P<squote>(?:[^'\\]|\\.)*)'
+      | "(?P<dquote>(?:[^"\\]|\\.)*)"
+      | (?P<number>[-+]?(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d*)?(?:[eE][-+]?\d+)?))
+      | (?P<name>[A-Za-z_$][\w$]*)
+    )
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+WHITESPACE = re.compile(r"\s*")
+
+STRING = re.compile(r"""'((?:[^'\\]|\\.)*)'|"(?:[^"\\]|\\.)*\"""", re.DOTALL)
+
+ESCAPE = re.compile(r"\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|.)", re.DOTALL)
+
+ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "b": "\b", "f": "\f", "0": "\0"}
+
+NAMES = {"true": True, "false": False, "null": None, "True": True, "False": False}
+
+
+class RpcParseError(ValueError):
+    pass
+
+
+def _unescape(match):
+    esc = match.group(1)
+    if esc[0] in "xu" and len(esc) > 1:
+        return chr(int(esc[1:], 16))
+    return ESCAPES.get(esc, esc)
+
+
+def _json_string(match):
+    value = match.group(1)
+    if value is None:
+        return match.group(0)
+    if "\\" not in value and '"' not in value:
+        return '"' + value + '"'
+    return json.dumps(ESCAPE.sub(_unescape, value))
+
+
+def _to_json(text):
+    """
+    Convert single-quoted strings to JSON strings
+    """
+    if '"' not in text and "\\" not in text:
+        # fast path, swapping the quotes is enough
+        return text.replace("'", '"')
+
+    return STRING.sub(_json_string, text)
+
+
+def _number(text):
+    if text.lower().lstrip("+-").startswith("0x"):
+        return int(text, 16)
+    if any(c in text for c in ".eE"):
+        return float(text)
+    return int(text)
+
+
+class _Tokenizer(object):
+    """
+    Splits a response into (kind, value) tokens, starting at `pos`
+    """
+
+    def __init__(self, text, pos=0):
+        self.text = text
+        self.pos = pos
+
+    def next(self):
+        match = TOKEN.match(self.text, self.pos)
+        if match is None:
+            raise RpcParseError("Unexpected input at offset {}".format(self.pos))
+
+        self.pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ("squote", "dquote"):
+            return "string", ESCAPE.sub(_unescape, value)
+        elif kind == "number":
+            return kind, _number(value)
+
+        return kind, value
+
+    def expect(self, punct):
+        kind, value = self.next()
+        if kind != "punct" or value != punct:
+            raise RpcParseError(
+                "Expected '{}' at offset {}, got {!r}".format(punct, self.pos, value)
+            )
+
+
+def _parse_value(tokens, token=None):
+    kind, value = token or tokens.next()
+    if kind == "punct" and value == "{":
+        return _parse_object(tokens)
+    elif kind == "punct" and value == "[":
+        return list(_parse_items(tokens))
+    elif kind in ("string", "number"):
+        return value
+    elif kind == "name" and value in NAMES:
+        return NAMES[value]
+
+    raise RpcParseError("Unexpected {!r} at offset {}".format(value, tokens.pos))
+
+
+def _parse_object(tokens):
+    result = {}
+    while True:
+        kind, key = tokens.next()
+        if kind == "punct" and key == "}":
+            return result
+        if kind not in ("string", "name", "number"):
+            raise RpcParseError("Unexpected {!r} at offset {}".format(key, tokens.pos))
+
+        tokens.expect(":")
+        result[key] = _parse_value(tokens)
+
+        kind, value = tokens.next()
+        if kind == "punct" and value == "}":
+            return result
+        if kind != "punct" or value != ",":
+            raise RpcParseError("Expected ',' at offset {}".format(tokens.pos))
+
+
+def _parse_items(tokens):
+    """
+    Yield the items of a list, after its opening '['
+    """
+    while True:
+        token = tokens.next()
+        if token == ("punct", "]"):
+            return
+
+        yield _parse_value(tokens, token)
+
+        token = tokens.next()
+        if token == ("punct", "]"):
+            return
+        if token != ("punct", ","):
+            raise RpcParseError("Expected ',' at offset {}".format(tokens.pos))
+
+
+def _iter_json_items(text, pos):
+    """
+    Yield (item, end offset) for the items of a list using the json module,
+    which is much faster. Stops at the first item that is not valid JSON.
+    """
+    decoder = json.JSONDecoder()
+    while True:
+        try:
+            item, end = decoder.raw_decode(text, WHITESPACE.match(text, pos).end())
+        except ValueError:
+            return
+
+        pos = WHITESPACE.match(text, end).end()
+        if not text.startswith((",", "]"), pos):
+            return
+
+        yield item, end
+        if text.startswith("]", pos):
+            return
+
+        pos += 1
+
+
+def iter_records(text):
+    """
+    Yield the records of an RPC response one by one, without evaluating it.
+    Raises RpcParseError if the response cannot be parsed.
+    """
+    start = text.find("[")
+    if start == -1:
+        raise RpcParseError("No records in response")
+
+    # most responses are valid JSON after converting the strings, so parse
+    # records with the json module until one is not
+    text = _to_json(text[start:])
+    pos = 1
+    for record, pos in _iter_json_items(text, pos):
+        yield record
+
+    tokens = _Tokenizer(text, pos)
+    if pos != 1:
+        # continue after the last record parsed as JSON
+        token = tokens.next()
+        if token == ("punct", "]"):
+            return
+        if token != ("punct", ","):
+            raise RpcParseError("Expected ',' at offset {}".format(tokens.pos))
+
+    yield from _parse_items(tokens)
+
+
+def parse_records(text):
+    """
+    Return the list of non-empty records of an RPC response
+    """
+    return [record for record in iter_records(text) if record]
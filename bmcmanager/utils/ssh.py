@@ -0,0 +1,146 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import select
+import time
+
+from bmcmanager.logs import log
+
+# bytes read from a channel at a time
+CHUNK_SIZE = 32768
+
+# maximum output kept for each of stdout and stderr
+OUTPUT_LIMIT = 1024 * 1024
+
+# maximum seconds to block in select(), so that stderr is drained even if the
+# channel only signals stdout data
+STDERR_POLL_INTERVAL = 0.1
+
+
+class OutputBuffer(object):
+    """
+    Keeps the last `limit` bytes written to it
+    """
+
+    def __init__(self, limit=OUTPUT_LIMIT):
+        self.limit = limit
+        self.dropped = 0
+        self._chunks = collections.deque()
+        self._size = 0
+
+    def write(self, data):
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self.limit:
+            chunk = self._chunks.popleft()
+            excess = self._size - self.limit
+            if len(chunk) > excess:
+                self._chunks.appendleft(chunk[excess:])
+                chunk = chunk[:excess]
+
+            self._size -= len(chunk)
+            self.dropped += len(chunk)
+
+    def getvalue(self):
+        return b"".join(self._chunks)
+
+
+class LineSplitter(object):
+    """
+    Calls on_line(line) for each complete line of the data written to it
+    """
+
+    def __init__(self, on_line, limit=OUTPUT_LIMIT):
+        self.on_line = on_line
+        self.limit = limit
+        self._partial = b""
+
+    def write(self, data):
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        if len(self._partial) > self.limit:
+            # do not buffer a line without end forever
+            lines.append(self._partial)
+            self._partial = b""
+
+        for line in lines:
+            self.on_line(line.rstrip(b"\r").decode("utf-8", "replace"))
+
+    def flush(self):
+        if self._partial:
+            self.on_line(self._partial.decode("utf-8", "replace"))
+            self._partial = b""
+
+
+def read_channel(channel, timeout=None, on_line=None, limit=OUTPUT_LIMIT):
+    """
+    Read the output of the command of a paramiko channel, until the command
+    exits and all of its output has been read.
+
+    Blocks in select() until the channel has data, or for at most
+    STDERR_POLL_INTERVAL seconds, and drains both stdout and stderr. Only the last `limit`
+    bytes of stdout and stderr are kept. on_line(line) is called for each
+    line of stdout as it arrives. Raises TimeoutError after timeout seconds.
+
+    Returns (exit_status, stdout, stderr).
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    stdout, stderr = OutputBuffer(limit), OutputBuffer(limit)
+    lines = LineSplitter(on_line, limit) if on_line is not None else None
+
+    def remaining():
+        if deadline is None:
+            return None
+
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError("Timed out after {} seconds".format(timeout))
+
+        return left
+
+    while True:
+        while channel.recv_ready():
+            data = channel.recv(CHUNK_SIZE)
+            stdout.write(data)
+            if lines is not None:
+                lines.write(data)
+
+        while channel.recv_stderr_ready():
+            stderr.write(channel.recv_stderr(CHUNK_SIZE))
+
+        # output may arrive after the exit status, so read until EOF
+        if channel.eof_received or channel.closed:
+            if not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+
+            continue
+
+        left = remaining()
+        if left is None or left > STDERR_POLL_INTERVAL:
+            left = STDERR_POLL_INTERVAL
+        select.select([channel], [], [], left)
+
+    if lines is not None:
+        lines.flush()
+
+    if not channel.status_event.wait(remaining()):
+        raise TimeoutError("Timed out waiting for the exit status")
+
+    for name, output in (("stdout", stdout), ("stderr", stderr)):
+        if output.dropped:
+            log.warning("Dropped the first {} bytes of {}".format(output.dropped, name))
+
+    return channel.recv_exit_status(), stdout.getvalue(), stderr.getvalue()
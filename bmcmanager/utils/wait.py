@@ -0,0 +1,131 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import random
+import threading
+import time
+
+from bmcmanager.logs import log
+
+# set to stop all waits, e.g. when the process is terminated
+_cancelled = threading.Event()
+
+
+class WaitError(Exception):
+    pass
+
+
+class WaitTimeout(WaitError):
+    pass
+
+
+class WaitCancelled(WaitError):
+    pass
+
+
+def cancel_all():
+    """
+    Stop all running and future waits, which raise WaitCancelled
+    """
+    _cancelled.set()
+
+
+def backoff(initial=1.0, maximum=30.0, factor=2.0, jitter=0.1):
+    """
+    Yield delays that grow exponentially from initial to maximum seconds.
+    Each delay is randomized by +/- jitter, so that concurrent waits on many
+    servers do not poll in lockstep.
+    """
+    delay = initial
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(delay * factor, maximum)
+
+
+def _sleep(delay, cancel=None):
+    """
+    Sleep for delay seconds. Returns True if cancelled.
+    """
+    if cancel is None:
+        return _cancelled.wait(delay)
+
+    end = time.monotonic() + delay
+    while not cancel.is_set() and not _cancelled.is_set():
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return False
+        cancel.wait(min(remaining, 0.5))
+
+    return True
+
+
+def wait_for(
+    check,
+    description,
+    timeout=None,
+    initial=1.0,
+    maximum=30.0,
+    factor=2.0,
+    jitter=0.1,
+    errors=(),
+    cancel=None,
+):
+    """
+    Call check() until it returns a true value, and return that value.
+
+    Sleeps between calls follow backoff(). Exceptions listed in errors are
+    treated as a false result (e.g. connection errors while a BMC reboots).
+    Raises WaitTimeout after timeout seconds, or WaitCancelled if the cancel
+    event (or cancel_all()) is set. The time it took is logged, as
+    "Waited N seconds until <description>".
+    """
+    start = time.monotonic()
+    deadline = None if timeout is None else start + timeout
+    delays = backoff(initial, maximum, factor, jitter)
+    checks = 0
+    while True:
+        if _cancelled.is_set() or (cancel is not None and cancel.is_set()):
+            raise WaitCancelled("Cancelled waiting until {}".format(description))
+
+        checks += 1
+        try:
+            result = check()
+        except errors as e:
+            log.debug("Check failed: {}".format(e))
+            result = None
+
+        elapsed = time.monotonic() - start
+        if result:
+            log.info(
+                "Waited {:.1f} seconds until {} ({} checks)".format(
+                    elapsed, description, checks
+                )
+            )
+            return result
+
+        delay = next(delays)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise WaitTimeout(
+                    "Timed out after {:.1f} seconds waiting until {}".format(
+                        elapsed, description
+                    )
+                )
+            delay = min(delay, remaining)
+
+        log.debug("Checking again in {:.1f} seconds".format(delay))
+        if _sleep(delay, cancel):
+            raise WaitCancelled("Cancelled waiting until {}".format(description))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Usage:
+  $ ./scripts/benchmark-ipmi.py [--calls N] [--latency SECONDS]
+
+Compare the native IPMI backend, reusing one session, with opening a new
+session per command and with running ipmitool (if installed), against the
+simulated BMC of bmcmanager.mock.ipmi. --latency adds a delay to each reply
+of the simulated BMC, to approximate a real network and BMC.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bmcmanager.ipmi.commands import Bmc  # noqa: E402
+from bmcmanager.ipmi.lanplus import Session  # noqa: E402
+from bmcmanager.mock import ipmi as mock  # noqa: E402
+
+USERNAME = "ADMIN"
+PASSWORD = "ADMIN"
+
+COMMANDS = [["chassis", "power", "status"], ["chassis", "status"], ["mc", "info"]]
+
+
+def native_reuse(port, calls):
+    bmc = Bmc(Session("127.0.0.1", USERNAME, PASSWORD, port=port))
+    for idx in range(calls):
+        bmc.execute(COMMANDS[idx % len(COMMANDS)])
+    bmc.close()
+
+
+def native_new_session(port, calls):
+    for idx in range(calls):
+        bmc = Bmc(Session("127.0.0.1", USERNAME, PASSWORD, port=port))
+        bmc.execute(COMMANDS[idx % len(COMMANDS)])
+        bmc.close()
+
+
+def ipmitool(port, calls):
+    prefix = [
+        "ipmitool",
+        "-I",
+        "lanplus",
+        "-C",
+        "17",
+        "-H",
+        "127.0.0.1",
+        "-p",
+        str(port),
+        "-U",
+        USERNAME,
+        "-P",
+        PASSWORD,
+    ]
+    for idx in range(calls):
+        subprocess.check_output(prefix + COMMANDS[idx % len(COMMANDS)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    bmc = mock.SimulatedBmc(USERNAME, PASSWORD, args.latency)
+    server = mock.start(bmc)
+
+    benchmarks = [
+        ("native, one session", native_reuse),
+        ("native, session per call", native_new_session),
+    ]
+    if shutil.which("ipmitool"):
+        benchmarks.append(("ipmitool", ipmitool))
+    else:
+        print("ipmitool is not installed, skipping")
+
+    print("{} calls, {:.1f}ms reply latency".format(args.calls, args.latency * 1000))
+    for name, func in benchmarks:
+        opened, requests = bmc.sessions_opened, bmc.requests
+        start = time.perf_counter()
+        func(server.port, args.calls)
+        elapsed = time.perf_counter() - start
+        print(
+            "  {:<26} {:8.3f}s {:8.2f}ms/call {:5} sessions {:6} requests".format(
+                name,
+                elapsed,
+                elapsed * 1000 / args.calls,
+                bmc.sessions_opened - opened,
+                bmc.requests - requests,
+            )
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
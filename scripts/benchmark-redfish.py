@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Usage:
+  $ ./scripts/benchmark-redfish.py [--calls N] [--inventories N] [--latency SECONDS]
+
+Compare reusing one Redfish session, as the redfish OOB does, with logging in
+for each request, against the simulated service of bmcmanager.mock.redfish.
+Then compare reading the hardware inventory with and without the $expand and
+$select query parameters. --latency adds a delay to each reply of the
+simulated service, to approximate a real network and BMC.
+"""
+
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bmcmanager.mock import redfish as mock  # noqa: E402
+from bmcmanager.oob.redfish import Redfish, RedfishSession  # noqa: E402
+
+USERNAME = "ADMIN"
+PASSWORD = "ADMIN"
+
+PATHS = [mock.SYSTEM, mock.CHASSIS + "/Thermal", mock.CHASSIS + "/Power"]
+
+
+def one_session(url, calls):
+    session = RedfishSession(url, USERNAME, PASSWORD)
+    for idx in range(calls):
+        session.get(PATHS[idx % len(PATHS)])
+    session.logout()
+
+
+def session_per_call(url, calls):
+    for idx in range(calls):
+        session = RedfishSession(url, USERNAME, PASSWORD)
+        session.get(PATHS[idx % len(PATHS)])
+        session.logout()
+
+
+def inventory(url, calls):
+    config = {
+        "username": USERNAME,
+        "password": PASSWORD,
+        "nfs_share": None,
+        "http_share": None,
+        "oob_params": {},
+    }
+    info = {"ipmi": url, "identifier": "benchmark", "info": {}}
+    for _ in range(calls):
+        oob = Redfish(SimpleNamespace(), None, config, info)
+        oob.inventory()
+        oob.close()
+
+
+def run(name, func, redfish, url, calls):
+    logins, requests = redfish.logins, redfish.requests
+    start = time.perf_counter()
+    func(url, calls)
+    elapsed = time.perf_counter() - start
+    print(
+        "  {:<22} {:8.3f}s {:8.2f}ms/call {:5} logins {:6} requests".format(
+            name,
+            elapsed,
+            elapsed * 1000 / calls,
+            redfish.logins - logins,
+            redfish.requests - requests,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--inventories", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    redfish = mock.SimulatedRedfish(USERNAME, PASSWORD, args.latency)
+    server = mock.start(redfish)
+    url = "http://127.0.0.1:{}".format(server.port)
+
+    print("{} calls, {:.1f}ms reply latency".format(args.calls, args.latency * 1000))
+    run("one session", one_session, redfish, url, args.calls)
+    run("session per call", session_per_call, redfish, url, args.calls)
+    run("inventory, $expand", inventory, redfish, url, args.inventories)
+    server.shutdown()
+
+    redfish = mock.SimulatedRedfish(USERNAME, PASSWORD, args.latency, query=False)
+    server = mock.start(redfish)
+    url = "http://127.0.0.1:{}".format(server.port)
+    run("inventory, no $expand", inventory, redfish, url, args.inventories)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Usage:
+  $ ./scripts/benchmark-rpc-parser.py [--records N] [--repeat N]
+
+Compare bmcmanager.utils.rpc with the previous eval() based parsing of
+Lenovo RPC responses, using synthetic `getanalysedsel` responses.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bmcmanager.utils import rpc  # noqa: E402
+
+RECORD = (
+    "{{ 'RecordID' : {0},'RecordType' : 2,'TimeStamp' : {1},'GenID1' : 32,"
+    "'GenID2' : 0,'EvMRev' : 4,'SensorType' : 'Power Supply','SensorNumber' : 81,"
+    "'EventDirType' : 111,'EventData1' : 1,'EventData2' : 255,'EventData3' : 255,"
+    "'SensorName' : 'PSU{2}_Status','EventDesc' : {3} }}"
+)
+
+
+def sel_response(records, escaped=False):
+    desc = "'Power Supply \\'AC\\' lost'" if escaped else "'Presence detected'"
+    items = [
+        RECORD.format(idx, 1570000000 + idx, idx % 2 + 1, desc)
+        for idx in range(1, records + 1)
+    ]
+    return (
+        "WEBVAR_JSONVAR_HL_GETANALYSEDSEL = {{ WEBVAR_STRUCTNAME_HL_GETANALYSEDSEL : "
+        "[ {},  {{}} ],  HAPI_STATUS:0 }};".format(",".join(items))
+    )
+
+
+def parse_eval(text):
+    start = text.find("[")
+    end = text.rfind("]")
+    return [r for r in eval(text[start : end + 1]) if r]
+
+
+def first_record(text):
+    return next(rpc.iter_records(text))
+
+
+def measure(func, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=65535)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for escaped in (False, True):
+        text = sel_response(args.records, escaped)
+        assert rpc.parse_records(text) == parse_eval(text)
+
+        print(
+            "{} records, {:.1f} MB, {} strings".format(
+                args.records, len(text) / 1e6, "escaped" if escaped else "plain"
+            )
+        )
+        for name, func in [
+            ("eval", parse_eval),
+            ("rpc.parse_records", rpc.parse_records),
+            ("rpc.iter_records (first)", first_record),
+        ]:
+            print("  {:<26} {:8.3f}s".format(name, measure(func, text, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Copyright (C) 2020  GRNET S.A.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from bmcmanager import nagios, sessions
+from bmcmanager.mock import ipmi
+from bmcmanager.oob.base import OobBase
+
+
+class NativeBackendTest(unittest.TestCase):
+    """
+    With `ipmi_backend = native`, IPMI checks talk to the BMC over the
+    lanplus session, without running ipmitool or FreeIPMI
+    """
+
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache)
+        env = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.cache})
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.bmc = ipmi.SimulatedBmc("admin", "secret")
+        self.server = ipmi.start(self.bmc)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(sessions.pool.close_all)
+
+        popen = mock.patch("subprocess.Popen", side_effect=AssertionError)
+        self.popen = popen.start()
+        self.addCleanup(popen.stop)
+
+    def _oob(self):
+        config = {
+            "username": "admin",
+            "password": "secret",
+            "nfs_share": None,
+            "http_share": None,
+            "oob_params": {"ipmi_backend": "native"},
+        }
+        info = {
+            "ipmi": "https://127.0.0.1:{}".format(self.server.port),
+            "identifier": "server1",
+            "oob": "lenovo",
+            "info": {"tsm": "1.0", "bios": "2.0"},
+        }
+        return OobBase(types.SimpleNamespace(timeout=5), None, config, info)
+
+    def _check_ipmi(self):
+        checks = nagios.Collector()
+        oob = self._oob()
+        with checks.collect(oob.oob_info["identifier"]):
+            oob.check_ipmi()
+        oob.close()
+
+        self.assertEqual(len(checks.results), 1)
+        return checks.results[0]
+
+    def test_check_ipmi(self):
+        result = self._check_ipmi()
+
+        self.popen.assert_not_called()
+        self.assertEqual(result.status, nagios.CRITICAL)
+        self.assertIn("1 SEL entries", result.msg)
+        self.assertIn("Upper Critical going high", "\n".join(result.lines))
+
+    def test_sel_incremental(self):
+        self._check_ipmi()
+        self.bmc.sel.append(ipmi.sel_record(3, 1590001200, 0x0C, 0x02, 0x6F, 0x01))
+
+        result = self._check_ipmi()
+
+        self.popen.assert_not_called()
+        self.assertIn("2 SEL entries", result.msg)
+        self.assertIn("Uncorrectable ECC", result.lines[1])
+
+    def test_sel_cleared(self):
+        self._check_ipmi()
+        self.bmc.sel = [ipmi.sel_record(1, 1590001200, 0x08, 0x51, 0x6F, 0x00)]
+
+        result = self._check_ipmi()
+
+        self.popen.assert_not_called()
+        self.assertEqual(result.status, nagios.OK)
+
+
+if __name__ == "__main__":
+    unittest.main()